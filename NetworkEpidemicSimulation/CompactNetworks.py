@@ -0,0 +1,214 @@
+#This module contains a compact, read-only representation of a network that the simulations can use in place of a NetworkX graph
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.RandomNumbers import spawn_random_streams
+
+
+def random_integers(rng, high, size):
+    """Draws integers uniformly from [0, high) with either a Generator or the global numpy.random functions"""
+    if isinstance(rng, np.random.Generator):
+        return rng.integers(high, size = size, dtype = np.int64)
+    return rng.randint(high, size = size, dtype = np.int64)
+
+
+def sample_distinct(rng, population, k):
+    """Chooses k distinct integers uniformly at random from [0, population), in time and memory proportional to k rather than the population.
+
+    Batches of integers are drawn with replacement until k distinct values have been found, and a random k of them are kept.
+    If more than half of the population is wanted, the complement is sampled instead.
+
+    Arguments:
+        rng {numpy.random.Generator} -- The random number generator, or the numpy.random module
+        population {int} -- The size of the population
+        k {int} -- The number of integers to choose
+
+    Returns:
+        numpy.array -- The chosen integers, in ascending order
+    """
+    if 2 * k > population:
+        return np.setdiff1d(np.arange(population, dtype = np.int64), sample_distinct(rng, population, population - k), assume_unique = True)
+    chosen = np.empty(0, dtype = np.int64)
+    while len(chosen) < k:
+        missing = k - len(chosen)
+        chosen = np.union1d(chosen, random_integers(rng, population, missing + missing // 10 + 16))
+    if len(chosen) > k:
+        chosen = np.sort(chosen[rng.permutation(len(chosen))[:k]])
+    return chosen
+
+
+class csr_node_view:
+    """Gives the nodes of a csr_graph the interface of a NetworkX NodeView: G.nodes(), G.nodes(data = True) and G.nodes[node]"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __call__(self, data = False):
+        if data:
+            return ((node, self[node]) for node in range(len(self.graph)))
+        return range(len(self.graph))
+
+    def __iter__(self):
+        return iter(range(len(self.graph)))
+
+    def __len__(self):
+        return len(self.graph)
+
+    def __contains__(self, node):
+        return isinstance(node, (int, np.integer)) and 0 <= node < len(self.graph)
+
+    def __getitem__(self, node):
+        if self.graph.blocks is None:
+            return {}
+        return {"block": int(self.graph.blocks[node])}
+
+
+class csr_graph:
+    """A static network stored in compressed sparse row arrays.
+
+    The nodes are labelled 0, ..., N - 1, and the neighbours of node i are indices[indptr[i]:indptr[i + 1]] in ascending order. If the nodes belong
+    to the blocks of a SBM, their blocks are stored in a third array. A csr_graph has the parts of the NetworkX interface used by the simulations,
+    so it can be passed to complex_epidemic_simulation in place of a graph, and it needs about 8 bytes per edge end rather than several hundred.
+    """
+
+    def __init__(self, indptr, indices, blocks = None):
+        """Wraps the arrays, without copying them
+
+        Arguments:
+            indptr {numpy.array} -- The offsets of the rows, of length N + 1
+            indices {numpy.array} -- The neighbours of every node, each row in ascending order
+
+        Keyword Arguments:
+            blocks {numpy.array} -- The block of every node (default: {None})
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.blocks = blocks
+        self.nodes = csr_node_view(self)
+
+    @classmethod
+    def from_networkx(cls, G):
+        """Converts a NetworkX graph, numbering its nodes in the order of G.nodes(). Self loops are dropped.
+
+        Arguments:
+            G {NetworkX graph} -- The network
+
+        Returns:
+            csr_graph -- The network in compressed sparse row form
+        """
+        node_index = {node: index for index, node in enumerate(G.nodes())}
+        N = len(node_index)
+        rows = [sorted({node_index[neighbour] for neighbour in neighbours if neighbour != node}) for node, neighbours in G.adjacency()]
+        indptr = np.zeros(N + 1, dtype = np.int64)
+        np.cumsum([len(row) for row in rows], out = indptr[1:])
+        indices = np.fromiter((neighbour for row in rows for neighbour in row), dtype = np.int64, count = indptr[-1])
+        blocks = None
+        if N > 0 and all("block" in data for _, data in G.nodes(data = True)):
+            blocks = np.array([data["block"] for _, data in G.nodes(data = True)], dtype = np.int64)
+        return cls(indptr, indices, blocks)
+
+    @classmethod
+    def from_edges(cls, N, u, v, blocks = None):
+        """Builds the CSR arrays from the endpoints of undirected edges, without NetworkX. Every edge must appear once, and not be a self loop.
+
+        Arguments:
+            N {int} -- The number of nodes
+            u {numpy.array} -- The first endpoint of every edge
+            v {numpy.array} -- The second endpoint of every edge
+
+        Keyword Arguments:
+            blocks {numpy.array} -- The block of every node (default: {None})
+
+        Returns:
+            csr_graph -- The network
+        """
+        sources = np.concatenate([u, v]).astype(np.int64)
+        targets = np.concatenate([v, u]).astype(np.int64)
+        order = np.lexsort((targets, sources))
+        indptr = np.zeros(N + 1, dtype = np.int64)
+        np.cumsum(np.bincount(sources, minlength = N), out = indptr[1:])
+        return cls(indptr, targets[order], blocks)
+
+    @classmethod
+    def stochastic_block_model(cls, sizes, p, random_state = None):
+        """Samples a stochastic block model straight into CSR arrays, with the same distribution as networkx.stochastic_block_model.
+
+        For every pair of blocks, the number of edges is drawn from a binomial distribution over the possible node pairs, and that many distinct
+        pairs are chosen at random. The work is proportional to the number of edges, rather than the number of node pairs.
+
+        Arguments:
+            sizes {list} -- The sizes of the blocks
+            p {list} -- The symmetric matrix of edge probabilities between blocks
+
+        Keyword Arguments:
+            random_state {int, numpy.random.SeedSequence, numpy.random.Generator} -- Seeds the random number generator. If not specified, the global numpy.random functions are used (default: {None})
+
+        Raises:
+            ValueError: Raised if p is not a symmetric matrix of probabilities with one row per block
+
+        Returns:
+            csr_graph -- The network, with the block of every node
+        """
+        sizes = np.asarray(sizes, dtype = np.int64)
+        p = np.asarray(p, dtype = float)
+        number_of_blocks = len(sizes)
+        if p.shape != (number_of_blocks, number_of_blocks) or not np.allclose(p, p.T) or p.min(initial = 0) < 0 or p.max(initial = 0) > 1:
+            raise ValueError("p must be a symmetric matrix of probabilities, with one row and column per block.")
+        rng = random_state if isinstance(random_state, np.random.Generator) else spawn_random_streams(random_state, ["edges"])["edges"]
+        starts = np.concatenate([[0], np.cumsum(sizes)])
+
+        u, v = [], []
+        for a in range(number_of_blocks):
+            for b in range(a, number_of_blocks):
+                pairs = int(sizes[a] * sizes[b]) if a != b else int(sizes[a] * (sizes[a] - 1) // 2)
+                if pairs == 0 or p[a, b] == 0:
+                    continue
+                chosen = sample_distinct(rng, pairs, int(rng.binomial(pairs, p[a, b])))
+                if a != b:
+                    u.append(starts[a] + chosen // sizes[b])
+                    v.append(starts[b] + chosen % sizes[b])
+                else:
+                    # The pairs i < j of a block are numbered j (j - 1) / 2 + i
+                    j = np.floor((1 + np.sqrt(1 + 8 * chosen.astype(float))) / 2).astype(np.int64)
+                    j -= j * (j - 1) // 2 > chosen
+                    j += (j + 1) * j // 2 <= chosen
+                    u.append(starts[a] + chosen - j * (j - 1) // 2)
+                    v.append(starts[a] + j)
+
+        blocks = np.repeat(np.arange(number_of_blocks, dtype = np.int64), sizes)
+        empty = [np.empty(0, dtype = np.int64)]
+        return cls.from_edges(int(starts[-1]), np.concatenate(u + empty), np.concatenate(v + empty), blocks)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        return int(self.indptr[-1]) // 2
+
+    def degree(self, node):
+        return int(self.indptr[node + 1] - self.indptr[node])
+
+    def __getitem__(self, node):
+        """Returns the neighbours of a node, as a view of the indices array"""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def adjacency(self):
+        """Iterates over (node, neighbours) pairs, like NetworkX"""
+        return ((node, self[node]) for node in range(len(self)))
+
+    def to_networkx(self):
+        """Builds the NetworkX graph, with a "block" attribute on every node if the blocks are known
+
+        Returns:
+            networkx.Graph -- The network
+        """
+        G = nx.Graph()
+        G.add_nodes_from(range(len(self)))
+        if self.blocks is not None:
+            nx.set_node_attributes(G, {node: int(block) for node, block in enumerate(self.blocks)}, "block")
+        sources = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        upper = sources < self.indices
+        G.add_edges_from(zip(sources[upper].tolist(), self.indices[upper].tolist()))
+        return G
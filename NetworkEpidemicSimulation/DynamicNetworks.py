@@ -1,24 +1,244 @@
 #This module contains code we use to construct dynamic networks
 import copy as c
+import csv
+import itertools
 import networkx as nx
 import numpy as np
+from NetworkEpidemicSimulation.RandomNumbers import spawn_random_streams
+from NetworkEpidemicSimulation.CompactNetworks import csr_graph, random_integers
+
+# The record layout of a binary contact stream, one record per contact event
+contact_event_dtype = np.dtype([("t", "<f8"), ("u", "<i8"), ("v", "<i8"), ("on", "i1")])
+
+class network_delta:
+    """Records the net changes made to the edges of a network during an increment, so that anything caching the network structure can be patched instead of rebuilt.
+
+    An edge that is removed and then added back again during the same increment is not reported."""
+
+    def __init__(self):
+        self.initial_state = {}
+        self.final_state = {}
+        self.migrations = []
+
+    def record(self, u, v, present_before, present_after):
+        """Records a change to the edge between u and v
+        
+        Arguments:
+            u {str, int, tuple} -- The dictionary key of the first node
+            v {str, int, tuple} -- The dictionary key of the second node
+            present_before {bool} -- Whether the edge was in the network before the change
+            present_after {bool} -- Whether the edge is in the network after the change
+        """
+        edge = (u, v) if (v, u) not in self.final_state else (v, u)
+        self.initial_state.setdefault(edge, present_before)
+        self.final_state[edge] = present_after
+
+    def record_migration(self, node, old_block, new_block):
+        """Records a node moving between blocks. Unlike edges, every migration is kept in the order it occurred.
+        
+        Arguments:
+            node {str, int, tuple} -- The dictionary key of the node
+            old_block {int} -- The block the node has left
+            new_block {int} -- The block the node has joined
+        """
+        self.migrations.append((node, old_block, new_block))
+
+    @property
+    def edges_added(self):
+        """Returns the edges that are in the network after the increment, but were not before it
+        
+        Returns:
+            list -- A list of (u, v) tuples
+        """
+        return [edge for edge, present in self.final_state.items() if present and not self.initial_state[edge]]
+
+    @property
+    def edges_removed(self):
+        """Returns the edges that were in the network before the increment, but are not after it
+        
+        Returns:
+            list -- A list of (u, v) tuples
+        """
+        return [edge for edge, present in self.final_state.items() if not present and self.initial_state[edge]]
+
+
+class migration_sampler:
+    """Draws the destinations of migrating nodes from a migration matrix, in bulk.
+
+    The sampling tables are computed once for the matrix and reused for every draw, so a destination costs a few array lookups rather than a multinomial draw.
+    Two methods are supported:
+    alias -- Walker's alias method. Every row is split into equally likely columns, each holding a destination and an alias, so a draw is one uniform column and one uniform comparison (Vose, 1991)
+    searchsorted -- The cumulative sum of every row is searched with a uniform draw
+    """
+
+    methods = ("alias", "searchsorted")
+
+    def __init__(self, m, method = "alias"):
+        """Computes the sampling tables of the migration matrix
+
+        Arguments:
+            m {list} -- The migration matrix, m[i][j] is the probability that a node leaving block i moves to block j
+
+        Keyword Arguments:
+            method {str} -- Either "alias" or "searchsorted" (default: {"alias"})
+
+        Raises:
+            ValueError: Raised if the method is unknown, or a row of the matrix is not a probability distribution
+        """
+        if method not in self.methods:
+            raise ValueError(f"Unknown migration sampling method {method}, expected one of {self.methods}.")
+        matrix = np.asarray(m, dtype = float)
+        if matrix.ndim != 2 or np.any(matrix < 0) or not np.allclose(matrix.sum(axis = 1), 1):
+            raise ValueError("Every row of the migration matrix must be a probability distribution.")
+        self.m = m
+        self.method = method
+        self.number_of_blocks = matrix.shape[1]
+        if method == "alias":
+            self.probability, self.alias = self.alias_tables(matrix)
+        else:
+            # Offsetting every row by its index lets a single search cover all the rows
+            cumulative = np.cumsum(matrix, axis = 1)
+            self.cumulative = (cumulative / cumulative[:, -1:] + np.arange(len(matrix))[:, None]).ravel()
+
+    @staticmethod
+    def alias_tables(matrix):
+        """Builds the alias table of every row of the matrix with Vose's method
+
+        Arguments:
+            matrix {numpy.array} -- The migration matrix
+
+        Returns:
+            tuple -- (probability, alias), arrays with the shape of the matrix
+        """
+        rows, columns = matrix.shape
+        probability = np.ones((rows, columns))
+        alias = np.tile(np.arange(columns), (rows, 1))
+        for row in range(rows):
+            scaled = (matrix[row] / matrix[row].sum() * columns).tolist()
+            small = [column for column, value in enumerate(scaled) if value < 1]
+            large = [column for column, value in enumerate(scaled) if value >= 1]
+            while small and large:
+                less, more = small.pop(), large.pop()
+                probability[row, less] = scaled[less]
+                alias[row, less] = more
+                scaled[more] = scaled[more] + scaled[less] - 1
+                (small if scaled[more] < 1 else large).append(more)
+            # Whatever is left has a probability of 1, up to rounding errors
+        return probability, alias
+
+    def sample(self, current_blocks, rng):
+        """Draws a destination for every migrating node
+
+        Arguments:
+            current_blocks {numpy.array, int} -- The block each node is leaving
+            rng {numpy.random.Generator} -- The random number generator, or the numpy.random module
+
+        Returns:
+            numpy.array, int -- The destination of each node, or a single destination if current_blocks is a single block
+        """
+        rows = np.asarray(current_blocks, dtype = np.int64)
+        if self.method == "alias":
+            columns = random_integers(rng, self.number_of_blocks, rows.shape)
+            destinations = np.where(rng.random(rows.shape) < self.probability[rows, columns], columns, self.alias[rows, columns])
+        else:
+            destinations = np.searchsorted(self.cumulative, rng.random(rows.shape) + rows, side = "right") - rows * self.number_of_blocks
+            destinations = np.minimum(destinations, self.number_of_blocks - 1)
+        return int(destinations) if rows.ndim == 0 else destinations
+
 
 class dynamic_stochastic_block_model:
     """This class enables dynamics for Stochastic Block Models (SBM) in the form of Birth and Death Processes and migration, where nodes are allowed to move between groups at random times.
     
     We require that an end-time is specified, as the data cannot be generated on the fly without impacting the reproducibility of an experiment, in the future, we can relax this restraint."""
     
-    def __init__(self, sizes, p, m, waiting_time_par, end_time, node_list = None, birth_rate = 0, custom_attribute = None, custom_migration_behaviour = None):
+    # The independent random number streams used by the network
+    random_stream_names = ["migration", "edges"]
+
+    def __init__(self, sizes, p, m, waiting_time_par, end_time, node_list = None, birth_rate = 0, custom_attribute = None, custom_migration_behaviour = None,
+                 random_state = None, migration_sampling = "alias"):
+        """Generates the initial network and the migration times of every node.
+
+        Arguments:
+            sizes {list} -- The sizes of the blocks
+            p {list} -- The matrix of edge probabilities between blocks
+            m {list} -- The migration matrix, m[i][j] is the probability that a node leaving block i moves to block j
+            waiting_time_par {float} -- The mean time a node stays in a block
+            end_time {float} -- The time until which migrations are generated
+
+        Keyword Arguments:
+            random_state {int, numpy.random.SeedSequence, numpy.random.Generator} -- Seeds independent random number streams for the migrations and the edges. If not specified, the global random number generators are used (default: {None})
+            migration_sampling {str} -- How the destinations of migrations are drawn, either "alias" or "searchsorted", see migration_sampler (default: {"alias"})
+        """
         #I have dropped the directed parameter since I cannot think of a simple way to implement it.
-        self.G = nx.generators.community.stochastic_block_model(sizes, p, node_list)
+        self.random_state = random_state
+        self.random_streams = spawn_random_streams(random_state, self.random_stream_names)
+        if random_state is None:
+            graph_seed = None
+        else:
+            graph_seed = int(self.random_streams["edges"].integers(2**32))
+        self.G = nx.generators.community.stochastic_block_model(sizes, p, node_list, seed = graph_seed)
         self.end_time = end_time
         self.waiting_time_par = waiting_time_par
+        self.migration_sampling = migration_sampling
         self.m = m
         self.p = p
         self.time = 0
         self.custom_migration_behaviour = custom_migration_behaviour
         self.custom_attribute = custom_attribute
-        [self.assign_membership_data(node) for node in self.G.nodes]
+        self.delta = network_delta()
+
+        # The membership schedules of every node are generated together, drawing the destinations in bulk
+        nodes = list(self.G.nodes)
+        indptr, blocks, times = generate_membership_schedules([self.G.nodes[node]["block"] for node in nodes], self.migration_sampler, waiting_time_par, end_time,
+                                                              self.random_streams["migration"])
+        for index, node in enumerate(nodes):
+            membership_data = list(zip(blocks[indptr[index]:indptr[index + 1]].tolist(), times[indptr[index]:indptr[index + 1]].tolist()))
+            self.G.nodes[node].update({"Membership Data": membership_data, "Current Membership Index": 0,
+                                       "Next Migration Time": membership_data[1][1] if len(membership_data) > 1 else np.inf})
+            if custom_attribute != None:
+                self.G.nodes[node].update(custom_attribute)
+
+    @property
+    def m(self):
+        """The migration matrix. Setting it computes the sampling tables of the new matrix"""
+        return self.migration_sampler.m
+
+    @m.setter
+    def m(self, m):
+        self.migration_sampler = migration_sampler(m, self.migration_sampling)
+
+    @classmethod
+    def from_compact(cls, model, custom_attribute = None, custom_migration_behaviour = None):
+        """Creates a dynamic SBM from a compact_stochastic_block_model, so that its network can be incremented. The network and the membership schedules
+        are copied into NetworkX node dictionaries, without being sampled again, and the random number streams of the compact model are carried on.
+
+        Arguments:
+            model {compact_stochastic_block_model} -- The compact model
+
+        Keyword Arguments:
+            custom_attribute {dict} -- Attributes added to every node (default: {None})
+            custom_migration_behaviour {function} -- A function of the form f(network, node) called after every migration (default: {None})
+
+        Returns:
+            dynamic_stochastic_block_model -- The dynamic SBM
+        """
+        network = cls.__new__(cls)
+        network.random_state = model.random_state
+        network.random_streams = model.random_streams
+        network.G = model.to_networkx()
+        network.end_time = model.end_time
+        network.waiting_time_par = model.waiting_time_par
+        network.migration_sampling = model.migration_sampling
+        network.m = model.m
+        network.p = model.p
+        network.time = 0
+        network.custom_migration_behaviour = custom_migration_behaviour
+        network.custom_attribute = custom_attribute
+        network.delta = network_delta()
+        if custom_attribute is not None:
+            for node in network.G.nodes:
+                network.G.nodes[node].update(custom_attribute)
+        return network
     
     def generate_migration_times(self, node, birth_time = 0):
         """ For a given node, generate the times at which they will migrate between the blocks.
@@ -34,12 +254,11 @@ class dynamic_stochastic_block_model:
         time = birth_time
         memberships = [(current_block, 0)] #(which block are they in, what time they started being in that block)
         while time < self.end_time:
-            length_of_stay = np.random.exponential(self.waiting_time_par)
+            length_of_stay = self.random_streams["migration"].exponential(self.waiting_time_par)
             time = time + length_of_stay
 
-            # We draw a sample from a multinomial distribution to determine the new group. The migration matrix m is used to sample the migration probabilities. We then work out the index to find out which group to move to
-            draw_sample = list(np.random.multinomial(1,self.m[current_block]))
-            new_block = draw_sample.index(1)
+            # The new group is drawn from the sampling tables of the migration matrix, which are computed once rather than for every draw
+            new_block = self.migration_sampler.sample(current_block, self.random_streams["migration"])
 
             memberships.append((new_block, time))
 
@@ -146,11 +365,16 @@ class dynamic_stochastic_block_model:
         self.G.nodes[node].update({"Current Membership Index": new_index})
 
         # Using the new index, update the next migration time variable
+        # If this was the last migration before the end time, then the node does not migrate again
         migration_times = self.get_node_migration_times(node)
-        self.G.nodes[node].update({"Next Migration Time": migration_times[new_index + 1]})
+        if new_index + 1 < len(migration_times):
+            self.G.nodes[node].update({"Next Migration Time": migration_times[new_index + 1]})
+        else:
+            self.G.nodes[node].update({"Next Migration Time": np.inf})
 
         # Using the new index, update the blocks membership
         memberships = self.get_node_memberships(node)
+        self.delta.record_migration(node, self.G.nodes[node]["block"], memberships[new_index])
         self.G.nodes[node].update({"block": memberships[new_index]})
 
         # The node now has it's new block membership, and the edges will be added based upon the network parameters
@@ -168,31 +392,52 @@ class dynamic_stochastic_block_model:
         """
         #Remove all the edges from the node
         neighbours = list(self.G.neighbors(node))
-        [self.G.remove_edge(node, connected_node) for connected_node in neighbours]
+        [self.remove_edge(node, connected_node) for connected_node in neighbours]
 
         # Get the block membership of the node
         node_membership = self.get_node_current_block(node)
 
-        # Loop over every other node in the network
-        for potential_neighbour in self.G.nodes:
-            if potential_neighbour != node:
-                
-                # Get the block membership of the other nodes in the network
-                potential_neighbour_membership = self.get_node_current_block(potential_neighbour)
+        # Get the block membership of every other node in the network
+        potential_neighbours = [potential_neighbour for potential_neighbour in self.G.nodes if potential_neighbour != node]
+        edge_forming_probs = [self.p[node_membership][self.get_node_current_block(potential_neighbour)] for potential_neighbour in potential_neighbours]
 
-                #Based upon the returned block memberships, we perform a bernoulli trial and add an edge
-                edge_forming_prob = self.p[node_membership][potential_neighbour_membership]
+        #Based upon the block memberships, we perform all the bernoulli trials in one draw and add the edges
+        edges_formed = self.random_streams["edges"].binomial(1, edge_forming_probs)
+        for potential_neighbour, edge_formed in zip(potential_neighbours, edges_formed):
+            if edge_formed == 1:
+                self.add_edge(node, potential_neighbour)
 
-                if np.random.binomial(1, edge_forming_prob) == 1:
-                    self.G.add_edge(node, potential_neighbour)
+    def add_edge(self, u, v):
+        """Adds an edge to the network and records it in the edge changes of the current increment
+        
+        Arguments:
+            u {str, int, tuple} -- The dictionary key of the first node
+            v {str, int, tuple} -- The dictionary key of the second node
+        """
+        self.delta.record(u, v, self.G.has_edge(u, v), True)
+        self.G.add_edge(u, v)
+
+    def remove_edge(self, u, v):
+        """Removes an edge from the network and records it in the edge changes of the current increment
+        
+        Arguments:
+            u {str, int, tuple} -- The dictionary key of the first node
+            v {str, int, tuple} -- The dictionary key of the second node
+        """
+        self.delta.record(u, v, self.G.has_edge(u, v), False)
+        self.G.remove_edge(u, v)
 
     def increment_network(self, increment_length):
         """Increment the network foraward in time
         
         Arguments:
             increment_length {int, float} -- The length of time to move the network forward
+
+        Returns:
+            network_delta -- The edges that were added and removed, and the migrations that occurred during the increment
         """
         self.time += increment_length
+        self.delta = network_delta()
 
         #Which nodes need to have a migration?
         to_be_migrated = self.determine_nodes_to_migrate(self.time)
@@ -200,5 +445,312 @@ class dynamic_stochastic_block_model:
         while to_be_migrated != []:
             [self.perform_migration_event(node) for node in to_be_migrated]
             to_be_migrated = self.determine_nodes_to_migrate(self.time)
+
+        return self.delta
+
+
+def generate_membership_schedules(initial_blocks, sampler, waiting_time_par, end_time, rng):
+    """Generates the migration times and blocks of every node at once, in the same form as dynamic_stochastic_block_model.generate_migration_times.
+
+    Each round draws the next stay of every node that has not yet passed the end time, so the number of rounds is the largest number of migrations of any node.
+    The schedules are stored in CSR form: the memberships of node i are blocks[indptr[i]:indptr[i + 1]], starting at times[indptr[i]:indptr[i + 1]].
+
+    Arguments:
+        initial_blocks {numpy.array} -- The block of every node at time 0
+        sampler {migration_sampler} -- Draws the destinations from the migration matrix
+        waiting_time_par {float} -- The mean time a node stays in a block
+        end_time {float} -- The time until which migrations are generated
+        rng {numpy.random.Generator} -- The random number generator, or the numpy.random module
+
+    Returns:
+        tuple -- (indptr, blocks, times)
+    """
+    initial_blocks = np.asarray(initial_blocks, dtype = np.int64)
+    N = len(initial_blocks)
+    nodes, blocks, times = [np.arange(N)], [initial_blocks], [np.zeros(N)]
+
+    current_block = initial_blocks.copy()
+    time = np.zeros(N)
+    active = np.flatnonzero(time < end_time)
+    while active.size > 0:
+        time[active] += rng.exponential(waiting_time_par, active.size)
+        new_block = sampler.sample(current_block[active], rng)
+        current_block[active] = new_block
+        nodes.append(active)
+        blocks.append(new_block)
+        times.append(time[active])
+        active = active[time[active] < end_time]
+
+    # The rounds are in time order, so a stable sort by node keeps every schedule in time order
+    nodes = np.concatenate(nodes)
+    order = np.argsort(nodes, kind = "stable")
+    indptr = np.zeros(N + 1, dtype = np.int64)
+    np.cumsum(np.bincount(nodes, minlength = N), out = indptr[1:])
+    return indptr, np.concatenate(blocks)[order], np.concatenate(times)[order]
+
+
+class compact_stochastic_block_model:
+    """Builds the initial network and membership schedules of a dynamic SBM in numpy arrays, which is much faster than dynamic_stochastic_block_model for large networks.
+
+    The network is sampled straight into a csr_graph, and the membership schedules of every node are generated together, one round of draws at a time.
+    Nothing is stored in NetworkX dictionaries: the graph is available as a csr_graph, which can be passed directly to complex_epidemic_simulation for a
+    static network, while to_networkx and to_dynamic build NetworkX objects on request.
+    """
+
+    # The independent random number streams used by the network
+    random_stream_names = dynamic_stochastic_block_model.random_stream_names
+
+    def __init__(self, sizes, p, m, waiting_time_par, end_time, random_state = None, migration_sampling = "alias"):
+        """Samples the network and the membership schedules
+
+        Arguments:
+            sizes {list} -- The sizes of the blocks
+            p {list} -- The matrix of edge probabilities between blocks
+            m {list} -- The migration matrix, m[i][j] is the probability that a node leaving block i moves to block j
+            waiting_time_par {float} -- The mean time a node stays in a block
+            end_time {float} -- The time until which migrations are generated
+
+        Keyword Arguments:
+            random_state {int, numpy.random.SeedSequence, numpy.random.Generator} -- Seeds independent random number streams for the migrations and the edges. If not specified, the global random number generators are used (default: {None})
+            migration_sampling {str} -- How the destinations of migrations are drawn, either "alias" or "searchsorted", see migration_sampler (default: {"alias"})
+        """
+        self.random_state = random_state
+        self.random_streams = spawn_random_streams(random_state, self.random_stream_names)
+        self.p = p
+        self.m = m
+        self.migration_sampling = migration_sampling
+        self.migration_sampler = migration_sampler(m, migration_sampling)
+        self.waiting_time_par = waiting_time_par
+        self.end_time = end_time
+        self.graph = csr_graph.stochastic_block_model(sizes, p, self.random_streams["edges"])
+        self.membership_indptr, self.membership_blocks, self.membership_times = generate_membership_schedules(
+            self.graph.blocks, self.migration_sampler, waiting_time_par, end_time, self.random_streams["migration"])
+
+    @property
+    def N(self):
+        return len(self.graph)
+
+    def get_node_memberships(self, node):
+        """Returns the sequence of blocks that the node will belong to, as a view of the schedule arrays"""
+        return self.membership_blocks[self.membership_indptr[node]:self.membership_indptr[node + 1]]
+
+    def get_node_migration_times(self, node):
+        """Returns the times at which the node will join each block of its sequence, as a view of the schedule arrays"""
+        return self.membership_times[self.membership_indptr[node]:self.membership_indptr[node + 1]]
+
+    def get_next_migration_times(self):
+        """Returns the time of the first migration of every node, or infinity for nodes that never migrate
+
+        Returns:
+            numpy.array -- The times, in node order
+        """
+        has_migration = np.diff(self.membership_indptr) > 1
+        next_times = np.full(self.N, np.inf)
+        next_times[has_migration] = self.membership_times[self.membership_indptr[:-1][has_migration] + 1]
+        return next_times
+
+    def to_networkx(self):
+        """Builds the NetworkX graph, with the same node attributes as dynamic_stochastic_block_model
+
+        Returns:
+            networkx.Graph -- The network
+        """
+        G = self.graph.to_networkx()
+        next_times = self.get_next_migration_times()
+        for node in range(self.N):
+            G.nodes[node].update({"Membership Data": list(zip(self.get_node_memberships(node).tolist(), self.get_node_migration_times(node).tolist())),
+                                  "Current Membership Index": 0,
+                                  "Next Migration Time": next_times[node]})
+        return G
+
+    def to_dynamic(self, custom_attribute = None, custom_migration_behaviour = None):
+        """Returns a dynamic_stochastic_block_model with this network and these membership schedules, see dynamic_stochastic_block_model.from_compact
+        """
+        return dynamic_stochastic_block_model.from_compact(self, custom_attribute, custom_migration_behaviour)
+
+
+class temporal_contact_network:
+    """This class replays a pre-recorded stream of timestamped contact events as a dynamic network.
+
+    Each event is of the form (t, u, v, on), where on = 1 if the contact between u and v starts at time t and on = 0 if it ends.
+    The events must be sorted by time, and are read from the file in chunks as the network is incremented, so that only a bounded number of events are held in memory.
+
+    Two file formats are supported:
+    csv - One event per line in the form t,u,v,on. A header line is skipped.
+    binary - Packed records with the layout contact_event_dtype, as written by write_binary_events."""
+
+    def __init__(self, path, nodes = None, start_time = 0, file_format = None, chunk_size = 65536, node_type = int):
+        """Opens the contact stream and applies any events that occur at or before the start time
+        
+        Arguments:
+            path {str} -- The path to the contact stream
         
+        Keyword Arguments:
+            nodes {list} -- The nodes of the network. If not specified, the whole stream is read once to find them (default: {None})
+            start_time {int, float} -- The time the network starts at (default: {0})
+            file_format {str} -- Either "csv" or "binary". If not specified, files ending in .csv are read as csv and all others as binary (default: {None})
+            chunk_size {int} -- The number of events read from the file at a time (default: {65536})
+            node_type {function} -- Converts the node labels of a csv stream into node keys (default: {int})
+        """
+        if file_format is None:
+            file_format = "csv" if str(path).lower().endswith(".csv") else "binary"
+        if file_format not in ("csv", "binary"):
+            raise ValueError(f"Unknown contact stream format {file_format}, expected csv or binary.")
+
+        self.path = path
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.node_type = node_type
+        self.time = start_time
+
+        self.G = nx.Graph()
+        if nodes is None:
+            nodes = self.read_nodes()
+        self.G.add_nodes_from(nodes)
+
+        self.open_stream()
+        self.delta = network_delta()
+        self.apply_events(start_time, inclusive = True)
+
+    def open_stream(self):
+        """Opens the contact stream at the first event"""
+        self.file = open(self.path, "r", newline = "") if self.file_format == "csv" else open(self.path, "rb")
+        self.reader = csv.reader(self.file) if self.file_format == "csv" else None
+        self.chunk = np.empty(0, dtype = contact_event_dtype)
+        self.position = 0
+        self.last_time = -np.inf
+        self.exhausted = False
+        # Only the first line of a csv file that is not empty may be a header
+        self.header_allowed = True
+
+    def close(self):
+        """Closes the contact stream"""
+        if not self.file.closed:
+            self.file.close()
+        self.exhausted = True
+
+    def read_chunk(self):
+        """Reads the next chunk of events from the file
+        
+        Returns:
+            numpy.array -- A structured array of events, empty if the end of the file has been reached
+
+        Raises:
+            ValueError: Raised if a line of a csv file, other than a header on the first line, is not a contact event, or if the stream is not sorted by time
+        """
+        if self.file_format == "binary":
+            chunk = np.fromfile(self.file, dtype = contact_event_dtype, count = self.chunk_size)
+        else:
+            rows = []
+            lines_read = self.chunk_size
+            # Keep reading until we have some events, or the end of the file is reached
+            while rows == [] and lines_read == self.chunk_size:
+                lines_read = 0
+                for row in itertools.islice(self.reader, self.chunk_size):
+                    lines_read += 1
+                    if row == []:
+                        continue
+                    header_allowed, self.header_allowed = self.header_allowed, False
+                    try:
+                        t = float(row[0])
+                    except ValueError:
+                        if header_allowed:
+                            # This is a header line
+                            continue
+                        raise ValueError(f"Line {self.reader.line_num} of the contact stream {self.path} is not a contact event: {row}")
+                    try:
+                        rows.append((t, self.node_type(row[1]), self.node_type(row[2]), int(row[3])))
+                    except (ValueError, IndexError):
+                        raise ValueError(f"Line {self.reader.line_num} of the contact stream {self.path} is not a contact event: {row}")
+            chunk = np.array(rows, dtype = [("t", "<f8"), ("u", "O"), ("v", "O"), ("on", "i1")])
+
+        if len(chunk) > 0:
+            if chunk["t"][0] < self.last_time or np.any(np.diff(chunk["t"]) < 0):
+                raise ValueError("The contact stream is not sorted by time.")
+            self.last_time = chunk["t"][-1]
+        return chunk
+
+    def read_nodes(self):
+        """Reads through the whole stream once to find every node that appears in it
+        
+        Returns:
+            list -- The sorted list of nodes
+        """
+        self.open_stream()
+        nodes = set()
+        chunk = self.read_chunk()
+        while len(chunk) > 0:
+            nodes.update(chunk["u"].tolist())
+            nodes.update(chunk["v"].tolist())
+            chunk = self.read_chunk()
+        self.close()
+        return sorted(nodes)
+
+    def apply_events(self, time_limit, inclusive = False):
+        """Applies every event that occurs before the time limit, reading more of the stream as required
+        
+        Arguments:
+            time_limit {int, float} -- Events with t < time_limit are applied
+        
+        Keyword Arguments:
+            inclusive {bool} -- If true, events with t == time_limit are also applied (default: {False})
+
+        Raises:
+            ValueError: Raised if an event names a node that is not in the network, which can happen if the nodes were specified
+        """
+        side = "right" if inclusive else "left"
+        while not self.exhausted:
+            if self.position == len(self.chunk):
+                self.chunk = self.read_chunk()
+                self.position = 0
+                if len(self.chunk) == 0:
+                    self.close()
+                    break
 
+            end = self.position + np.searchsorted(self.chunk["t"][self.position:], time_limit, side = side)
+            for t, u, v, on in self.chunk[self.position:end].tolist():
+                if u not in self.G or v not in self.G:
+                    raise ValueError(f"The contact event ({t}, {u}, {v}, {on}) names a node that is not in the network.")
+                if on and not self.G.has_edge(u, v):
+                    self.delta.record(u, v, False, True)
+                    self.G.add_edge(u, v)
+                elif not on and self.G.has_edge(u, v):
+                    self.delta.record(u, v, True, False)
+                    self.G.remove_edge(u, v)
+            self.position = end
+
+            # The rest of the chunk is in the future
+            if self.position < len(self.chunk):
+                break
+
+    def increment_network(self, increment_length):
+        """Increment the network forward in time, applying the contact events that occur during the increment
+        
+        Arguments:
+            increment_length {int, float} -- The length of time to move the network forward
+
+        Returns:
+            network_delta -- The edges that were added and removed during the increment
+        """
+        self.time += increment_length
+        self.delta = network_delta()
+        self.apply_events(self.time)
+        return self.delta
+
+    @staticmethod
+    def write_binary_events(path, t, u, v, on):
+        """Writes contact events to a binary contact stream. The events are written in the order given, so should already be sorted by time.
+        
+        Arguments:
+            path {str} -- The path of the file to write
+            t {list} -- The times of the events
+            u {list} -- The first node of each contact
+            v {list} -- The second node of each contact
+            on {list} -- 1 if the contact starts, 0 if it ends
+        """
+        events = np.empty(len(t), dtype = contact_event_dtype)
+        events["t"] = t
+        events["u"] = u
+        events["v"] = v
+        events["on"] = on
+        events.tofile(path)
@@ -0,0 +1,391 @@
+#This module contains the code we use to run ensembles of replicate simulations
+import inspect
+import uuid
+import numpy as np
+from statistics import NormalDist
+from NetworkEpidemicSimulation.Results import epidemic_result
+from NetworkEpidemicSimulation.RandomNumbers import spawn_seeds
+from NetworkEpidemicSimulation.Executors import resolve_shared, shared_reference
+
+
+class welford_estimator:
+    """Keeps a running mean and variance of a stream of observations, using Welford's algorithm so that no observations need to be stored."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.sum_of_squares = 0.0
+
+    def update(self, value):
+        """Adds an observation to the estimator
+
+        Arguments:
+            value {float} -- The observation
+        """
+        self.count += 1
+        difference = value - self.mean
+        self.mean += difference / self.count
+        self.sum_of_squares += difference * (value - self.mean)
+
+    def merge(self, other):
+        """Combines the observations of another estimator into this one, for example one kept by a different process
+
+        Arguments:
+            other {welford_estimator} -- The other estimator
+        """
+        count = self.count + other.count
+        if count == 0:
+            return
+        difference = other.mean - self.mean
+        self.sum_of_squares += other.sum_of_squares + difference ** 2 * self.count * other.count / count
+        self.mean += difference * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        """The sample variance, or nan if there are fewer than two observations"""
+        if self.count < 2:
+            return np.nan
+        return self.sum_of_squares / (self.count - 1)
+
+    @property
+    def standard_error(self):
+        return np.sqrt(self.variance / self.count) if self.count > 1 else np.nan
+
+    def confidence_interval(self, confidence = 0.95):
+        """Returns the normal approximation confidence interval of the mean
+
+        Keyword Arguments:
+            confidence {float} -- The confidence level (default: {0.95})
+
+        Returns:
+            tuple -- (lower, upper)
+        """
+        half_width = NormalDist().inv_cdf((1 + confidence) / 2) * self.standard_error
+        return (self.mean - half_width, self.mean + half_width)
+
+
+class quantile_sketch:
+    """Estimates a quantile of a stream of observations in constant memory, using the P-squared algorithm of Jain and Chlamtac (1985).
+
+    Five markers are kept, whose heights are adjusted with piecewise-parabolic interpolation as observations arrive. The first five observations are stored exactly."""
+
+    def __init__(self, quantile):
+        """Creates the sketch
+
+        Arguments:
+            quantile {float} -- The quantile to estimate, between 0 and 1
+        """
+        self.quantile = quantile
+        self.heights = []
+        self.positions = np.arange(1, 6, dtype = float)
+        self.desired = np.array([1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5])
+        self.increments = np.array([0, quantile / 2, quantile, (1 + quantile) / 2, 1])
+        self.count = 0
+
+    def update(self, value):
+        """Adds an observation to the sketch
+
+        Arguments:
+            value {float} -- The observation
+        """
+        self.count += 1
+        if self.count <= 5:
+            self.heights.append(float(value))
+            if self.count == 5:
+                self.heights = np.sort(self.heights)
+            return
+
+        heights = self.heights
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = int(np.searchsorted(heights, value, side = "right")) - 1
+        self.positions[cell + 1:] += 1
+        self.desired += self.increments
+
+        for marker in range(1, 4):
+            offset = self.desired[marker] - self.positions[marker]
+            if (offset >= 1 and self.positions[marker + 1] - self.positions[marker] > 1) or (offset <= -1 and self.positions[marker - 1] - self.positions[marker] < -1):
+                step = 1 if offset > 0 else -1
+                height = self.parabolic(marker, step)
+                if not heights[marker - 1] < height < heights[marker + 1]:
+                    height = heights[marker] + step * (heights[marker + step] - heights[marker]) / (self.positions[marker + step] - self.positions[marker])
+                heights[marker] = height
+                self.positions[marker] += step
+
+    def parabolic(self, marker, step):
+        heights, positions = self.heights, self.positions
+        return heights[marker] + step / (positions[marker + 1] - positions[marker - 1]) * (
+            (positions[marker] - positions[marker - 1] + step) * (heights[marker + 1] - heights[marker]) / (positions[marker + 1] - positions[marker])
+            + (positions[marker + 1] - positions[marker] - step) * (heights[marker] - heights[marker - 1]) / (positions[marker] - positions[marker - 1]))
+
+    @property
+    def value(self):
+        """The current estimate of the quantile, or nan if there are no observations"""
+        if self.count == 0:
+            return np.nan
+        if self.count < 5:
+            return float(np.quantile(self.heights, self.quantile))
+        return float(self.heights[2])
+
+
+def replicate_statistics(result):
+    """Extracts the statistics of one replicate that are tracked by an adaptive ensemble
+
+    Arguments:
+        result {epidemic_result, dict, float} -- The output of a replicate. A number is taken to be the final size, as returned by SIR_Selke.compute_final_size
+
+    Returns:
+        dict -- The statistics, of the form {name: value}, including "final size" and, for trajectories, "peak"
+    """
+    if isinstance(result, epidemic_result):
+        return {"final size": result.final_size, "peak": int(result.counts("Infected").max())}
+    if isinstance(result, dict):
+        return result
+    return {"final size": result}
+
+
+class adaptive_ensemble:
+    """Runs replicates of a simulation until the confidence intervals of the tracked statistics are narrow enough.
+
+    The statistics of every replicate are streamed into a welford_estimator and quantile sketches, so the replicates themselves are not stored.
+    Replicates are dispatched in batches, each with its own seed spawned from the seed of the ensemble, and no more batches are dispatched once the
+    confidence interval of the mean of every statistic is narrower than the target width.
+
+    For example, to estimate the final size of a network epidemic to within 2 nodes:
+        simulation = complex_epidemic_simulation(...)
+        def replicate(seed):
+            simulation.reset(seed)
+            return simulation.iterate_epidemic()
+        summary = adaptive_ensemble(replicate, target_width = 2).run()
+
+    or of SIR_Selke:
+        adaptive_ensemble(lambda seed: SIR_Selke(N, beta, 1, 5, random_state = seed).compute_final_size(), target_width = 2, statistics = ["final size"])
+    """
+
+    def __init__(self, replicate, target_width, statistics = ("final size", "peak"), relative = False, confidence = 0.95, quantiles = (0.05, 0.5, 0.95),
+                 min_replicates = 10, max_replicates = 10000, batch_size = 10, seed = None, map_function = map):
+        """Sets up the estimators of the ensemble
+
+        Arguments:
+            replicate {function} -- A function of the form f(seed) that runs one replicate and returns an epidemic_result, a dictionary of statistics or a final size
+            target_width {float} -- The width of the confidence interval at which the ensemble stops
+
+        Keyword Arguments:
+            statistics {list} -- The names of the statistics that must reach the target width (default: {("final size", "peak")})
+            relative {bool} -- If True, the target width is relative to the mean of each statistic (default: {False})
+            confidence {float} -- The confidence level of the intervals (default: {0.95})
+            quantiles {tuple} -- The quantiles of each statistic that are sketched (default: {(0.05, 0.5, 0.95)})
+            min_replicates {int} -- The number of replicates run before the intervals are checked (default: {10})
+            max_replicates {int} -- The ensemble stops after this many replicates, even if the target has not been reached (default: {10000})
+            batch_size {int} -- The number of replicates dispatched at once (default: {10})
+            seed {int, numpy.random.SeedSequence} -- The seed the replicate seeds are spawned from (default: {None})
+            map_function {function} -- Used to run each batch, for example the map method of a multiprocessing.Pool to run the batch in parallel (default: {map})
+        """
+        self.replicate = replicate
+        self.target_width = target_width
+        self.statistics = list(statistics)
+        self.relative = relative
+        self.confidence = confidence
+        self.quantiles = quantiles
+        self.min_replicates = min_replicates
+        self.max_replicates = max_replicates
+        self.batch_size = batch_size
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.map_function = map_function
+        self.estimators = {}
+        self.sketches = {}
+
+    @property
+    def replicates(self):
+        return max((estimator.count for estimator in self.estimators.values()), default = 0)
+
+    def update(self, result):
+        """Streams the statistics of one replicate into the estimators
+
+        Arguments:
+            result {epidemic_result, dict, float} -- The output of the replicate
+        """
+        for name, value in replicate_statistics(result).items():
+            if name not in self.estimators:
+                self.estimators[name] = welford_estimator()
+                self.sketches[name] = [quantile_sketch(quantile) for quantile in self.quantiles]
+            self.estimators[name].update(value)
+            for sketch in self.sketches[name]:
+                sketch.update(value)
+
+    def interval_width(self, name):
+        lower, upper = self.estimators[name].confidence_interval(self.confidence)
+        width = upper - lower
+        if self.relative:
+            width = width / abs(self.estimators[name].mean) if self.estimators[name].mean != 0 else np.inf
+        return width
+
+    def converged(self):
+        """Returns True once every tracked statistic has a confidence interval narrower than the target width
+        """
+        if self.replicates < self.min_replicates:
+            return False
+        for name in self.statistics:
+            if name not in self.estimators:
+                raise ValueError(f"The replicates do not return the statistic {name}.")
+            width = self.interval_width(name)
+            # A statistic that never varies has a width of 0
+            if np.isnan(width) or width > self.target_width:
+                return False
+        return True
+
+    def run(self):
+        """Dispatches batches of replicates until the statistics converge or max_replicates is reached
+
+        Returns:
+            dict -- The summary of every statistic, see summary
+        """
+        while not self.converged() and self.replicates < self.max_replicates:
+            batch = min(self.batch_size, self.max_replicates - self.replicates)
+            for result in self.map_function(self.replicate, self.seed_sequence.spawn(batch)):
+                self.update(result)
+        return self.summary()
+
+    def summary(self):
+        """Returns the estimates of every statistic
+
+        Returns:
+            dict -- Of the form {name: {"replicates", "mean", "variance", "confidence interval", "quantiles", "converged"}}
+        """
+        converged = self.replicates >= self.min_replicates
+        return {name: {"replicates": estimator.count,
+                       "mean": estimator.mean,
+                       "variance": estimator.variance,
+                       "confidence interval": estimator.confidence_interval(self.confidence),
+                       "quantiles": {sketch.quantile: sketch.value for sketch in self.sketches[name]},
+                       "converged": converged and self.interval_width(name) <= self.target_width}
+                for name, estimator in self.estimators.items()}
+
+
+# The simulation built by simulation_replicate in this process, so that each worker builds its simulation once. Only the simulation of the
+# latest replicate is kept, so a long-lived worker that runs several ensembles does not hold on to the networks of the earlier ones
+worker_simulations = {}
+
+
+class simulation_replicate:
+    """A replicate of complex_epidemic_simulation that can be sent to other processes, for use with adaptive_ensemble.
+
+    The first replicate run by a process builds the simulation, and the replicates that follow reset it with their own seed. Only the statistics of
+    each replicate are returned, rather than the whole result. To ship the network to each worker once, pass a shared_reference, for example:
+        executor.share(network = G)
+        replicate = simulation_replicate(shared_reference("network"), beta = 1, ...)
+        adaptive_ensemble(replicate, target_width = 2, map_function = executor.map).run()
+    """
+
+    def __init__(self, G, **simulation_parameters):
+        """Stores the parameters of the simulation
+        
+        Arguments:
+            G {NetworkX graph, shared_reference} -- The network
+
+        Keyword Arguments:
+            simulation_parameters -- The other arguments of complex_epidemic_simulation
+        """
+        self.G = G
+        self.simulation_parameters = simulation_parameters
+        self.key = uuid.uuid4().hex
+
+    def __call__(self, seed):
+        from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+        simulation = worker_simulations.get(self.key)
+        if simulation is None:
+            worker_simulations.clear()
+            simulation = complex_epidemic_simulation(resolve_shared(self.G), random_state = seed, **self.simulation_parameters)
+            worker_simulations[self.key] = simulation
+        else:
+            simulation.reset(seed)
+        return replicate_statistics(simulation.iterate_epidemic())
+
+
+# The attributes of complex_epidemic_simulation that are changed by set_parameters
+sweep_attributes = ("beta", "node_beta", "block_beta", "hazard_rate", "hazard", "hazard_parameters")
+
+
+def sweep_task(task):
+    """Runs every point of a parameter grid against one set of pre-generated data. This is the unit of work of parameter_sweep, kept at module level so that it can be sent to other processes.
+
+    Every point is applied to the parameters the simulation was built with, so the result of a point does not depend on the points before it.
+
+    Arguments:
+        task {tuple} -- (G, grid, seed, simulation_parameters), where G may be a shared_reference
+
+    Returns:
+        list -- The statistics of each grid point, see replicate_statistics
+    """
+    from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+    G, grid, seed, simulation_parameters = task
+    parameters = dict(simulation_parameters)
+    if "beta" not in parameters:
+        # parameter_sweep has checked that every point specifies beta
+        parameters["beta"] = grid[0]["beta"]
+    simulation = complex_epidemic_simulation(resolve_shared(G), random_state = seed, **parameters)
+    base = {name: getattr(simulation, name) for name in sweep_attributes}
+
+    statistics = []
+    for point, grid_parameters in enumerate(grid):
+        if point > 0:
+            simulation.reset(redraw = False)
+        for name, value in base.items():
+            setattr(simulation, name, value)
+        simulation.set_parameters(**grid_parameters)
+        statistics.append(replicate_statistics(simulation.iterate_epidemic()))
+    return statistics
+
+
+def parameter_sweep(G, grid, seeds, map_function = map, executor = None, **simulation_parameters):
+    """Evaluates a grid of parameters of complex_epidemic_simulation with common random numbers.
+
+    For every seed, one simulation is built, so the pre-generated resistances and infection periods, the initial infected nodes and the adjacency of the network
+    are created once and reused for every point of the grid. Differences between grid points are then due to the parameters alone, not to the random numbers.
+    The seeds are independent tasks, so they can be run in parallel by passing the map method of a process pool, or an executor from the Executors module.
+    With an executor, the network is shipped to each worker once and the tasks only carry the seeds and parameters.
+
+    Arguments:
+        G {NetworkX graph} -- The network
+        grid {list} -- The grid points, each a dictionary of the parameters accepted by complex_epidemic_simulation.set_parameters, such as {"beta": 0.1}. Each point is applied to simulation_parameters, not to the point before it
+        seeds {int, list} -- Either a number of replicates, whose seeds are spawned from seed 0, or a list of seeds
+
+    Keyword Arguments:
+        map_function {function} -- Used to run the tasks, for example the map method of a multiprocessing.Pool (default: {map})
+        executor {local_executor, futures_executor, file_queue_executor} -- If specified, the tasks are run by the executor instead of map_function (default: {None})
+        simulation_parameters -- The other arguments of complex_epidemic_simulation, such as infection_period_parameters, initial_infected, time_increment and max_iterations
+
+    Returns:
+        dict -- Of the form {statistic: array of shape (grid points, replicates)}, plus "grid": the grid
+
+    Raises:
+        ValueError: Raised if a grid point specifies a parameter that set_parameters does not accept, or if beta is specified by neither simulation_parameters nor every grid point
+    """
+    from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+    if isinstance(seeds, int):
+        seeds = spawn_seeds(0, seeds)
+    grid = [dict(point) for point in grid]
+    accepted = set(inspect.signature(complex_epidemic_simulation.set_parameters).parameters) - {"self"}
+    for point in grid:
+        unknown = sorted(set(point) - accepted)
+        if unknown:
+            raise ValueError(f"The grid point {point} specifies {unknown}, but only {sorted(accepted)} can be swept. Pass the other parameters as keyword arguments of parameter_sweep.")
+    if "beta" not in simulation_parameters and not all("beta" in point for point in grid):
+        raise ValueError("beta must be specified either as a keyword argument of parameter_sweep or by every grid point.")
+    if executor is not None:
+        executor.share(network = G)
+        G = shared_reference("network")
+        map_function = executor.map
+    tasks = [(G, grid, seed, simulation_parameters) for seed in seeds]
+
+    results = list(map_function(sweep_task, tasks))
+    names = results[0][0].keys()
+    sweep = {name: np.array([[replicate[point][name] for replicate in results] for point in range(len(grid))]) for name in names}
+    sweep["grid"] = grid
+    return sweep
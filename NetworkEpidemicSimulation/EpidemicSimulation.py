@@ -1,59 +1,493 @@
 import numpy as np
-import copy as c
+from collections.abc import MutableMapping
+from enum import IntEnum
+from NetworkEpidemicSimulation.RandomNumbers import spawn_random_streams
+
+class empirical_distribution:
+    """An infection period distribution defined by data, for example a set of observed infection periods.
+
+    The inverse of the cumulative distribution function is tabulated once when the distribution is created, so drawing a large block
+    of values only costs a uniform draw and a table lookup per value. The class has the same rvs and ppf methods as a frozen scipy.stats
+    distribution, so it can be used anywhere that they can."""
+
+    def __init__(self, observations, weights = None, interpolate = False):
+        """Tabulates the inverse cumulative distribution function
+        
+        Arguments:
+            observations {list} -- The values the distribution can take
+        
+        Keyword Arguments:
+            weights {list} -- The relative probability of each observation (default: {equal weights})
+            interpolate {bool} -- If true, the inverse cumulative distribution function is linearly interpolated between the observations, giving a continuous distribution. Otherwise only the observed values are drawn (default: {False})
+        """
+        observations = np.asarray(observations, dtype = float)
+        if weights is None:
+            weights = np.ones(len(observations))
+        weights = np.asarray(weights, dtype = float)
+        if len(observations) == 0 or len(weights) != len(observations) or np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError("An empirical distribution needs at least one observation, and one non-negative weight per observation.")
+
+        ordering = np.argsort(observations, kind = "stable")
+        self.values = observations[ordering]
+        self.cdf = np.cumsum(weights[ordering]) / weights.sum()
+        self.cdf[-1] = 1
+        self.interpolate = interpolate
+
+    @classmethod
+    def from_distribution(cls, distribution, table_size = 4096):
+        """Tabulates the quantile function of a distribution, so that it can be sampled from cheaply. Useful for distributions whose random variates are expensive to compute.
+        
+        Arguments:
+            distribution {scipy.stats frozen distribution} -- Any object with a ppf method
+        
+        Keyword Arguments:
+            table_size {int} -- The number of points in the table (default: {4096})
+        
+        Returns:
+            empirical_distribution -- The tabulated distribution
+        """
+        quantiles = (np.arange(table_size) + 0.5) / table_size
+        return cls(distribution.ppf(quantiles), interpolate = True)
+
+    def ppf(self, q):
+        """The inverse of the cumulative distribution function
+        
+        Arguments:
+            q {numpy.array} -- Probabilities between 0 and 1
+        
+        Returns:
+            numpy.array -- The quantiles
+        """
+        if self.interpolate:
+            return np.interp(q, self.cdf, self.values)
+        return self.values[np.minimum(np.searchsorted(self.cdf, q, side = "right"), len(self.values) - 1)]
+
+    def rvs(self, size = None, random_state = None):
+        """Draws random variates from the distribution
+        
+        Keyword Arguments:
+            size {int, tuple} -- The shape of the array of variates (default: {None})
+            random_state {None, int, numpy.random.Generator} -- The random number generator. If None, the global numpy.random functions are used (default: {None})
+        
+        Returns:
+            numpy.array -- The random variates
+        """
+        if random_state is None:
+            random_state = np.random
+        elif not hasattr(random_state, "random"):
+            random_state = np.random.default_rng(random_state)
+        return self.ppf(random_state.random(size))
+
 
 class infection_period_handler:
 
-    def __init__(self, N, infection_period_distribution = None, infection_period_parameters = None):
-        """The class calls numpy.random distributions differently, depending on how many parameters are being passed to it.
+    def __init__(self, N, infection_period_distribution = None, infection_period_parameters = None, rng = None):
+        """Draws infection periods from any of the supported kinds of distribution, in blocks of any shape.
 
-        Examples:
+        The infection_period_distribution can be:
+        None - The exponential distribution, with mean infection_period_parameters
+        A frozen scipy.stats distribution, or an empirical_distribution - Draws are made with distribution.rvs, the infection_period_parameters are not used
+        The name of a numpy.random.Generator method, such as "gamma" - The class will return rng.gamma(*infection_period_parameters, size = shape)
+        A function, such as a numpy.random distribution - The class will return infection_period_distribution(*infection_period_parameters, n)
 
-        If parameters = [parameter_1] then the class will attempt to return:
-        infection_period_distribution(parameter_1, N)
+        Examples:
 
-        If parameters = [parameter_1, parameter_2] then the class will attempt to return:
+        If parameters = [parameter_1, parameter_2] and the distribution is a function then the class will attempt to return:
         infection_period_distribution(parameter_1, parameter_2, N)
         
         Arguments:
             N {int} -- The number of observations to draw from the random distribution
         
         Keyword Arguments:
-            infection_period_distribution {function} -- A numpy.random distribution (default: {exponential})
-            infection_period_parameters {list} -- A list of parameters (default: {None})
+            infection_period_distribution {function, str, scipy.stats distribution} -- The distribution of the infection periods (default: {exponential})
+            infection_period_parameters {float, list} -- A parameter, or list of parameters (default: {1})
+            rng {numpy.random.Generator} -- The random number generator used for the exponential, Generator method and scipy.stats distributions (default: {numpy.random})
+
+        Raises:
+            ValueError: Raises an error if the parameters cannot be used with the distribution
         """
         self.infection_period_distribution = infection_period_distribution
         self.infection_period_parameters = infection_period_parameters
         self.N = N
-        if infection_period_parameters == None: self.infection_period_parameters = 1 
-    
-    def generate(self):
-        if self.infection_period_distribution is None:
-            if type(self.infection_period_parameters) == int or type(self.infection_period_parameters) == float:
-                self.infection_periods = np.random.exponential(self.infection_period_parameters,self.N)
-            else:
-                print("Put something here to stop everything else going ahead because the infection_period_parameters are not correct.")
+        self.rng = np.random if rng is None else rng
+        if infection_period_parameters is None: self.infection_period_parameters = 1
+        self.check_distribution()
+
+    @property
+    def parameter_list(self):
+        """Returns the infection period parameters as a list
+        
+        Returns:
+            list -- The parameters
+        """
+        if np.ndim(self.infection_period_parameters) == 0:
+            return [self.infection_period_parameters]
+        return list(self.infection_period_parameters)
+
+    def check_distribution(self):
+        """Checks that the distribution and parameters can be used together
+
+        Raises:
+            ValueError: Raises an error if the parameters cannot be used with the distribution
+        """
+        distribution = self.infection_period_distribution
+        if distribution is None:
+            if np.ndim(self.infection_period_parameters) != 0 or not self.infection_period_parameters > 0:
+                raise ValueError(f"The exponential distribution requires one positive parameter, received {self.infection_period_parameters}.")
+        elif isinstance(distribution, str):
+            if not callable(getattr(self.rng, distribution, None)):
+                raise ValueError(f"The random number generator has no distribution called {distribution}.")
+        elif not hasattr(distribution, "rvs") and not callable(distribution):
+            raise ValueError("The infection period distribution must be a function, the name of a Generator method or a scipy.stats distribution.")
+
+    def generate(self, size = None):
+        """Draws infection periods from the distribution, all in one call.
+        
+        Keyword Arguments:
+            size {int, tuple} -- The number, or shape of the block, of infection periods to draw. For example (nodes, reinfections) (default: {N})
+
+        Raises:
+            ValueError: Raises an error if negative infection periods were drawn
+        
+        Returns:
+            numpy.array -- The infection periods
+        """
+        if size is None:
+            size = self.N
+        shape = tuple(np.atleast_1d(size))
+        distribution = self.infection_period_distribution
+
+        if distribution is None:
+            infection_periods = self.rng.exponential(self.infection_period_parameters, shape)
+        elif hasattr(distribution, "rvs"):
+            # scipy does not accept the numpy.random module itself, None means the global generator
+            random_state = None if self.rng is np.random else self.rng
+            infection_periods = distribution.rvs(size = shape, random_state = random_state)
+        elif isinstance(distribution, str):
+            infection_periods = getattr(self.rng, distribution)(*self.parameter_list, size = shape)
         else:
-            if type(self.infection_period_parameters) == int or type(self.infection_period_parameters) == float:
-                self.infection_periods = self.infection_period_distribution(self.infection_period_parameters, self.N)
-            elif len(self.infection_period_parameters) == 2:
-                self.infection_periods = self.infection_period_distribution(self.infection_period_parameters[0]
-                                                                    ,self.infection_period_parameters[1]
-                                                                    ,self.N)
-            elif len(self.infection_period_parameters) == 3:
-                self.infection_periods = self.infection_period_distribution(self.infection_period_parameters[0]
-                                                                    ,self.infection_period_parameters[1]
-                                                                    ,self.infection_period_parameters[2]
-                                                                    ,self.N)
-            else:
-                print("There is something incorrect with the infection_period_parameters.")
-        #if any(infection_periods < 0):
-        #    raise ValueError("Negative values for length of infectious period detected. Ensure use of a positive distribution.")
+            # Functions take the number of draws as their last argument, so we draw the whole block and reshape it
+            infection_periods = np.reshape(distribution(*self.parameter_list, int(np.prod(shape))), shape)
+
+        self.infection_periods = np.asarray(infection_periods)
+        if np.any(self.infection_periods < 0):
+            raise ValueError("Negative values for length of infectious period detected. Ensure use of a positive distribution.")
         return(self.infection_periods)
 
 
+class infection_stage(IntEnum):
+    """The built-in infection stages. Stages are stored as small integer codes, so that nodes can be filtered and counted with numpy masks
+    instead of string comparisons. The label of each stage is the string used throughout the package, e.g. "Susceptible"."""
+
+    SUSCEPTIBLE = 0
+    INFECTED = 1
+    RECOVERED = 2
+    EXPOSED = 3
+    TREATED = 4
+
+    @property
+    def label(self):
+        return self.name.capitalize()
+
+
+class stage_registry:
+    """Maps the labels of infection stages onto int8 codes, and back again.
+
+    The built-in stages always have the codes of infection_stage. Any other label, such as "Quarantined", is given the next free code
+    the first time it is used, so user-defined stages are handled in the same way as the built-in ones. Nodes without a stage have the code -1."""
+
+    no_stage = -1
+
+    def __init__(self):
+        self.labels = [stage.label for stage in infection_stage]
+        self.codes = {label: code for code, label in enumerate(self.labels)}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def code(self, stage):
+        """Returns the code of an infection stage, registering the stage if it has not been seen before
+        
+        Arguments:
+            stage {str, int, infection_stage} -- The label or code of the stage
+        
+        Returns:
+            int -- The code of the stage
+        """
+        if stage is None:
+            return self.no_stage
+        if isinstance(stage, (int, np.integer)):
+            if not self.no_stage <= stage < len(self.labels):
+                raise ValueError(f"There is no infection stage with code {stage}.")
+            return int(stage)
+        label = str(stage)
+        if label not in self.codes:
+            if len(self.labels) == np.iinfo(np.int8).max + 1:
+                raise ValueError("No more than 128 different infection stages can be used.")
+            self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return self.codes[label]
+
+    def label(self, code):
+        """Returns the label of an infection stage
+        
+        Arguments:
+            code {int} -- The code of the stage
+        
+        Returns:
+            str -- The label of the stage, or None if the code is -1
+        """
+        if code == self.no_stage:
+            return None
+        return self.labels[code]
+
+
+class compartment_model:
+    """Describes the compartments that a node passes through once its exposure level exceeds its resistance, such as SIR, SIS or SEIR.
+
+    Every compartment has a duration and a next stage. The durations are pre-generated for every node in the same way as the infection periods,
+    and the "Infected" compartment always lasts for the infection period of the simulation. Compartments with a positive infectivity emit hazard
+    onto their susceptible neighbours, the infectivity multiplies the beta of the node. Stages without a compartment, such as "Recovered", are never left.
+    """
+
+    def __init__(self, entry_stage = "Infected"):
+        """Creates a model without any compartments, add them with add_compartment
+        
+        Keyword Arguments:
+            entry_stage {str} -- The stage a node enters when it is infected (default: {"Infected"})
+        """
+        self.entry_stage = str(entry_stage)
+        self.compartments = {}
+
+    def add_compartment(self, stage, next_stage, duration_distribution = None, duration_parameters = None, infectivity = None):
+        """Adds a compartment to the model
+        
+        Arguments:
+            stage {str} -- The label of the compartment
+            next_stage {str} -- The stage a node enters when its time in the compartment has ended
+        
+        Keyword Arguments:
+            duration_distribution {str, function, scipy.stats distribution} -- The distribution of the time spent in the compartment, any distribution supported by infection_period_handler (default: exponential)
+            duration_parameters {float, list} -- The parameters of the duration distribution (default: {1})
+            infectivity {float} -- Multiplies beta for the nodes in the compartment, 0 if they are not infectious (default: {1 for "Infected", otherwise 0})
+        
+        Raises:
+            ValueError: Raised if a duration distribution is given for the "Infected" compartment
+        
+        Returns:
+            compartment_model -- The model, so that calls can be chained
+        """
+        stage = str(stage)
+        if stage == infection_stage.INFECTED.label and (duration_distribution is not None or duration_parameters is not None):
+            raise ValueError("The Infected compartment lasts for the infection period, use infection_period_distribution and infection_period_parameters instead.")
+        if infectivity is None:
+            infectivity = 1 if stage == infection_stage.INFECTED.label else 0
+        self.compartments[stage] = {"Next Stage": str(next_stage),
+                                    "Duration Distribution": duration_distribution,
+                                    "Duration Parameters": duration_parameters,
+                                    "Infectivity": float(infectivity)}
+        return self
+
+    @classmethod
+    def SIR(cls):
+        return cls().add_compartment("Infected", "Recovered")
+
+    @classmethod
+    def SIS(cls):
+        return cls().add_compartment("Infected", "Susceptible")
+
+    @classmethod
+    def SEIR(cls, latent_period_distribution = None, latent_period_parameters = None, SIS = False):
+        """A model where infected nodes spend a latent period in the "Exposed" compartment before becoming infectious
+        
+        Keyword Arguments:
+            latent_period_distribution {str, function, scipy.stats distribution} -- The distribution of the latent periods (default: exponential)
+            latent_period_parameters {float, list} -- The parameters of the latent period distribution (default: {1})
+            SIS {bool} -- If True, nodes become susceptible again instead of recovering (default: {False})
+        """
+        final_stage = "Susceptible" if SIS else "Recovered"
+        return (cls("Exposed")
+                .add_compartment("Exposed", "Infected", latent_period_distribution, latent_period_parameters)
+                .add_compartment("Infected", final_stage))
+
+    @property
+    def pre_generated_stages(self):
+        """The compartments, other than "Infected", whose durations are pre-generated"""
+        return [stage for stage in self.compartments if stage != infection_stage.INFECTED.label]
+
+    def check_model(self):
+        """Raises a ValueError if a node could never leave the stage it enters when it is infected
+        """
+        if self.entry_stage not in self.compartments:
+            raise ValueError(f"There is no compartment for the entry stage {self.entry_stage}.")
+
+
+class event_log:
+    """An append-only log of every infection stage change, stored in columns.
+
+    Each event is stored as an int64 node index, an int8 stage code and a float64 time, in arrays that double in size when they are full.
+    This avoids keeping millions of small python lists and floats for the history of each node. The history of a node is found through an
+    index of the log sorted by node, which is only rebuilt when events have been added since the last query."""
+
+    def __init__(self, capacity = 1024, stages = None):
+        """Allocates the columns of the log
+        
+        Keyword Arguments:
+            capacity {int} -- The number of events the log can hold before it is first resized (default: {1024})
+            stages {stage_registry} -- Maps the infection stages onto their codes (default: {a new registry})
+        """
+        self.node = np.empty(capacity, dtype = np.int64)
+        self.stage = np.empty(capacity, dtype = np.int8)
+        self.time = np.empty(capacity, dtype = np.float64)
+        self.length = 0
+        self.stages = stage_registry() if stages is None else stages
+        self.node_order = None
+
+    def __len__(self):
+        return self.length
+
+    def reserve(self, extra_events):
+        """Makes sure there is space for more events, doubling the size of the columns if required
+        
+        Arguments:
+            extra_events {int} -- The number of events about to be added
+        """
+        required = self.length + extra_events
+        if required > len(self.node):
+            capacity = max(required, 2 * len(self.node))
+            for column in ("node", "stage", "time"):
+                new_column = np.empty(capacity, dtype = getattr(self, column).dtype)
+                new_column[:self.length] = getattr(self, column)[:self.length]
+                setattr(self, column, new_column)
+
+    def extend(self, node_indexes, stage, timepoint):
+        """Appends an event for each of the nodes, all entering the same stage at the same time
+        
+        Arguments:
+            node_indexes {list} -- The indexes of the nodes
+            stage {str, int} -- The infection stage the nodes entered, or its code
+            timepoint {float} -- The time of the events
+        """
+        number_of_events = len(node_indexes)
+        if number_of_events == 0:
+            return
+        self.reserve(number_of_events)
+        end = self.length + number_of_events
+        self.node[self.length:end] = node_indexes
+        self.stage[self.length:end] = self.stages.code(stage)
+        self.time[self.length:end] = timepoint
+        self.length = end
+        self.node_order = None
+
+    def clear(self):
+        """Removes every event from the log, keeping the allocated columns"""
+        self.length = 0
+        self.node_order = None
+
+    def node_events(self, index):
+        """Returns the events of one node, in the order they occurred
+        
+        Arguments:
+            index {int} -- The index of the node
+        
+        Returns:
+            tuple -- (stage codes, times) of the node's events
+        """
+        if self.node_order is None:
+            self.node_order = np.argsort(self.node[:self.length], kind = "stable")
+            self.sorted_nodes = self.node[:self.length][self.node_order]
+        start, end = np.searchsorted(self.sorted_nodes, [index, index + 1])
+        events = self.node_order[start:end]
+        return self.stage[events], self.time[events]
+
+    def history(self, index):
+        """Returns the history of a node in the same form as the original History dictionary
+        
+        Arguments:
+            index {int} -- The index of the node
+        
+        Returns:
+            dict -- The stages the node has entered and the times at which they did so
+        """
+        stages, times = self.node_events(index)
+        return {
+            "Node Created": 0,
+            "Infection Stage Log": [self.stages.label(code) for code in stages],
+            "Infection Stage Times": times.tolist()
+        }
+
+
+class node_record(MutableMapping):
+    """A dictionary-like view of the data of a single node.
+
+    The data of every node is stored in columns (numpy arrays) by epidemic_data. This view reads from, and writes to, the columns so that
+    epi_data[node]["Resistance"] and epi_data[node].update({"Resistance": 1}) continue to work. Keys that are not columns are stored on the view itself.
+    Writing the "Infection Stage" calls update_infection_stage at the current time of the epidemic."""
+
+    # Maps the dictionary keys onto the column attributes of epidemic_data
+    columns = {
+        "Infection Stage Started": "infection_stage_started",
+        "Resistance": "resistance",
+        "Infection Period": "infection_period",
+        "Exposure Level": "exposure_level",
+        "Times Infected": "times_infected",
+        "Times Susceptible": "times_susceptible"
+    }
+
+    def __init__(self, data, index):
+        self.data = data
+        self.index = index
+        self.extra = {}
+
+    def __getitem__(self, key):
+        if key in self.columns:
+            return getattr(self.data, self.columns[key])[self.index]
+        elif key == "Infection Stage":
+            return self.data.stages.label(self.data.stage_code[self.index])
+        elif key == "History":
+            return self.data.events.history(self.index)
+        elif key == "Pre-generated Data":
+            return {"Resistance": self.data.pre_generated_resistance[self.index],
+                    "Infection Period": self.data.pre_generated_infection_period[self.index]}
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self.columns:
+            getattr(self.data, self.columns[key])[self.index] = value
+        elif key == "Infection Stage":
+            # The stage is changed in the same way as by the simulation, so that the frontier and block counts are kept up to date
+            self.data.update_infection_stage([self.data.node_keys[self.index]], value, self.data.time)
+        elif key == "History":
+            raise ValueError("The history of a node is recorded in the event log and cannot be replaced.")
+        elif key == "Pre-generated Data":
+            self.data.pre_generated_resistance[self.index] = value["Resistance"]
+            self.data.pre_generated_infection_period[self.index] = value["Infection Period"]
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        del self.extra[key]
+
+    def __iter__(self):
+        yield "Infection Stage"
+        yield from self.columns
+        yield "History"
+        yield "Pre-generated Data"
+        yield from self.extra
+
+    def __len__(self):
+        return len(self.columns) + 3 + len(self.extra)
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
 class epidemic_data(infection_period_handler):
-    def __init__(self, G, initial_infected, pre_gen_data, infection_period_distribution = None, infection_period_parameters = None, treatment_class = False, treatment_dist = None):
+    # The independent random number streams used by the data structure
+    random_stream_names = ["resistance", "infection periods", "initial infection"]
+
+    def __init__(self, G, initial_infected, pre_gen_data, infection_period_distribution = None, infection_period_parameters = None, treatment_class = False, treatment_dist = None,
+                 random_state = None, compartments = None):
         """A class used to store the data about the epidemic. Includes a number of methods to easily update the data, and return useful data sets.
 
         Note:
@@ -62,6 +496,9 @@ class epidemic_data(infection_period_handler):
         If we were generating random number on the fly for the epidemic, you would end up with different epidemics and therefore a much larger number of simulations required to generate good statistical values.
 
         In effect, by generating the epidemic random numbers first, you are able to "rewind time" and test your treatment on exactly the same epidemic.
+
+        The data is stored in columns, numpy arrays with one entry per node in the order of G.nodes(). The pre-generated data is stored in arrays of shape (nodes, pre_gen_data).
+        epi_data gives a dictionary-like view of the columns for each node. Infection stages are stored as int8 codes in stage_code, see stage_registry.
         
         Arguments:
             infection_period_handler {[type]} -- [description]
@@ -72,58 +509,105 @@ class epidemic_data(infection_period_handler):
         Keyword Arguments:
             infection_period_distribution {function} -- The distribution that will be used to generate the length of an infection period (default: exponential)
             infection_period_parameters {list} -- A list of parameters to be passed to the infection period distribution (default: 1)
+            random_state {int, numpy.random.SeedSequence, numpy.random.Generator} -- Seeds independent random number streams for the resistances, infection periods and initial infection. If not specified, the global numpy.random functions are used (default: {None})
+            compartments {compartment_model} -- The compartments of the epidemic. The durations of the compartments other than "Infected" are pre-generated alongside the infection periods, each from its own random number stream (default: {SIR})
         """
         self.G = G
         self.node_keys = list(G.nodes())
+        self.node_index = {node: index for index, node in enumerate(self.node_keys)}
         self.N = len(self.node_keys)
         self.pre_gen_data = pre_gen_data
         self.initial_infected = initial_infected
+        self.initial_infected_parameter = initial_infected
         self.infection_period_distribution = infection_period_distribution
         self.infection_period_parameters = infection_period_parameters
-        self.infection_period_handler = infection_period_handler(self.pre_gen_data, self.infection_period_distribution, self.infection_period_parameters)
+        self.compartments = compartment_model.SIR() if compartments is None else compartments
+        self.random_stream_names = self.random_stream_names + [f"{stage} durations" for stage in self.compartments.pre_generated_stages]
+        self.random_state = random_state
+        self.random_streams = spawn_random_streams(random_state, self.random_stream_names)
+        self.infection_period_handler = infection_period_handler(self.pre_gen_data, self.infection_period_distribution, self.infection_period_parameters,
+                                                                 self.random_streams["infection periods"])
+        self.duration_handlers = {}
+        for stage in self.compartments.pre_generated_stages:
+            compartment = self.compartments.compartments[stage]
+            self.duration_handlers[stage] = infection_period_handler(self.pre_gen_data, compartment["Duration Distribution"], compartment["Duration Parameters"],
+                                                                     self.random_streams[f"{stage} durations"])
+        self.stage_change_listeners = []
+        # The current time of the epidemic, kept up to date by the simulation, at which stages written through epi_data are entered
+        self.time = 0
         self.initialise_data_structure()
         self.pre_generate_data()
         self.initialise_infection()
 
 
     def initialise_data_structure(self):
-        """Creates an initial dictionary of parameters for each node with default values.
+        """Allocates the columns that store the data of every node, and creates the dictionary-like view of each node.
         """
         
+        #The current status of the nodes
+        self.stages = stage_registry()
+        self.stage_code = np.full(self.N, stage_registry.no_stage, dtype = np.int8)
+        self.infection_stage_started = np.full(self.N, np.nan)
+        self.resistance = np.zeros(self.N)
+        self.infection_period = np.zeros(self.N)
+        self.exposure_level = np.zeros(self.N)
+        self.times_infected = np.zeros(self.N, dtype = int)
+        self.times_susceptible = np.zeros(self.N, dtype = int)
+
+        #The time every node will spend in its current stage, if it is a compartment other than "Infected", and the number of times each of these compartments has been entered
+        self.stage_duration = np.full(self.N, np.inf)
+        self.times_entered = {self.stages.code(stage): np.zeros(self.N, dtype = int) for stage in self.compartments.pre_generated_stages}
+
+        #The history of every node is recorded in one event log whenever the status of a node changes
+        self.events = event_log(capacity = 2 * self.N, stages = self.stages)
+
+        #Pre-generated Data is stored here, whenever the nodes status is updated, the new value is taken from the row of the node.
+        self.pre_generated_resistance = np.empty((self.N, self.pre_gen_data))
+        self.pre_generated_infection_period = np.empty((self.N, self.pre_gen_data))
+        self.pre_generated_durations = {self.stages.code(stage): np.empty((self.N, self.pre_gen_data)) for stage in self.compartments.pre_generated_stages}
+
         #Create a dictionary where the keys are the node name.
-        epi_data = dict(self.G.nodes())
-
-        #This is a basic set of information we need to know for each node.
-        node_info = {
-            #The current status of the node is stored at the top level.
-            "Infection Stage": None,
-            "Infection Stage Started": None,
-            "Resistance": 0,
-            "Infection Period": 0,
-            "Exposure Level": 0,
-            "Times Infected": 0,
-            "Times Susceptible": 0,
-
-            #The History sub dictionary is updated whenever the status of a node changes
-            "History": {
-                #Records the times at which events occur
-                "Node Created": 0,
-                "Infection Stage Log": [],
-                "Infection Stage Times": []
-            },
-
-            #Pre-generated Data is stored here, whenever the nodes status is updated, the new value is taken form the sequence defined in this sub-dictionary.
-            "Pre-generated Data": {
-                "Resistance": [],
-                "Infection Period": []
-            }
-        }
+        self.epi_data = {node: node_record(self, index) for index, node in enumerate(self.node_keys)}
 
-        for node in epi_data:
-            #I think the deepcopy can now just be changed to a copy.
-            epi_data[node] = c.deepcopy(node_info)
+    def reset_state(self):
+        """Sets the current status of every node back to its initial value, without allocating new columns.
+        """
+        self.time = 0
+        self.stage_code.fill(stage_registry.no_stage)
+        self.infection_stage_started.fill(np.nan)
+        self.resistance.fill(0)
+        self.infection_period.fill(0)
+        self.exposure_level.fill(0)
+        self.times_infected.fill(0)
+        self.times_susceptible.fill(0)
+        self.stage_duration.fill(np.inf)
+        for times_entered in self.times_entered.values():
+            times_entered.fill(0)
+        self.events.clear()
+
+    def reset(self, seed = None, redraw = True):
+        """Prepares the data structure for a new replicate of the epidemic. The allocated columns are reused, only the pre-generated data is redrawn and the infection re-initialised.
         
-        self.epi_data = epi_data
+        Keyword Arguments:
+            seed {int, numpy.random.SeedSequence} -- If specified, new random number streams are created from the seed, as if the data structure was created with random_state = seed. Otherwise the existing streams carry on (default: {None})
+            redraw {bool} -- If False, the pre-generated data and the initial infected nodes are kept, so the same epidemic can be re-run with different parameters using common random numbers (default: {True})
+        """
+        if not redraw:
+            initial_infected = self.initial_infected
+            self.reset_state()
+            self.initial_infected = initial_infected
+            self.initialise_infection()
+            return
+        if seed is not None:
+            self.random_state = seed
+            self.random_streams = spawn_random_streams(seed, self.random_stream_names)
+            self.infection_period_handler.rng = self.random_streams["infection periods"]
+            for stage, handler in self.duration_handlers.items():
+                handler.rng = self.random_streams[f"{stage} durations"]
+        self.initial_infected = self.initial_infected_parameter
+        self.reset_state()
+        self.pre_generate_data()
+        self.initialise_infection()
 
     def initialise_infection(self):
         """This method initialises the infection, by updating the node status to 0.
@@ -135,66 +619,175 @@ class epidemic_data(infection_period_handler):
 
             #Randomly choose the initial infected
             key_index = len(self.node_keys)
-            self.initial_infected = np.random.choice(key_index, replace = False, size = self.initial_infected)
+            self.initial_infected = self.random_streams["initial infection"].choice(key_index, replace = False, size = self.initial_infected)
 
             #Set the initial infected stage'
             self.initial_infected = [self.node_keys[index] for index in self.initial_infected]
-            self.update_infection_stage(self.initial_infected, "Infected", 0)
 
         self.update_infection_stage(self.initial_infected, "Infected", 0)
-        initial_susceptibles = [node for node in self.epi_data if self.epi_data[node]["Infection Stage"] != "Infected"]
+        initial_susceptibles = [self.node_keys[index] for index in np.flatnonzero(self.stage_code != infection_stage.INFECTED)]
         self.update_infection_stage(initial_susceptibles, "Susceptible", 0)
+
+    @property
+    def infection_stage(self):
+        """Returns the label of the infection stage of every node. Use stage_code for the codes.
+        
+        Returns:
+            list -- The infection stage labels, in the order of G.nodes()
+        """
+        return [self.stages.label(code) for code in self.stage_code]
+
+    def stage_durations(self, index = None):
+        """Returns the time that nodes will spend in their current stage. This is the infection period for infected nodes, and infinite for stages that are never left.
+        
+        Keyword Arguments:
+            index {numpy.array} -- The indexes of the nodes (default: {every node})
+        
+        Returns:
+            numpy.array -- The duration of the current stage of each node
+        """
+        if index is None:
+            index = slice(None)
+        return np.where(self.stage_code[index] == infection_stage.INFECTED, self.infection_period[index], self.stage_duration[index])
+
+    def stage_counts(self):
+        """Counts the nodes in every infection stage in one pass
+        
+        Returns:
+            numpy.array -- The number of nodes with each stage code
+        """
+        return np.bincount(self.stage_code[self.stage_code >= 0], minlength = len(self.stages))
+
+    def stage_mask(self, stage):
+        """Returns a boolean mask of the nodes that are in an infection stage
+        
+        Arguments:
+            stage {str, int, infection_stage} -- The infection stage
+        
+        Returns:
+            numpy.array -- True for every node in the stage, in the order of G.nodes()
+        """
+        return self.stage_code == self.stages.code(stage)
+
+    def nodes_in_stage(self, stage):
+        """Returns the dictionary keys of the nodes in an infection stage
+        
+        Arguments:
+            stage {str, int, infection_stage} -- The infection stage
+        
+        Returns:
+            list -- The nodes in the stage
+        """
+        return [self.node_keys[index] for index in np.flatnonzero(self.stage_mask(stage))]
+
+    def count_nodes(self, stage):
+        """Returns the number of nodes in an infection stage
+        
+        Arguments:
+            stage {str, int, infection_stage} -- The infection stage
+        
+        Returns:
+            int -- The number of nodes in the stage
+        """
+        return int(np.count_nonzero(self.stage_mask(stage)))
         
     def update_infection_stage(self,node_list, new_stage, timepoint):
         """Allows you to update the status of a node, and records the times at which this occurs.
         
         Arguments:
             node {list} -- list of node dictionary keys, the specified nodes will be updated
-            new_stage {str} -- The new infection stage the nodes will be updated to
+            new_stage {str, infection_stage} -- The new infection stage the nodes will be updated to
             timepoint {float, int} -- The time at which the change occurs
 
         TODO: Input is not list should work
         """
 
+        node_list = list(node_list)
+        new_code = self.stages.code(new_stage)
         for node in node_list:
+            index = self.node_index[node]
             
             #update the infection stage
-            self.epi_data[node].update({"Infection Stage": str(new_stage)})
+            old_code = self.stage_code[index]
+            self.stage_code[index] = new_code
 
             #If the new stage is susceptible, we give them a new resistance value and set their exposure to 0.
-            if new_stage == "Susceptible":
+            if new_code == infection_stage.SUSCEPTIBLE:
                 #How many times have they been in the susceptible state
-                times_susceptible = self.epi_data[node]["Times Susceptible"]
-                #Get the resistance for that susceptible state
-                new_resistance = self.epi_data[node]["Pre-generated Data"]["Resistance"][times_susceptible]
-                #Update their current resistance to the new resistance
-                self.epi_data[node].update({"Resistance": new_resistance})
+                times_susceptible = self.times_susceptible[index]
+                #Update their current resistance to the resistance for that susceptible state
+                self.resistance[index] = self.pre_generated_resistance[index, times_susceptible]
                 #Add one to the number of times they've been in the susceptible state
-                self.epi_data[node].update({"Times Susceptible": times_susceptible + 1})
+                self.times_susceptible[index] = times_susceptible + 1
                 #Set their exposure level to 0
-                self.epi_data[node].update({"Exposure Level": 0})
+                self.exposure_level[index] = 0
             
-            #If the new stage is infected, we give them a new infection period value and set their exposure to 0.
-            if new_stage == "Infected":
-                #How many times have they been in the susceptible state
-                times_infected = self.epi_data[node]["Times Infected"]
-                #Get the resistance for that susceptible state
-                new_infection_period = self.epi_data[node]["Pre-generated Data"]["Infection Period"][times_infected]
-                #Update their current resistance to the new resistance
-                self.epi_data[node].update({"Infection Period": new_infection_period})
-                #Add one to the number of times they've been in the susceptible state
-                self.epi_data[node].update({"Times Infected": times_infected + 1})
+            #If the new stage is infected, we give them a new infection period value.
+            if new_code == infection_stage.INFECTED:
+                #How many times have they been in the infected state
+                times_infected = self.times_infected[index]
+                #Update their current infection period to the infection period for that infection
+                self.infection_period[index] = self.pre_generated_infection_period[index, times_infected]
+                #Add one to the number of times they've been in the infected state
+                self.times_infected[index] = times_infected + 1
 
-            #Update the infection stage history
-            new_log = self.epi_data[node]["History"]["Infection Stage Log"]
-            new_log.append(new_stage)
-            self.epi_data[node]["History"].update({"Infection Stage Log": new_log})
+            #If the new stage is any other compartment, we give them the pre-generated duration of the compartment.
+            if new_code in self.pre_generated_durations:
+                times_entered = self.times_entered[new_code][index]
+                self.stage_duration[index] = self.pre_generated_durations[new_code][index, times_entered]
+                self.times_entered[new_code][index] = times_entered + 1
+            else:
+                self.stage_duration[index] = np.inf
 
             #Update the the timepoints.
-            self.epi_data[node].update({"Infection Stage Started": timepoint})
-            new_times = self.epi_data[node]["History"]["Infection Stage Times"]
-            new_times.append(timepoint)
-            self.epi_data[node]["History"].update({"Infection Stage Times": new_times})
+            self.infection_stage_started[index] = timepoint
+
+            #Let anything that keeps track of the infection stages know about the change
+            for listener in self.stage_change_listeners:
+                listener(index, old_code, new_code)
+
+        #Update the infection stage history of every node in one write
+        self.events.extend([self.node_index[node] for node in node_list], new_code, timepoint)
+
+    def enter_stage(self, index, new_code, timepoint):
+        """Updates the columns of many nodes entering the same stage at once, in the same way as update_infection_stage.
+
+        The listeners are not called and no events are logged, the caller is responsible for both. This is used by workers that own part of the
+        nodes of a simulation, see the Partitioned module.
+
+        Arguments:
+            index {numpy.array} -- The indexes of the nodes, each appearing at most once
+            new_code {int} -- The code of the infection stage the nodes enter
+            timepoint {float} -- The time at which the change occurs
+        """
+        index = np.asarray(index, dtype = np.int64)
+        self.stage_code[index] = new_code
+        if new_code == infection_stage.SUSCEPTIBLE:
+            times_susceptible = self.times_susceptible[index]
+            self.resistance[index] = self.pre_generated_resistance[index, times_susceptible]
+            self.times_susceptible[index] = times_susceptible + 1
+            self.exposure_level[index] = 0
+        if new_code == infection_stage.INFECTED:
+            times_infected = self.times_infected[index]
+            self.infection_period[index] = self.pre_generated_infection_period[index, times_infected]
+            self.times_infected[index] = times_infected + 1
+        if new_code in self.pre_generated_durations:
+            times_entered = self.times_entered[new_code][index]
+            self.stage_duration[index] = self.pre_generated_durations[new_code][index, times_entered]
+            self.times_entered[new_code][index] = times_entered + 1
+        else:
+            self.stage_duration[index] = np.inf
+        self.infection_stage_started[index] = timepoint
+
+    def add_stage_change_listener(self, listener):
+        """Registers a function that is called whenever the infection stage of a node is updated.
+
+        This allows other objects to keep their own summaries of the epidemic up to date, without scanning every node.
+        
+        Arguments:
+            listener {function} -- A function of the form f(index, old_stage_code, new_stage_code), where index is the position of the node in G.nodes()
+        """
+        self.stage_change_listeners.append(listener)
 
     def update_exposure_level(self, node, exposure_increment):
         """Increases a nodes exposure level by an amount equal to the exposure_increment
@@ -204,20 +797,21 @@ class epidemic_data(infection_period_handler):
             exposure_increment {int, float} -- The amount that the nodes exposure level will be increased by
         """
 
-        new_exposure = self.epi_data[node]["Exposure Level"] + exposure_increment
-        self.epi_data[node].update({"Exposure Level": new_exposure})
+        self.exposure_level[self.node_index[node]] += exposure_increment
         
     def pre_generate_data(self):
         """This method pre-generates the infection periods and resistances of a node. This is important, because we want to be able to re-run epidemics with an intervention to see how effective it is.
-        
-        Arguments:
-            count {int} -- How many infection periods to generate. If the number of infections for a node exceeds the pre generated data, an error will be thrown.
+
+        The data for every node is drawn in one call and written into the existing arrays.
 
         TODO Throw error if infection periods run out
         """
-        for node in self.node_keys:
-            resistances = list(np.random.exponential(1,self.pre_gen_data))
-            self.epi_data[node]["Pre-generated Data"].update({"Resistance": resistances})
-
-            inf_periods = list(self.infection_period_handler.generate())
-            self.epi_data[node]["Pre-generated Data"].update({"Infection Period": inf_periods})
+        shape = (self.N, self.pre_gen_data)
+        rng = self.random_streams["resistance"]
+        if isinstance(rng, np.random.Generator):
+            rng.standard_exponential(out = self.pre_generated_resistance)
+        else:
+            self.pre_generated_resistance[:] = rng.exponential(1, shape)
+        self.pre_generated_infection_period[:] = self.infection_period_handler.generate(shape)
+        for stage, handler in self.duration_handlers.items():
+            self.pre_generated_durations[self.stages.code(stage)][:] = handler.generate(shape)
@@ -0,0 +1,382 @@
+#This module contains the executors we use to run ensembles and parameter sweeps on several processes or machines
+import glob
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# The objects shared with the tasks run by this process, such as the network, of the form {name: object}
+worker_objects = {}
+# The shared object files this process has already loaded
+loaded_paths = set()
+
+
+class shared_reference:
+    """Stands in for a large object, such as the network, in the tasks sent to an executor.
+
+    Tasks should only carry seeds and parameters, so the object itself is shipped to every worker once with executor.share, and the reference
+    is resolved by the worker with resolve_shared.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"shared_reference({self.name!r})"
+
+
+def install_shared(objects):
+    """Makes objects available to resolve_shared in this process. Used as the initializer of worker processes.
+
+    Arguments:
+        objects {dict} -- The objects, of the form {name: object}
+    """
+    worker_objects.update(objects)
+
+
+def load_shared(path):
+    """Installs the objects pickled in a file, unless this process has already loaded the file
+
+    Arguments:
+        path {str} -- The file written by write_shared
+    """
+    if path is not None and path not in loaded_paths:
+        with open(path, "rb") as shared_file:
+            install_shared(pickle.load(shared_file))
+        loaded_paths.add(path)
+
+
+def write_shared(objects, directory):
+    """Pickles shared objects into a new file in a directory
+
+    Arguments:
+        objects {dict} -- The objects, of the form {name: object}
+        directory {str} -- The directory, which must be visible to the workers
+
+    Returns:
+        str -- The path of the file
+    """
+    path = os.path.join(directory, f"shared_{uuid.uuid4().hex}.pkl")
+    write_atomically(path, objects)
+    return path
+
+
+def write_atomically(path, item):
+    # The item is written to a temporary file that is then renamed, so readers never see part of a file
+    with open(path + ".part", "wb") as item_file:
+        pickle.dump(item, item_file, protocol = pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".part", path)
+
+
+def resolve_shared(item):
+    """Returns the object a shared_reference stands for, or the item itself if it is not a reference
+
+    Arguments:
+        item {shared_reference, object} -- The item
+
+    Raises:
+        ValueError: Raised if the object has not been shared with this process
+    """
+    if not isinstance(item, shared_reference):
+        return item
+    if item.name not in worker_objects:
+        raise ValueError(f"The object {item.name} has not been shared with this process, use executor.share.")
+    return worker_objects[item.name]
+
+
+def run_task(task):
+    """Runs one task of an executor in a worker, loading the shared objects first if needed
+
+    Arguments:
+        task {tuple} -- (shared path, function, arguments)
+    """
+    path, function, arguments = task
+    load_shared(path)
+    return function(arguments)
+
+
+class local_executor:
+    """Runs tasks on a pool of processes on this machine.
+
+    Shared objects are handed to every process once, when the pool is started, so each task only carries its own seeds and parameters.
+    The pool is kept between calls to map, and is only restarted if the shared objects change.
+    """
+
+    def __init__(self, processes = None, chunksize = 1):
+        """Sets up the executor. The pool is started by the first call to map.
+
+        Keyword Arguments:
+            processes {int} -- The number of processes, if not specified then one per CPU (default: {None})
+            chunksize {int} -- The number of tasks sent to a process at once (default: {1})
+        """
+        self.processes = processes
+        self.chunksize = chunksize
+        self.shared = {}
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def share(self, **objects):
+        """Ships objects, such as the network, to every worker, where shared_reference(name) resolves to them
+
+        Keyword Arguments:
+            objects -- The objects, of the form name = object
+        """
+        self.shared.update(objects)
+        install_shared(objects)
+        self.close()
+
+    def map(self, function, tasks):
+        """Runs the function on every task, returning the results in the order of the tasks
+
+        Arguments:
+            function {function} -- A function that can be pickled, such as one defined at module level
+            tasks {iterable} -- The arguments of each call
+
+        Returns:
+            list -- The results
+        """
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes, initializer = install_shared, initargs = (self.shared,))
+        return self.pool.map(function, list(tasks), chunksize = self.chunksize)
+
+    def close(self):
+        """Stops the pool of processes
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class futures_executor:
+    """Runs tasks on any executor with the interface of concurrent.futures, such as a ProcessPoolExecutor or an executor whose workers are on other machines.
+
+    The executor cannot be told which worker runs each task, so the shared objects are pickled once to a file in shared_directory. Every worker loads
+    the file the first time it runs a task, and keeps the objects for the tasks that follow. For remote workers, shared_directory must be on shared storage.
+    """
+
+    def __init__(self, executor = None, shared_directory = None):
+        """Wraps the executor
+
+        Keyword Arguments:
+            executor {concurrent.futures.Executor} -- The executor, if not specified then a ProcessPoolExecutor is created and closed with this executor (default: {None})
+            shared_directory {str} -- The directory the shared objects are written to, if not specified then a temporary directory that is removed by close (default: {None})
+        """
+        self.owns_executor = executor is None
+        self.executor = ProcessPoolExecutor() if executor is None else executor
+        self.owns_directory = shared_directory is None
+        self.shared_directory = tempfile.mkdtemp() if shared_directory is None else shared_directory
+        self.shared_path = None
+        self.shared_paths = []
+        self.shared = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def share(self, **objects):
+        """Ships objects, such as the network, to every worker, where shared_reference(name) resolves to them
+
+        Keyword Arguments:
+            objects -- The objects, of the form name = object
+        """
+        self.shared.update(objects)
+        install_shared(objects)
+        self.shared_path = write_shared(self.shared, self.shared_directory)
+        self.shared_paths.append(self.shared_path)
+
+    def map(self, function, tasks):
+        """Runs the function on every task, returning the results in the order of the tasks
+
+        Arguments:
+            function {function} -- A function that can be pickled, such as one defined at module level
+            tasks {iterable} -- The arguments of each call
+
+        Returns:
+            list -- The results
+        """
+        futures = [self.executor.submit(run_task, (self.shared_path, function, task)) for task in tasks]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Shuts down the executor, if it was created by this executor, and removes the shared object files. The temporary directory is removed if the executor created it
+        """
+        if self.owns_executor:
+            self.executor.shutdown()
+        if self.owns_directory:
+            shutil.rmtree(self.shared_directory, ignore_errors = True)
+        else:
+            for path in self.shared_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.shared_paths = []
+        self.shared_path = None
+
+
+class file_queue_executor:
+    """Runs tasks through a work queue of files in a directory on shared storage, so that workers can be started on any machine that can see the directory.
+
+    The directory holds:
+    tasks/ -- one file per task waiting to be run
+    claimed/ -- the tasks being run. A worker claims a task by renaming its file, which only one worker can do
+    results/ -- one file per finished task, holding its result or the exception it raised
+    shared_*.pkl -- the shared objects, loaded once by every worker
+
+    Workers are started with file_queue_worker(directory), for example by "python -c" on each machine, and stop once the executor is closed.
+    For testing, the executor can start local workers itself.
+    """
+
+    def __init__(self, directory, local_workers = 0, poll_interval = 0.05, timeout = None):
+        """Creates the queue directories
+
+        Arguments:
+            directory {str} -- The directory of the queue
+
+        Keyword Arguments:
+            local_workers {int} -- The number of worker processes to start on this machine (default: {0})
+            poll_interval {float} -- The number of seconds between checks for finished tasks (default: {0.05})
+            timeout {float} -- The number of seconds map waits for a result before giving up, if not specified then map waits indefinitely (default: {None})
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.shared_path = None
+        self.shared = {}
+        for subdirectory in ("tasks", "claimed", "results"):
+            os.makedirs(os.path.join(directory, subdirectory), exist_ok = True)
+        stop_path = os.path.join(directory, "stop")
+        if os.path.exists(stop_path):
+            os.remove(stop_path)
+        self.workers = [multiprocessing.Process(target = file_queue_worker, args = (directory, poll_interval), daemon = True) for _ in range(local_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def share(self, **objects):
+        """Ships objects, such as the network, to every worker, where shared_reference(name) resolves to them
+
+        Keyword Arguments:
+            objects -- The objects, of the form name = object
+        """
+        self.shared.update(objects)
+        install_shared(objects)
+        self.shared_path = write_shared(self.shared, self.directory)
+
+    def map(self, function, tasks):
+        """Queues a task file for every task, and waits for the workers to write the results
+
+        Arguments:
+            function {function} -- A function that can be pickled, such as one defined at module level
+            tasks {iterable} -- The arguments of each call
+
+        Raises:
+            TimeoutError: Raised if a result does not arrive within the timeout
+            Exception: The exception raised by a task is raised again here
+
+        Returns:
+            list -- The results
+        """
+        job = uuid.uuid4().hex
+        names = []
+        for number, task in enumerate(tasks):
+            name = f"{job}_{number:06d}.pkl"
+            write_atomically(os.path.join(self.directory, "tasks", name), (self.shared_path, function, task))
+            names.append(name)
+
+        results = []
+        for name in names:
+            path = os.path.join(self.directory, "results", name)
+            waited = 0
+            while not os.path.exists(path):
+                if self.timeout is not None and waited > self.timeout:
+                    raise TimeoutError(f"No worker returned the result of task {name} in {self.directory}.")
+                time.sleep(self.poll_interval)
+                waited += self.poll_interval
+            with open(path, "rb") as result_file:
+                succeeded, result = pickle.load(result_file)
+            os.remove(path)
+            if not succeeded:
+                raise result
+            results.append(result)
+        return results
+
+    def close(self):
+        """Tells the workers to stop, and waits for the local workers to finish
+        """
+        open(os.path.join(self.directory, "stop"), "w").close()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+
+def claim_task(directory):
+    """Claims the oldest waiting task of a file queue, by moving it into the claimed directory
+
+    Arguments:
+        directory {str} -- The directory of the queue
+
+    Returns:
+        str -- The path of the claimed task, or None if there are no tasks waiting
+    """
+    for path in sorted(glob.glob(os.path.join(directory, "tasks", "*.pkl"))):
+        claimed_path = os.path.join(directory, "claimed", os.path.basename(path))
+        try:
+            os.rename(path, claimed_path)
+        except OSError:
+            # Another worker claimed the task first
+            continue
+        return claimed_path
+    return None
+
+
+def file_queue_worker(directory, poll_interval = 0.05, idle_timeout = None):
+    """Runs the tasks of a file queue until the executor is closed
+
+    Arguments:
+        directory {str} -- The directory of the queue
+
+    Keyword Arguments:
+        poll_interval {float} -- The number of seconds between checks for new tasks (default: {0.05})
+        idle_timeout {float} -- If specified, the worker also stops after waiting this many seconds without a task (default: {None})
+
+    Returns:
+        int -- The number of tasks run by the worker
+    """
+    tasks_run = 0
+    idle = 0
+    while not os.path.exists(os.path.join(directory, "stop")):
+        claimed_path = claim_task(directory)
+        if claimed_path is None:
+            if idle_timeout is not None and idle > idle_timeout:
+                break
+            time.sleep(poll_interval)
+            idle += poll_interval
+            continue
+        idle = 0
+
+        with open(claimed_path, "rb") as task_file:
+            task = pickle.load(task_file)
+        try:
+            result = (True, run_task(task))
+        except Exception as error:
+            result = (False, error)
+        write_atomically(os.path.join(directory, "results", os.path.basename(claimed_path)), result)
+        os.remove(claimed_path)
+        tasks_run += 1
+    return tasks_run
@@ -1,8 +1,11 @@
 #The code for homogenous Sellke Simulations. Old but not important.
+import heapq
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy.integrate as spi
 import networkx as nx
+from NetworkEpidemicSimulation.RandomNumbers import spawn_random_streams
+from NetworkEpidemicSimulation.EpidemicSimulation import infection_period_handler, event_log, empirical_distribution
+from NetworkEpidemicSimulation.Results import epidemic_result
+from NetworkEpidemicSimulation.Simulation import hazard_class as vectorised_hazard_class
 
 class hazard_class:
     '''
@@ -54,6 +57,8 @@ class hazard_class:
         '''
         Integrate a hazard function
         '''
+        # scipy.integrate is slow to import, so it is only imported when it is used
+        import scipy.integrate as spi
         f = lambda t: self.hazard(t,t_end)
         integral = spi.quad(f, 0, t_end)
         return integral[0]
@@ -67,7 +72,7 @@ class SIR_Selke:
     N = total size of population
     beta = force of infection
     infection_period_parameters = either a float, int, or list of parameters that are passed to a numpy distribution function
-    
+    random_state = an int, SeedSequence or Generator that seeds independent streams for the resistances and infection periods. If not specified, the global numpy.random functions are used
 
     Choosing a non-markovian distribution:
     If parameter infectious_period_distribution is left blank then we take it to be the exponential distribution
@@ -81,8 +86,13 @@ class SIR_Selke:
     It should be possible to calculate the time of the infection from the data generated.
     '''
     
+    # The independent random number streams used by the simulation
+    random_stream_names = ["resistance", "infection periods"]
+
     #We use the init function to assign values to object that are necessary to do when the object is run
-    def __init__(self, N, beta, infection_period_parameters, initial_infected, hazard_rate = None, infection_period_distribution = None):
+    def __init__(self, N, beta, infection_period_parameters, initial_infected, hazard_rate = None, infection_period_distribution = None, random_state = None):
+        self.random_state = random_state
+        self.random_streams = spawn_random_streams(random_state, self.random_stream_names)
         self.N = N
         self.beta = beta
         self.inf_starting = initial_infected
@@ -94,13 +104,19 @@ class SIR_Selke:
             print("Taking the exponential distribution of the length of the infectious periods.")
     
     def compute_final_size(self):
-        '''Generates 1 observation of the final size of an epidemic from the parameters defined earlier'''
+        '''
+        Generates 1 observation of the final size of an epidemic from the parameters defined earlier, given the infectious periods in inf_periods.
+
+        Following the formulation of House et al., the first infective is not counted, and the other initial_infected - 1 initial infectives are given zero resistance,
+        so they are counted in the final size. The epidemic therefore starts with initial_infected infectives and N - initial_infected + 1 susceptibles,
+        and the final size is initial_infected - 1 plus the number of susceptibles infected, as in final_size_distribution.
+        '''
         #Infectious Period variables, function as defined in the __init__ section
         T = self.inf_periods
         assert all(T) > 0
 
         #The resistance to infection variables, always an exponential 1 rv
-        self.Q = np.random.exponential(scale = 1,
+        self.Q = self.random_streams["resistance"].exponential(scale = 1,
                                   size = self.N)
         
         #We take the formulation found in the Thomas House paper and set the intial infecteds to zero
@@ -136,48 +152,231 @@ class SIR_Selke:
         '''
         This method contains the logic required to handle change of infectious period distributions.
         Defaults to choosing the exponential distribution if no other distribution is specified.
-        Different distributions have a different number of parameters passed to them 
-     
-        To Do:
-        Add some proper break variables to this whole business if we reach an error
-        Make the error messages better
+        The distributions are handled by the same infection_period_handler as the network simulation, so any of the distributions it supports can be used.
 
         The tests for this function are done by calling it via SIR_simple_sellke, cba writing a new set of tests
         '''
+        handler = infection_period_handler(self.N, self.inf_period_dist, self.infection_period_parameters, self.random_streams["infection periods"])
+        self.inf_periods = handler.generate()
 
-        if self.inf_period_dist is None:
-            if type(self.infection_period_parameters) == int or type(self.infection_period_parameters) == float:
-                self.inf_periods = np.random.exponential(self.infection_period_parameters,self.N)
+    
+    def pressure_distribution(self, quadrature_points = 512):
+        '''
+        Returns the pressures beta * H(T) that one infective can emit onto a susceptible over its infectious period T, and their probabilities, where H is the integral of the hazard rate (H(T) = T if no hazard rate was specified).
+
+        Empirical distributions without interpolation are represented exactly by their values. Other distributions with a ppf method, such as scipy.stats distributions,
+        and the exponential and gamma distributions, are discretised by Gauss-Legendre quadrature over the quantiles.
+        '''
+        hazards = vectorised_hazard_class(self.hazard_rate)
+        def pressure(T):
+            T = np.asarray(T, dtype = float)
+            return self.beta * hazards.increment_hazards(np.zeros(T.shape), T, T)
+
+        distribution = self.inf_period_dist
+        parameters = np.atleast_1d(np.asarray(self.infection_period_parameters, dtype = float))
+        if isinstance(distribution, empirical_distribution) and not distribution.interpolate:
+            return pressure(distribution.values), np.diff(distribution.cdf, prepend = 0)
+        if distribution in (None, "exponential", "gamma"):
+            import scipy.stats
+            if distribution == "gamma":
+                distribution = scipy.stats.gamma(parameters[0], scale = parameters[1] if len(parameters) > 1 else 1)
             else:
-                print("Put something here to stop everything else going ahead because te parameters are not correct.")
+                distribution = scipy.stats.expon(scale = parameters[0])
+        if hasattr(distribution, "ppf"):
+            points, weights = np.polynomial.legendre.leggauss(quadrature_points)
+            return pressure(distribution.ppf((points + 1) / 2)), weights / 2
+        raise ValueError("The final size distribution needs the distribution of the infection pressure, which cannot be computed for this infection period distribution. Pass laplace_transform instead.")
+
+    def pressure_laplace_transform(self, theta, quadrature_points = 512):
+        '''
+        Returns phi(theta) = E[exp(-theta * beta * H(T))], the Laplace transform of the hazard that one infective emits onto a susceptible over its infectious period T,
+        where H is the integral of the hazard rate (H(T) = T if no hazard rate was specified).
+
+        The transform is computed exactly for exponential and gamma infectious periods with a constant hazard rate, otherwise it is the transform of pressure_distribution.
+        '''
+        theta = np.asarray(theta, dtype = float)
+        parameters = np.atleast_1d(np.asarray(self.infection_period_parameters, dtype = float))
+        if self.hazard_rate is None and self.inf_period_dist in (None, "exponential"):
+            return 1 / (1 + theta * self.beta * parameters[0])
+        if self.hazard_rate is None and self.inf_period_dist == "gamma":
+            shape, scale = parameters[0], (parameters[1] if len(parameters) > 1 else 1)
+            return (1 + theta * self.beta * scale) ** -shape
+        pressures, probabilities = self.pressure_distribution(quadrature_points)
+        return np.exp(-theta[..., None] * pressures) @ probabilities
+
+    def final_size_distribution(self, laplace_transform = None, method = None):
+        '''
+        Computes the exact distribution of the final size returned by compute_final_size.
+
+        compute_final_size follows the formulation of House et al., in which the first infective is not counted and the other initial_infected - 1 initial
+        infectives are counted in the final size. So the epidemic starts with m = initial_infected infectives and n = N - initial_infected + 1 susceptibles,
+        and the final size is initial_infected - 1 plus the number of susceptibles infected. The probabilities below initial_infected - 1 are zero.
+
+        Three methods are available:
+        markov - If the infectious periods are exponential and the hazard rate is constant, the epidemic is Markovian, and the distribution is computed from
+        the embedded jump chain, see markov_final_size_distribution.
+        chain - For any other distribution handled by pressure_distribution, the infectives are processed one at a time, see chain_final_size_distribution.
+        Both are sums of positive terms, and are stable for populations of several thousand.
+        gontcharoff - The Gontcharoff polynomial recursion, which only needs the Laplace transform of the infection pressure, see gontcharoff_final_size_distribution.
+        It is only accurate for a few dozen susceptibles.
+
+        Keyword Arguments:
+            laplace_transform {function} -- A function returning phi(theta) for an array of theta, if the pressure distribution cannot be computed. Implies the gontcharoff method (default: {None})
+            method {str} -- "markov", "chain" or "gontcharoff", chosen automatically if not specified (default: {None})
+
+        Raises:
+            ValueError: Raised if the method is unknown or cannot be used for the model
+
+        Returns:
+            numpy.array -- The probabilities P_0, ..., P_N
+        '''
+        n, m = self.N - self.inf_starting + 1, self.inf_starting
+        markovian = laplace_transform is None and self.hazard_rate is None and self.inf_period_dist in (None, "exponential")
+        if method is None:
+            method = "markov" if markovian else "gontcharoff" if laplace_transform is not None else "chain"
+        if method == "markov":
+            if not markovian:
+                raise ValueError("The markov method needs exponential infectious periods and a constant hazard rate.")
+            probabilities = self.markov_final_size_distribution(n, m)
+        elif method == "chain":
+            if laplace_transform is not None:
+                raise ValueError("The chain method needs the pressure distribution, it cannot use a Laplace transform.")
+            probabilities = self.chain_final_size_distribution(n, m)
+        elif method == "gontcharoff":
+            probabilities = self.gontcharoff_final_size_distribution(n, m, laplace_transform)
         else:
-            if type(self.infection_period_parameters) == int or type(self.infection_period_parameters) == float:
-                self.inf_periods = self.inf_period_dist(self.infection_period_parameters, self.N)
-            elif len(self.infection_period_parameters) == 2:
-                self.inf_periods = self.inf_period_dist(self.infection_period_parameters[0]
-                                                ,self.infection_period_parameters[1]
-                                                ,self.N)
-            elif len(self.infection_period_parameters) == 3:
-                self.inf_periods = self.inf_period_dist(self.infection_period_parameters[0]
-                                                ,self.infection_period_parameters[1]
-                                                ,self.infection_period_parameters[2]
-                                                ,self.N)
-            else:
-                print("There is something incorrect with the parameters.")
-            if any(self.inf_periods < 0):
-                raise ValueError("Negative values for length of infectious period detected. Ensure use of a positive distribution.")
-        self.inf_periods
+            raise ValueError(f"Unknown method {method}, use markov, chain or gontcharoff.")
+        return np.concatenate([np.zeros(m - 1), probabilities])
 
-    
-    def sim_final_size(self, n_sim):
-        '''Generates multiple observations of the final size of the epidemic.'''
+    def gontcharoff_final_size_distribution(self, n, m, laplace_transform = None):
+        '''
+        The distribution of the number of susceptibles infected, for n susceptibles and m infectives, from the Gontcharoff polynomial recursion of the Sellke construction
+        (Ball 1986, Lefevre and Picard 1990). The probabilities P_k = C(n, k) a_k, where
+            a_l = phi(n - l)^(l + m) - sum_{k < l} C(l, k) a_k phi(n - l)^(l - k)
+        and phi is the Laplace transform of the infection pressure of one infective. The recursion is carried out in log-space, with the sum for each l vectorised,
+        so the powers and binomial coefficients never overflow or underflow.
+
+        The probabilities are very sensitive to the rounding errors of phi, so the alternating sum cannot be made accurate for more than a few dozen susceptibles
+        by using more precise arithmetic. A ValueError is raised if the rounding error becomes visible in the probabilities.
+        '''
+        from scipy.special import gammaln
+        if laplace_transform is None:
+            laplace_transform = self.pressure_laplace_transform
+        log_phi = np.log(laplace_transform(np.arange(n + 1)))
+
+        def log_binomial(a, b):
+            return gammaln(a + 1) - gammaln(b + 1) - gammaln(a - b + 1)
+
+        #The sign and log magnitude of each a_k
+        log_a = np.empty(n + 1)
+        sign_a = np.empty(n + 1)
+        for l in range(n + 1):
+            k = np.arange(l)
+            leading = (l + m) * log_phi[n - l]
+            terms = log_binomial(l, k) + log_a[:l] + (l - k) * log_phi[n - l]
+            scale = max(leading, terms.max(initial = -np.inf))
+            value = np.exp(leading - scale) - np.sum(sign_a[:l] * np.exp(terms - scale))
+            sign_a[l] = np.sign(value)
+            log_a[l] = np.log(abs(value)) + scale if value != 0 else -np.inf
+
+        log_probabilities = log_binomial(n, np.arange(n + 1)) + log_a
+        with np.errstate(over = "ignore", invalid = "ignore"):
+            probabilities = np.where(sign_a > 0, np.exp(log_probabilities), 0)
+        total = probabilities.sum()
+        if not np.isfinite(total) or abs(total - 1) > 1e-6 or np.any((sign_a < 0) & (log_probabilities > np.log(1e-12))):
+            raise ValueError(f"The Gontcharoff recursion lost precision for n = {n} susceptibles. Use the chain method, which only needs the pressure distribution.")
+        return probabilities / total
+
+    def chain_final_size_distribution(self, n, m, quadrature_points = 512):
+        '''
+        The distribution of the number of susceptibles infected, for n susceptibles and m infectives, by processing the infectives one at a time.
+
+        The resistances are exponential, so whatever pressure a susceptible has already escaped, it escapes a further pressure x with probability exp(-x).
+        The final size therefore does not depend on the order in which the pressures of the infectives are applied, and each infective infects a
+        binomial number of the s remaining susceptibles, q(s, i) = C(s, i) E[p^i (1 - p)^(s - i)] with p = 1 - exp(-beta * H(T)).
+        The moments M(i, t) = E[p^i (1 - p)^t] are computed for i + t = n over pressure_distribution, and for smaller i + t from M(i, t) = M(i, t + 1) + M(i + 1, t),
+        in log-space. The chain over (infectives processed, susceptibles infected) is then propagated one infective at a time, and the epidemic ends once
+        every infective has been processed. Every step is a sum of positive terms.
+        '''
+        from scipy.special import gammaln, logsumexp
+        pressures, probabilities = self.pressure_distribution(quadrature_points)
+        pressures, probabilities = pressures[probabilities > 0], probabilities[probabilities > 0]
+        i = np.arange(n + 1)
+        with np.errstate(divide = "ignore"):
+            log_p = np.log(-np.expm1(-pressures))
+        infections = np.where(i > 0, i * log_p[:, None], 0)
+        log_moments = logsumexp(np.log(probabilities)[:, None] + infections - (n - i) * pressures[:, None], axis = 0)
+
+        #transition[k, k + i] is the probability that an infective infects i susceptibles, when k have been infected
+        transition = np.zeros((n + 1, n + 1))
+        for s in range(n, -1, -1):
+            if s < n:
+                log_moments = np.logaddexp(log_moments[:-1], log_moments[1:])
+            k = n - s
+            transition[k, k:] = np.exp(gammaln(s + 1) - gammaln(i[:s + 1] + 1) - gammaln(s - i[:s + 1] + 1) + log_moments)
+
+        final = np.zeros(n + 1)
+        distribution = np.zeros(n + 1)
+        distribution[0] = 1
+        for processed in range(n + m + 1):
+            #The epidemic ends when the number of infectives processed reaches the number infected
+            ended = processed - m
+            if ended > n:
+                break
+            if ended >= 0:
+                final[ended] = distribution[ended]
+                distribution[ended] = 0
+            first = max(ended + 1, 0)
+            distribution[first:] = distribution[first:] @ transition[first:, first:]
+        return final
+
+    def markov_final_size_distribution(self, n, m):
+        '''
+        The distribution of the number of susceptibles infected, for n susceptibles and m infectives, when the epidemic is Markovian, from the embedded jump chain over (k susceptibles infected, r infectives recovered).
+        While there are i = m + k - r > 0 infectives, the next event is an infection with probability beta * s * mu / (beta * s * mu + 1), where s = n - k and mu is the mean infectious period.
+        The chain is propagated one recovery at a time, with the infections within each row accumulated by a log-space cumulative sum, so every step is vectorised over k.
+        '''
+        mean_period = np.atleast_1d(np.asarray(self.infection_period_parameters, dtype = float))[0]
+        k = np.arange(n + 1)
+        rate = self.beta * (n - k) * mean_period
+        log_infection = np.log(rate, where = rate > 0, out = np.full(n + 1, -np.inf)) - np.log1p(rate)
+        log_recovery = -np.log1p(rate)
+        #The log probability of the first infection after j, before any recovery, reaching k
+        cumulative = np.concatenate([[0], np.cumsum(log_infection[:-1])])
+
+        log_final = np.full(n + 1, -np.inf)
+        incoming = np.full(n + 1, -np.inf)
+        incoming[0] = 0
+        for r in range(n + m):
+            #States with no infectives are absorbing
+            first = max(0, r - m + 1)
+            if first > n:
+                break
+            with np.errstate(invalid = "ignore"):
+                row = cumulative[first:] + np.logaddexp.accumulate(incoming[first:] - cumulative[first:])
+            row[~np.isfinite(cumulative[first:])] = incoming[first:][~np.isfinite(cumulative[first:])]
+            incoming = np.full(n + 1, -np.inf)
+            incoming[first:] = row + log_recovery[first:]
+            #Recovering the last infective ends the epidemic
+            absorbed = r + 1 - m
+            if 0 <= absorbed <= n:
+                log_final[absorbed] = incoming[absorbed]
+        return np.exp(log_final)
+
+    def sim_final_size(self, n_sim, redraw_infection_periods = False):
+        '''
+        Generates multiple observations of the final size of the epidemic.
+        By default every observation uses the infectious periods in inf_periods. If redraw_infection_periods is True, new infectious periods are drawn
+        for every observation after the first, so the observations are samples of final_size_distribution.
+        '''
         self.n_sim = n_sim
         
         self.observations = []
         
         print("Performing", self.n_sim, "iterations!")
-        for _ in range(self.n_sim):
-            
+        for observation in range(self.n_sim):
+            if redraw_infection_periods and observation > 0:
+                self.generate_infection_periods()
             new_obs = self.compute_final_size()
             self.observations.append(new_obs)
         
@@ -185,6 +384,190 @@ class SIR_Selke:
         
     def plot_hist(self):
         '''Calls the method for generating the observations and then creates the '''
+        # matplotlib is only imported when a plot is made, so that simulations can be run without loading it
+        import matplotlib.pyplot as plt
         self.plot = plt.hist(self.observations, bins = range(self.N))
         plt.hist(self.observations, bins = range(self.N), density = True)
-        plt.title(f'Final epidemic size of {self.n_sim} observations')
\ No newline at end of file
+        plt.title(f'Final epidemic size of {self.n_sim} observations')
+
+
+class SIR_gillespie:
+    '''
+    Simulates the trajectories of homogeneous SIR epidemics, where every infective emits hazard onto every susceptible, with the same parameters as SIR_Selke.
+    An infective with an infectious period T emits beta * hazard_rate(t) onto each susceptible at time t after it was infected, for t < T.
+
+    simulate is an exact next-reaction method. Each susceptible has an exponential(1) resistance, and is infected when the total hazard emitted
+    since the start of the epidemic reaches its resistance, so the next event is either the next resistance being reached or the next infectious period ending.
+    If no hazard rate was specified the crossing time is computed exactly, otherwise it is found by bisection of the vectorised hazard integrals.
+
+    tau_leap takes steps of a fixed length instead, drawing the number of new infections in each step from a binomial distribution. This is much faster for large N.
+
+    Both methods return an epidemic_result with the counts of susceptible, infected and recovered individuals over time, so they can be compared to the network simulation on a complete graph.
+
+    Arguments
+    N = total size of population
+    beta = force of infection
+    infection_period_parameters = either a float, int, or list of parameters that are passed to the infection period distribution
+    initial_infected = the number of individuals infected at time 0
+    hazard_rate = a function of the time since infection, evaluated on numpy arrays where possible. If not specified, hazard is emitted at a constant rate
+    infection_period_distribution = any distribution supported by infection_period_handler
+    random_state = an int, SeedSequence or Generator that seeds independent streams for the resistances, infection periods and infections. If not specified, the global numpy.random functions are used
+    '''
+
+    # The independent random number streams used by the simulation
+    random_stream_names = ["resistance", "infection periods", "infections"]
+
+    # The number of bisection steps used to find the time of an infection when a hazard rate is specified
+    bisection_steps = 60
+
+    def __init__(self, N, beta, infection_period_parameters, initial_infected, hazard_rate = None, infection_period_distribution = None, random_state = None):
+        self.N = N
+        self.beta = beta
+        self.inf_starting = initial_infected
+        self.infection_period_parameters = infection_period_parameters
+        self.inf_period_dist = infection_period_distribution
+        self.hazard_rate = hazard_rate
+        self.hazards = vectorised_hazard_class(hazard_rate)
+        self.random_state = random_state
+        self.random_streams = spawn_random_streams(random_state, self.random_stream_names)
+        self.infection_period_handler = infection_period_handler(self.N, self.inf_period_dist, self.infection_period_parameters, self.random_streams["infection periods"])
+
+    def start_run(self, capacity):
+        '''Draws the infectious periods of the run, and creates the event log and result that the run is recorded into'''
+        self.inf_periods = self.infection_period_handler.generate()
+        self.infection_time = np.full(self.N, np.nan)
+        self.infection_time[:self.inf_starting] = 0
+
+        events = event_log(capacity = 2 * self.N)
+        events.extend(np.arange(self.inf_starting, self.N), "Susceptible", 0)
+        events.extend(np.arange(self.inf_starting), "Infected", 0)
+        result = epidemic_result(list(range(self.N)), events.stages.labels, events, capacity = capacity)
+        return events, result
+
+    def record(self, result, events, time, susceptible, infected, recovered):
+        result.append(time, np.array([susceptible, infected, recovered]), len(events))
+
+    def hazard_emitted(self, active, t_0, t_1):
+        '''The total hazard emitted onto a susceptible by the active infectives between the times t_0 and t_1'''
+        start = self.infection_time[active]
+        return self.beta * self.hazards.increment_hazards(t_0 - start, t_1 - start, self.inf_periods[active]).sum()
+
+    def crossing_time(self, active, t_0, t_1, needed):
+        '''Finds the time in [t_0, t_1] at which the hazard emitted since t_0 reaches needed'''
+        if self.hazard_rate is None:
+            return min(t_0 + needed / (self.beta * len(active)), t_1)
+        lower, upper = t_0, t_1
+        for _ in range(self.bisection_steps):
+            middle = (lower + upper) / 2
+            if self.hazard_emitted(active, t_0, middle) < needed:
+                lower = middle
+            else:
+                upper = middle
+        return upper
+
+    def finish(self, result, events, time, infected, max_time):
+        recovered = result.counts("Recovered")[-1]
+        if infected == 0:
+            stop_reason = f"The epidemic died out at time = {time}"
+        else:
+            stop_reason = f"The simulation stopped because the maximum time was reached (max = {max_time})."
+        result.finish(events, int(recovered), stop_reason)
+        return result
+
+    def simulate(self, max_time = np.inf):
+        '''
+        Simulates one trajectory of the epidemic exactly, recording the counts after every infection and recovery.
+        The active infectives are kept in a preallocated array, from which recovered infectives are removed by swapping in the last one,
+        and the next recovery is taken from a heap of the times the infectious periods end, so each event costs O(log N) when no hazard rate was specified.
+        '''
+        events, result = self.start_run(capacity = 2 * self.N)
+        susceptible, infected, recovered = self.N - self.inf_starting, self.inf_starting, 0
+        thresholds = np.sort(self.random_streams["resistance"].exponential(1, susceptible))
+        self.resistances = thresholds
+        active = np.empty(self.N, dtype = int)
+        active[:infected] = np.arange(infected)
+        position = np.arange(self.N)
+        endings = [(self.inf_periods[node], node) for node in range(infected)]
+        heapq.heapify(endings)
+        pressure = 0.0
+        next_infected = self.inf_starting
+        time = 0.0
+        self.record(result, events, time, susceptible, infected, recovered)
+
+        while infected > 0 and time < max_time:
+            recovery_time = min(endings[0][0], max_time)
+
+            if susceptible > 0:
+                needed = thresholds[next_infected - self.inf_starting] - pressure
+                if self.hazard_rate is None:
+                    #Every active infective emits hazard at the same constant rate until it recovers
+                    emitted = self.beta * infected * (recovery_time - time)
+                else:
+                    emitted = self.hazard_emitted(active[:infected], time, recovery_time)
+                if emitted >= needed:
+                    #The next resistance is reached before the next infectious period ends
+                    time = self.crossing_time(active[:infected], time, recovery_time, needed)
+                    pressure = thresholds[next_infected - self.inf_starting]
+                    self.infection_time[next_infected] = time
+                    active[infected] = next_infected
+                    position[next_infected] = infected
+                    heapq.heappush(endings, (time + self.inf_periods[next_infected], next_infected))
+                    events.extend([next_infected], "Infected", time)
+                    next_infected += 1
+                    susceptible -= 1
+                    infected += 1
+                    self.record(result, events, time, susceptible, infected, recovered)
+                    continue
+                pressure += emitted
+
+            time = recovery_time
+            if time >= max_time:
+                break
+            _, node = heapq.heappop(endings)
+            events.extend([node], "Recovered", time)
+            last = active[infected - 1]
+            active[position[node]] = last
+            position[last] = position[node]
+            infected -= 1
+            recovered += 1
+            self.record(result, events, time, susceptible, infected, recovered)
+
+        return self.finish(result, events, time, infected, max_time)
+
+    def tau_leap(self, tau, max_time = np.inf):
+        '''
+        Simulates one trajectory of the epidemic in steps of length tau, recording the counts after every step.
+        The number of new infections in a step is binomial, with the probability that a susceptible is infected by the hazard emitted during the step.
+        Infectious periods that end during a step end at the end of the step.
+        '''
+        events, result = self.start_run(capacity = 1024)
+        rng = self.random_streams["infections"]
+        susceptible, infected, recovered = self.N - self.inf_starting, self.inf_starting, 0
+        active = np.arange(self.inf_starting)
+        next_infected = self.inf_starting
+        time = 0.0
+        self.record(result, events, time, susceptible, infected, recovered)
+
+        while infected > 0 and time < max_time:
+            start = self.infection_time[active]
+            emitted = self.hazard_emitted(active, time, time + tau)
+            new_infections = rng.binomial(susceptible, -np.expm1(-emitted)) if susceptible > 0 else 0
+            ended = start + self.inf_periods[active] <= time + tau
+            time += tau
+
+            if ended.any():
+                events.extend(active[ended], "Recovered", time)
+                active = active[~ended]
+            if new_infections > 0:
+                new_nodes = np.arange(next_infected, next_infected + new_infections)
+                self.infection_time[new_nodes] = time
+                events.extend(new_nodes, "Infected", time)
+                active = np.concatenate([active, new_nodes])
+                next_infected += new_infections
+
+            susceptible -= new_infections
+            recovered += int(ended.sum())
+            infected = len(active)
+            self.record(result, events, time, susceptible, infected, recovered)
+
+        return self.finish(result, events, time, infected, max_time)
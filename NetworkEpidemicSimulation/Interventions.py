@@ -0,0 +1,233 @@
+#This module contains the code we use to run interventions, such as treatment and contact tracing, alongside a simulation
+import bisect
+import heapq
+import itertools
+import numpy as np
+from NetworkEpidemicSimulation.RandomNumbers import spawn_random_streams
+
+
+class intervention_schedule:
+    """Delivers the events of a simulation to the interventions that have subscribed to them.
+
+    Interventions are functions that are called with only the nodes affected by an event, so their cost is proportional to the number of events
+    rather than to the number of nodes. The events of a time step are collected while the step is computed, and delivered together once the step has ended.
+
+    The events are:
+    "infection" -- f(simulation, nodes), the nodes that were infected during the step
+    "recovery" -- f(simulation, nodes), the nodes that left the last compartment of the epidemic, either recovering or becoming susceptible again
+    "migration" -- f(simulation, migrations), the (node, old block, new block) tuples of the nodes that migrated during the step
+    ("stage", code) -- f(simulation, nodes), the nodes that entered the stage with the code during the step
+
+    Functions scheduled with at_time are of the form f(simulation), and are called before the first step that starts at or after their time.
+    Functions added with every_step are of the form f(simulation), and are called at the end of every step.
+    """
+
+    events = ("infection", "recovery", "migration")
+
+    def __init__(self):
+        self.subscribers = {}
+        self.pending = []
+        self.scheduled = []
+        self.next_scheduled = 0
+        self.step_functions = []
+        self.reset_functions = []
+        self.counter = itertools.count()
+
+    def subscribe(self, event, function):
+        """Calls the function whenever the event occurs
+
+        Arguments:
+            event {str, tuple} -- The name of the event, or ("stage", code) for the nodes entering a stage
+            function {function} -- The intervention
+
+        Raises:
+            ValueError: Raised if the event is unknown
+        """
+        if event not in self.events and not (isinstance(event, tuple) and event[0] == "stage"):
+            raise ValueError(f"Unknown event {event}, the events are {self.events} or ('stage', code).")
+        self.subscribers.setdefault(event, []).append(function)
+
+    def at_time(self, time, function):
+        """Calls the function once, before the first step of the simulation that starts at or after the specified time
+
+        Arguments:
+            time {float} -- The time of the intervention
+            function {function} -- A function of the form f(simulation)
+        """
+        bisect.insort(self.scheduled, (time, next(self.counter), function))
+
+    def every_step(self, function):
+        """Calls the function at the end of every step, after the events have been delivered
+
+        Arguments:
+            function {function} -- A function of the form f(simulation)
+        """
+        self.step_functions.append(function)
+
+    def on_reset(self, function):
+        """Calls the function whenever the schedule is reset for a new replicate, so that interventions can discard their own state
+
+        Arguments:
+            function {function} -- A function without arguments
+        """
+        self.reset_functions.append(function)
+
+    def subscribed(self, event):
+        return event in self.subscribers
+
+    def publish(self, event, items):
+        """Records that an event has occured during the current step. Nothing is recorded if no intervention has subscribed to the event, or there are no items.
+
+        Arguments:
+            event {str, tuple} -- The name of the event
+            items {list} -- The nodes, or migrations, affected by the event
+        """
+        if len(items) > 0 and event in self.subscribers:
+            self.pending.append((event, list(items)))
+
+    def run_scheduled(self, simulation):
+        """Calls the functions scheduled at or before the current time of the simulation
+
+        Arguments:
+            simulation {complex_epidemic_simulation} -- The simulation
+        """
+        while self.next_scheduled < len(self.scheduled) and self.scheduled[self.next_scheduled][0] <= simulation.time:
+            _, _, function = self.scheduled[self.next_scheduled]
+            self.next_scheduled += 1
+            function(simulation)
+
+    def deliver(self, simulation):
+        """Calls the subscribers of every event published during the step, in the order the events occured
+
+        Arguments:
+            simulation {complex_epidemic_simulation} -- The simulation
+        """
+        pending, self.pending = self.pending, []
+        for event, items in pending:
+            for function in self.subscribers[event]:
+                function(simulation, items)
+        for function in self.step_functions:
+            function(simulation)
+
+    def reset(self):
+        """Discards undelivered events and re-arms the scheduled interventions, ready for a new replicate
+        """
+        self.pending = []
+        self.next_scheduled = 0
+        for function in self.reset_functions:
+            function()
+
+
+class contact_tracing:
+    """Traces the contacts of index cases, such as newly infected nodes, up to a bounded number of hops through the network.
+
+    The neighbourhoods of all the index cases of a step are expanded together, one hop at a time, over the CSR adjacency of the simulation,
+    so tracing costs a few numpy operations per hop rather than a Python breadth first search per case. Each contact is traced with the tracing
+    probability, and the action is applied to the traced nodes once the tracing delay has passed.
+
+    The results of every step are kept in results, of the form {iteration: (index cases, traced nodes, hops)}.
+    """
+
+    # The independent random number streams used by the tracing
+    random_stream_names = ["tracing"]
+
+    def __init__(self, simulation, depth = 1, tracing_probability = 1, delay = 0, action = None, trace_on = "infection", random_state = None):
+        """Subscribes the tracing to the events of the simulation
+        
+        Arguments:
+            simulation {complex_epidemic_simulation} -- The simulation
+        
+        Keyword Arguments:
+            depth {int} -- The maximum number of hops from an index case (default: {1})
+            tracing_probability {float} -- The probability that each contact is traced (default: {1})
+            delay {float} -- The time between finding the index cases and applying the action to their traced contacts (default: {0})
+            action {function} -- A function of the form f(simulation, nodes) applied to the traced nodes, for example to quarantine them. If not specified, the contacts are only recorded (default: {None})
+            trace_on {str} -- "infection" to trace from newly infected nodes, otherwise the infection stage whose entrants are traced, such as "Treated" (default: {"infection"})
+            random_state {int, numpy.random.SeedSequence, numpy.random.Generator} -- Seeds the random number stream of the tracing. If not specified, the global numpy.random functions are used (default: {None})
+        """
+        self.simulation = simulation
+        self.depth = depth
+        self.tracing_probability = tracing_probability
+        self.delay = delay
+        self.action = action
+        self.random_streams = spawn_random_streams(random_state, self.random_stream_names)
+        self.queue = []
+        self.counter = itertools.count()
+        self.results = {}
+
+        if trace_on == "infection":
+            simulation.on_infection(self.cases_found)
+        else:
+            simulation.on_stage_entry(trace_on, self.cases_found)
+        simulation.on_step(self.release_due)
+        simulation.interventions.on_reset(self.reset)
+
+    def trace(self, index_cases):
+        """Finds the contacts of the index cases, up to depth hops away. Every node is returned at most once, at the smallest number of hops it was reached.
+        
+        Arguments:
+            index_cases {numpy.array} -- The indexes of the index cases
+        
+        Returns:
+            tuple -- (traced, hops), the indexes of the traced nodes and the number of hops from the nearest index case
+        """
+        indptr, indices = self.simulation.frontier.to_csr()
+        rng = self.random_streams["tracing"]
+        frontier = np.unique(np.asarray(index_cases, dtype = np.int64))
+        visited = np.zeros(len(indptr) - 1, dtype = bool)
+        visited[frontier] = True
+        traced = [np.empty(0, dtype = np.int64)]
+        hops = [np.empty(0, dtype = np.int64)]
+
+        for hop in range(1, self.depth + 1):
+            if frontier.size == 0:
+                break
+            # Gather the CSR rows of the whole frontier in one go
+            starts = indptr[frontier]
+            lengths = indptr[frontier + 1] - starts
+            row_starts = np.cumsum(lengths) - lengths
+            contacts = indices[np.repeat(starts - row_starts, lengths) + np.arange(lengths.sum())]
+            if self.tracing_probability < 1:
+                contacts = contacts[rng.random(contacts.size) < self.tracing_probability]
+            contacts = np.unique(contacts)
+            contacts = contacts[~visited[contacts]]
+            visited[contacts] = True
+            traced.append(contacts)
+            hops.append(np.full(contacts.size, hop, dtype = np.int64))
+            frontier = contacts
+
+        return np.concatenate(traced), np.concatenate(hops)
+
+    def cases_found(self, simulation, nodes):
+        """Traces the contacts of new index cases, and schedules the action
+        
+        Arguments:
+            simulation {complex_epidemic_simulation} -- The simulation
+            nodes {list} -- The dictionary keys of the index cases
+        """
+        traced, hops = self.trace([simulation.node_index[node] for node in nodes])
+        traced_nodes = [simulation.node_keys[index] for index in traced]
+        if simulation.iteration in self.results:
+            previous_cases, previous_traced, previous_hops = self.results[simulation.iteration]
+            self.results[simulation.iteration] = (previous_cases + list(nodes), previous_traced + traced_nodes, np.concatenate([previous_hops, hops]))
+        else:
+            self.results[simulation.iteration] = (list(nodes), traced_nodes, hops)
+
+        if self.action is not None and traced_nodes != []:
+            heapq.heappush(self.queue, (simulation.time + self.delay, next(self.counter), traced_nodes))
+
+    def release_due(self, simulation):
+        """Applies the action to the traced nodes whose tracing delay has passed
+        
+        Arguments:
+            simulation {complex_epidemic_simulation} -- The simulation
+        """
+        while self.queue != [] and self.queue[0][0] <= simulation.time:
+            _, _, nodes = heapq.heappop(self.queue)
+            self.action(simulation, nodes)
+
+    def reset(self):
+        """Discards the queued actions and results, ready for a new replicate
+        """
+        self.queue = []
+        self.results = {}
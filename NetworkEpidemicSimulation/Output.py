@@ -0,0 +1,118 @@
+#This module contains the code we use to write the output of simulations to disk without holding up the simulation
+import glob
+import os
+import queue
+import threading
+import numpy as np
+
+
+class background_writer:
+    """Writes chunks of simulation output to disk on a background thread.
+
+    Every chunk is a dictionary of numpy arrays, which is written to its own NPZ file in the output directory, of the form chunk_000000.npz.
+    Chunks are handed to the thread through a bounded queue. If the thread falls behind, write_chunk blocks until there is space in the queue,
+    so no more than max_queued_chunks chunks are ever held in memory. Call flush to wait until every chunk has been written.
+    """
+
+    def __init__(self, path, max_queued_chunks = 8, compress = True):
+        """Creates the output directory. The thread is started when the first chunk is written.
+
+        Arguments:
+            path {str} -- The directory the chunks are written to
+
+        Keyword Arguments:
+            max_queued_chunks {int} -- The number of chunks that can wait to be written before write_chunk blocks (default: {8})
+            compress {bool} -- Whether the NPZ files are compressed (default: {True})
+        """
+        self.path = path
+        self.compress = compress
+        self.queue = queue.Queue(maxsize = max_queued_chunks)
+        self.thread = None
+        self.error = None
+        self.chunks_written = 0
+        os.makedirs(path, exist_ok = True)
+        self.next_chunk = len(glob.glob(os.path.join(path, "chunk_*.npz")))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.thread.start()
+
+    def run(self):
+        """Writes the chunks in the queue until the sentinel None is received
+        """
+        save = np.savez_compressed if self.compress else np.savez
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                chunk_number, columns = item
+                if self.error is None:
+                    save(os.path.join(self.path, f"chunk_{chunk_number:06d}.npz"), **columns)
+                    self.chunks_written += 1
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise IOError(f"The background writer failed to write a chunk to {self.path}.") from error
+
+    def write_chunk(self, **columns):
+        """Hands a chunk to the background thread. The arrays are copied, so the caller can carry on modifying its own.
+
+        Keyword Arguments:
+            columns {numpy.array} -- The columns of the chunk, of the form name = array
+
+        Raises:
+            IOError: Raised if an earlier chunk could not be written
+        """
+        self.check_error()
+        self.start()
+        self.queue.put((self.next_chunk, {name: np.array(values) for name, values in columns.items()}))
+        self.next_chunk += 1
+
+    def flush(self):
+        """Blocks until every chunk handed to the writer has been written to disk
+
+        Raises:
+            IOError: Raised if a chunk could not be written
+        """
+        if self.thread is not None:
+            self.queue.join()
+        self.check_error()
+
+    def close(self):
+        """Writes the remaining chunks and stops the background thread
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.check_error()
+
+    @staticmethod
+    def read(path):
+        """Reads every chunk in a directory, concatenating the columns in chunk order
+
+        Arguments:
+            path {str} -- The directory the chunks were written to
+
+        Returns:
+            dict -- The columns, of the form {name: array}
+        """
+        columns = {}
+        for file_name in sorted(glob.glob(os.path.join(path, "chunk_*.npz"))):
+            with np.load(file_name) as chunk:
+                for name in chunk.files:
+                    columns.setdefault(name, []).append(chunk[name])
+        return {name: np.concatenate(values) for name, values in columns.items()}
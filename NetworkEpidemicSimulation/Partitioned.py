@@ -0,0 +1,334 @@
+#This module contains the code we use to simulate one large epidemic on several processes, each owning part of the network
+import multiprocessing
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.EpidemicSimulation import infection_stage, epidemic_data
+from NetworkEpidemicSimulation.SharedMemory import shared_arrays, share_state, state_columns, bind_columns
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+
+
+def partition_network(G, number_of_parts):
+    """Splits the nodes of a network into parts of roughly equal size with few edges between them.
+
+    If every node has a "block" attribute, as in a SBM, then whole blocks are assigned to the parts, the largest blocks first, each to the part with the fewest nodes.
+    Otherwise the nodes are ordered with the reverse Cuthill-McKee algorithm, which places neighbours close together, and the ordering is cut into contiguous pieces.
+
+    Arguments:
+        G {NetworkX graph} -- The network
+        number_of_parts {int} -- The number of parts
+
+    Returns:
+        numpy.array -- The part of every node, in the order of G.nodes()
+    """
+    node_keys = list(G.nodes())
+    N = len(node_keys)
+    blocks = [G.nodes[node].get("block") for node in node_keys]
+
+    if None not in blocks and len(set(blocks)) >= number_of_parts:
+        block_labels, node_blocks = np.unique(blocks, return_inverse = True)
+        block_sizes = np.bincount(node_blocks)
+        part_sizes = np.zeros(number_of_parts, dtype = np.int64)
+        block_part = np.empty(len(block_labels), dtype = np.int64)
+        for block in np.argsort(-block_sizes, kind = "stable"):
+            part = int(np.argmin(part_sizes))
+            block_part[block] = part
+            part_sizes[part] += block_sizes[block]
+        return block_part[node_blocks]
+
+    # scipy is slow to import, so it is only imported when it is used
+    from scipy.sparse.csgraph import reverse_cuthill_mckee
+    adjacency = nx.to_scipy_sparse_array(G, nodelist = node_keys, format = "csr")
+    order = reverse_cuthill_mckee(adjacency, symmetric_mode = True)
+    parts = np.empty(N, dtype = np.int64)
+    parts[order] = np.arange(N) * number_of_parts // max(N, 1)
+    return parts
+
+
+class partition_columns:
+    """The columns of an epidemic_data, bound to shared memory in a worker process.
+
+    Only the columns are copied into the worker, not the network or the rest of the data structure. The methods the workers need are those of epidemic_data.
+    """
+
+    enter_stage = epidemic_data.enter_stage
+    stage_durations = epidemic_data.stage_durations
+
+    def __init__(self, shared, names):
+        """Binds the columns to the views of the shared block
+
+        Arguments:
+            shared {shared_arrays} -- The block holding the columns
+            names {list} -- The names of the columns, as returned by state_columns
+        """
+        self.times_entered = {}
+        self.pre_generated_durations = {}
+        bind_columns(self, {name: shared[name] for name in names})
+
+
+class partition_worker:
+    """Simulates the nodes of one part of the network, in a worker process.
+
+    The state of every node is held in shared memory. The worker only writes the state of the nodes it owns, and reads the hazard emitted by
+    the neighbouring nodes owned by other workers from the shared emitted column, which is how exposure crosses the boundaries of the parts.
+    The worker only holds the stage tables and the hazard function of the simulation, so it is cheap to send to a process whatever the start method.
+    """
+
+    def __init__(self, simulation, owned):
+        """Copies what the worker needs from the simulation
+
+        Arguments:
+            simulation {partitioned_epidemic_simulation} -- The simulation
+            owned {numpy.array} -- The indexes of the nodes owned by the worker, in ascending order
+        """
+        self.owned = owned
+        self.compartment_codes = simulation.compartment_codes
+        self.next_stage_code = simulation.next_stage_code
+        self.stage_infectivity = simulation.stage_infectivity
+        self.entry_code = simulation.entry_code
+        self.hazard = simulation.hazard
+        self.time_increment = simulation.time_increment
+        self.parameter_names = list(simulation.hazard_parameters)
+        self.column_names = list(state_columns(simulation.data_structure))
+
+    def run(self, handle, connection):
+        """Attaches to the shared state, then carries out the commands sent by the simulation until it is told to stop
+
+        Arguments:
+            handle {tuple} -- The handle of the shared state
+            connection {multiprocessing.Connection} -- The connection to the simulation
+        """
+        shared = shared_arrays.attach(handle)
+        self.data = partition_columns(shared, self.column_names)
+        self.emitted = shared["emitted"]
+        self.indptr = shared["indptr"]
+        self.indices = shared["indices"]
+        self.owns = np.zeros(len(self.indptr) - 1, dtype = bool)
+        self.owns[self.owned] = True
+        self.infectivity = shared["infectivity"]
+        self.hazard_parameters = {name: shared[f"hazard parameter {name}"] for name in self.parameter_names}
+        try:
+            while True:
+                command, arguments = connection.recv()
+                if command == "stop":
+                    break
+                try:
+                    connection.send((True, getattr(self, command)(*arguments)))
+                except Exception as error:
+                    connection.send((False, error))
+        finally:
+            self.data = self.emitted = self.indptr = self.indices = self.owns = self.infectivity = self.hazard_parameters = None
+            shared.close()
+
+    def recover(self, time):
+        """Moves the owned nodes whose time in a compartment has ended to the next stage
+
+        Returns:
+            tuple -- (indexes, next stage codes) of the nodes that changed stage
+        """
+        data, owned = self.data, self.owned
+        ended = owned[np.isin(data.stage_code[owned], self.compartment_codes) & (data.infection_stage_started[owned] + data.stage_durations(owned) < time)]
+        next_codes = self.next_stage_code[data.stage_code[ended]]
+        for next_code in np.unique(next_codes):
+            data.enter_stage(ended[next_codes == next_code], int(next_code), time)
+        return ended, next_codes
+
+    def emit(self, time):
+        """Writes the hazard the owned infectious nodes emit during the next time increment into the shared emitted column, in the same way as complex_epidemic_simulation.emitted_hazards
+
+        Returns:
+            numpy.array -- The indexes of the owned infectious nodes
+        """
+        data, owned = self.data, self.owned
+        self.emitted[owned] = 0
+        infectious = owned[self.stage_infectivity[data.stage_code[owned]] > 0]
+        if infectious.size > 0:
+            time_since_infected = time - data.infection_stage_started[infectious]
+            parameters = {name: values[infectious] for name, values in self.hazard_parameters.items()}
+            hazards = self.hazard.increment_hazards(time_since_infected, time_since_infected + self.time_increment, data.stage_durations(infectious), parameters)
+            self.emitted[infectious] = self.infectivity[infectious] * self.stage_infectivity[data.stage_code[infectious]] * hazards
+        return infectious
+
+    def expose(self, sources):
+        """Adds the hazard emitted by the infectious nodes of every worker to the exposure of their owned susceptible neighbours.
+
+        Only the neighbours of the infectious nodes are visited, as in the serial simulation. The contributions are sorted by target and then by source,
+        and np.add.at adds them one at a time, so every exposure level is accumulated in the same order as in the serial simulation and the results are identical.
+
+        Arguments:
+            sources {numpy.array} -- The indexes of the infectious nodes of every worker
+        """
+        data = self.data
+        starts = self.indptr[sources]
+        lengths = self.indptr[sources + 1] - starts
+        row_starts = np.cumsum(lengths) - lengths
+        targets = self.indices[np.repeat(starts - row_starts, lengths) + np.arange(lengths.sum())]
+        sources = np.repeat(sources, lengths)
+        exposed = self.owns[targets] & (data.stage_code[targets] == infection_stage.SUSCEPTIBLE)
+        targets, sources = targets[exposed], sources[exposed]
+        order = np.lexsort((sources, targets))
+        np.add.at(data.exposure_level, targets[order], self.emitted[sources[order]])
+
+    def infect(self, time):
+        """Infects the owned susceptible nodes whose exposure has passed their resistance
+
+        Returns:
+            numpy.array -- The indexes of the infected nodes
+        """
+        data, owned = self.data, self.owned
+        infected = owned[(data.stage_code[owned] == infection_stage.SUSCEPTIBLE) & (data.resistance[owned] < data.exposure_level[owned])]
+        data.enter_stage(infected, self.entry_code, time)
+        return infected
+
+
+class partitioned_epidemic_simulation(complex_epidemic_simulation):
+    """Simulates a single epidemic on a large static network with several worker processes, each owning part of the nodes.
+
+    The state of every node and the pre-generated data are placed in shared memory when the epidemic is iterated. In every step, each worker moves
+    its own nodes through the compartments, computes the hazard its infectious nodes emit, and adds the hazard emitted onto its susceptible nodes,
+    reading the hazard of neighbours across the boundary of its part from shared memory. The main process records the counts and events of each step.
+
+    Because the random numbers are pre-generated, and every exposure level is accumulated in ascending order of the emitting nodes, the epidemic
+    is identical to the one simulated by complex_epidemic_simulation with the same arguments.
+
+    Dynamic networks are not supported. Interventions and custom behaviour run in the main process, between the steps of the workers.
+    The workers read the infectivity and hazard parameters of the nodes when they start, so changing the parameters only takes effect in the next call to iterate_epidemic.
+    """
+
+    def __init__(self, G, *arguments, number_of_parts = 2, partition = None, start_method = None, **keyword_arguments):
+        """Initialises the simulation. The other arguments are those of complex_epidemic_simulation.
+
+        Arguments:
+            G {NetworkX graph} -- The network the epidemic is spreading on
+
+        Keyword Arguments:
+            number_of_parts {int} -- The number of worker processes (default: {2})
+            partition {list} -- The part of every node in the order of G.nodes(), if not specified then partition_network is used (default: {None})
+            start_method {str} -- The multiprocessing start method of the workers, such as "spawn", if not specified the default of the platform is used (default: {None})
+
+        Raises:
+            ValueError: Raised if the network is dynamic, or the partition does not have one part per node
+        """
+        super().__init__(G, *arguments, **keyword_arguments)
+        if self.increment_network is not None:
+            raise ValueError("The partitioned simulation does not support dynamic networks.")
+        if partition is None:
+            partition = partition_network(G, number_of_parts)
+        partition = np.asarray(partition, dtype = np.int64)
+        if partition.shape != (self.N,):
+            raise ValueError(f"Expected one part per node ({self.N}), received an array of shape {partition.shape}.")
+        self.partition = partition
+        self.start_method = start_method
+        self.workers = []
+
+    def __getstate__(self):
+        # The worker processes, their connections and the writer stay with the main process
+        state = self.__dict__.copy()
+        for name in ("workers", "connections", "shared", "writer", "result"):
+            state.pop(name, None)
+        return state
+
+    def start_workers(self):
+        """Moves the state of the nodes into shared memory, and starts one worker for each part
+        """
+        data = self.data_structure
+        indptr, indices = self.frontier.to_csr()
+        parameters = {f"hazard parameter {name}": values for name, values in self.hazard_parameters.items()}
+        self.shared = share_state(data, emitted = np.zeros(self.N), indptr = indptr, indices = indices, infectivity = self.infectivity(np.arange(self.N)), **parameters)
+
+        # The frontier is not used by the workers, so it is not kept up to date until the epidemic has been iterated
+        data.stage_change_listeners.remove(self.frontier.stage_changed)
+
+        self.connections = []
+        context = multiprocessing.get_context(self.start_method)
+        for part in np.unique(self.partition):
+            connection, worker_connection = context.Pipe()
+            worker = partition_worker(self, np.flatnonzero(self.partition == part))
+            process = context.Process(target = worker.run, args = (self.shared.handle, worker_connection), daemon = True)
+            process.start()
+            self.workers.append(process)
+            self.connections.append(connection)
+
+    def stop_workers(self):
+        """Stops the workers, and copies the state of the nodes out of shared memory
+        """
+        for connection in self.connections:
+            connection.send(("stop", ()))
+        for process in self.workers:
+            process.join()
+        self.workers = []
+        self.connections = []
+
+        data = self.data_structure
+        bind_columns(data, {name: np.array(column) for name, column in state_columns(data).items()})
+        self.shared.close()
+        self.shared.unlink()
+        self.shared = None
+        data.add_stage_change_listener(self.frontier.stage_changed)
+        self.frontier.rebuild(data.stage_code)
+
+    def command(self, command, *arguments):
+        """Sends a command to every worker, and waits for all of them to finish it
+
+        Returns:
+            list -- The reply of each worker
+
+        Raises:
+            Exception: The exception raised by a worker is raised again here
+        """
+        for connection in self.connections:
+            connection.send((command, arguments))
+        replies = [connection.recv() for connection in self.connections]
+        for succeeded, reply in replies:
+            if not succeeded:
+                raise reply
+        return [reply for _, reply in replies]
+
+    def determine_recoveries(self):
+        """The workers move the nodes whose time in a compartment has ended to the next stage, then the events are logged in the order of the serial simulation
+        """
+        replies = self.command("recover", self.time)
+        ended = np.concatenate([ended for ended, _ in replies])
+        next_codes = np.concatenate([next_codes for _, next_codes in replies])
+        order = np.argsort(ended, kind = "stable")
+        ended, next_codes = ended[order], next_codes[order]
+
+        for next_code in np.unique(next_codes):
+            indexes = ended[next_codes == next_code]
+            self.data_structure.events.extend(indexes, int(next_code), self.time)
+            nodes = [self.node_keys[index] for index in indexes]
+            self.interventions.publish(("stage", int(next_code)), nodes)
+            if next_code not in self.compartment_codes:
+                self.interventions.publish("recovery", nodes)
+
+    def updates_exposure_levels(self):
+        """The workers compute the hazard emitted by their infectious nodes, and once every worker has done so, add it to the exposure of their susceptible nodes
+        """
+        sources = np.sort(np.concatenate(self.command("emit", self.time)))
+        self.command("expose", sources)
+
+    def determine_new_infections(self):
+        """The workers infect the nodes whose exposure has passed their resistance, then the events are logged in the order of the serial simulation
+        """
+        infected = np.sort(np.concatenate(self.command("infect", self.time)))
+        self.data_structure.events.extend(infected, self.entry_code, self.time)
+        self.new_infections = [self.node_keys[index] for index in infected]
+        self.interventions.publish(("stage", self.entry_code), self.new_infections)
+        self.interventions.publish("infection", self.new_infections)
+
+    def record_iteration(self):
+        # The workers do not notify the block counts of the stage changes, so they are recounted
+        if self.block_counts is not None and self.workers != []:
+            self.block_counts.rebuild(self.data_structure.stage_code)
+        super().record_iteration()
+
+    def iterate_epidemic(self):
+        """Performs iterations of the simulation on the worker processes until either there is epidemic die out, or the maximum number of iterations is reached.
+
+        Returns:
+            epidemic_result -- The result, identical to that of complex_epidemic_simulation
+        """
+        self.start_workers()
+        try:
+            return super().iterate_epidemic()
+        finally:
+            self.stop_workers()
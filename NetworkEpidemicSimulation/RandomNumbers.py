@@ -0,0 +1,53 @@
+#This module contains code we use to manage the random number generators of the simulations
+import numpy as np
+
+
+def spawn_random_streams(random_state, names, bit_generator = None):
+    """Creates an independent random number generator for each of the named subsystems of a simulation.
+
+    Every subsystem (resistances, infection periods, migration, edges, ...) draws from its own stream, so that changing how many numbers
+    one subsystem draws does not change the numbers drawn by any other. The streams are spawned from a numpy SeedSequence, so runs
+    with the same seed are reproducible and runs with different seeds are statistically independent, which makes them safe to run in parallel.
+
+    If random_state is None, then every subsystem uses the global numpy.random functions, which is how the package behaved before
+    Generators were supported. np.random.seed can then be used to make simulations reproducible.
+
+    Arguments:
+        random_state {None, int, numpy.random.SeedSequence, numpy.random.Generator} -- The seed, or a Generator to spawn the streams from
+        names {list} -- The names of the subsystems
+
+    Keyword Arguments:
+        bit_generator {class} -- The numpy bit generator used for each stream, such as numpy.random.PCG64 or numpy.random.Philox (default: {PCG64})
+
+    Returns:
+        dict -- A dictionary of the form {name: generator}
+    """
+    if random_state is None:
+        return {name: np.random for name in names}
+
+    if bit_generator is None:
+        bit_generator = np.random.PCG64
+
+    if isinstance(random_state, np.random.Generator):
+        seed_sequences = random_state.bit_generator.seed_seq.spawn(len(names))
+    elif isinstance(random_state, np.random.SeedSequence):
+        seed_sequences = random_state.spawn(len(names))
+    else:
+        seed_sequences = np.random.SeedSequence(random_state).spawn(len(names))
+
+    return {name: np.random.Generator(bit_generator(seed_sequence)) for name, seed_sequence in zip(names, seed_sequences)}
+
+
+def spawn_seeds(seed, number_of_seeds):
+    """Creates independent seeds for a batch of simulations, such as the replicates of an ensemble that are run in parallel.
+
+    Arguments:
+        seed {None, int, numpy.random.SeedSequence} -- The seed of the whole batch
+        number_of_seeds {int} -- The number of simulations in the batch
+
+    Returns:
+        list -- A list of numpy SeedSequences, one for each simulation
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(number_of_seeds)
@@ -0,0 +1,196 @@
+#This module contains the result object that the simulations record their output into
+import numpy as np
+
+
+class epidemic_result:
+    """Holds the output of one run of a simulation in contiguous numpy arrays.
+
+    Every iteration appends one row: the time, the number of nodes with each stage code, the length of the event log and optionally the S/I/R counts of every block.
+    The arrays are allocated in advance and doubled in size when they are full, so recording never builds Python lists.
+    When the run has finished, the infection stage events are copied into the result, so that it no longer depends on the simulation.
+
+    to_numpy returns views of the arrays without copying them, and pickling only stores the rows that were used.
+    """
+
+    def __init__(self, node_keys, stage_labels, events, capacity = 256, number_of_blocks = None):
+        """Allocates the arrays of the result
+
+        Arguments:
+            node_keys {list} -- The dictionary keys of the nodes, in index order
+            stage_labels {list} -- The labels of the infection stages, in code order. The list is shared with the stage registry, so stages added later are included
+            events {event_log} -- The event log of the simulation, which is read until the run has finished
+
+        Keyword Arguments:
+            capacity {int} -- The number of iterations the result can hold before it is first resized (default: {256})
+            number_of_blocks {int} -- If specified, the S/I/R counts of this many blocks are recorded every iteration (default: {None})
+        """
+        self.node_keys = node_keys
+        self.stage_labels = stage_labels
+        self.length = 0
+        self.time_buffer = np.empty(capacity, dtype = np.float64)
+        self.stage_count_buffer = np.zeros((capacity, len(stage_labels)), dtype = np.int64)
+        self.event_count_buffer = np.empty(capacity, dtype = np.int64)
+        if number_of_blocks is None:
+            self.block_count_buffer = None
+        else:
+            self.block_count_buffer = np.zeros((capacity, number_of_blocks, 3), dtype = np.int64)
+        self.events = events
+        self.event_node = None
+        self.event_stage = None
+        self.event_time = None
+        self.final_size = None
+        self.stop_reason = None
+
+    def __len__(self):
+        return self.length
+
+    def reserve(self, rows, stages, blocks):
+        """Grows the arrays so that they can hold the specified number of rows, stages and blocks
+        """
+        capacity, number_of_stages = self.stage_count_buffer.shape
+        if rows > capacity:
+            capacity = max(rows, 2 * capacity)
+            self.time_buffer = np.resize(self.time_buffer, capacity)
+            self.event_count_buffer = np.resize(self.event_count_buffer, capacity)
+        if rows > self.stage_count_buffer.shape[0] or stages > number_of_stages:
+            stage_counts = np.zeros((capacity, max(stages, number_of_stages)), dtype = np.int64)
+            stage_counts[:self.length, :number_of_stages] = self.stage_count_buffer[:self.length]
+            self.stage_count_buffer = stage_counts
+        if self.block_count_buffer is not None:
+            old_capacity, number_of_blocks, _ = self.block_count_buffer.shape
+            if rows > old_capacity or blocks > number_of_blocks:
+                block_counts = np.zeros((capacity, max(blocks, number_of_blocks), 3), dtype = np.int64)
+                block_counts[:self.length, :number_of_blocks] = self.block_count_buffer[:self.length]
+                self.block_count_buffer = block_counts
+
+    def append(self, time, stage_counts, event_count, block_counts = None):
+        """Records one iteration of the simulation
+
+        Arguments:
+            time {float} -- The time of the simulation
+            stage_counts {numpy.array} -- The number of nodes with each stage code
+            event_count {int} -- The length of the event log
+
+        Keyword Arguments:
+            block_counts {numpy.array} -- The S/I/R counts of every block, of shape (blocks, 3) (default: {None})
+        """
+        blocks = 0 if block_counts is None else block_counts.shape[0]
+        self.reserve(self.length + 1, len(stage_counts), blocks)
+        row = self.length
+        self.time_buffer[row] = time
+        self.stage_count_buffer[row, :len(stage_counts)] = stage_counts
+        self.event_count_buffer[row] = event_count
+        if block_counts is not None:
+            self.block_count_buffer[row, :blocks] = block_counts
+        self.length += 1
+
+    def finish(self, events, final_size, stop_reason):
+        """Copies the infection stage events of the run into the result, and records how it ended
+
+        Arguments:
+            events {event_log} -- The event log of the simulation
+            final_size {int} -- The number of recovered nodes at the end of the run
+            stop_reason {str} -- Why the run stopped
+        """
+        self.event_node = events.node[:len(events)].copy()
+        self.event_stage = events.stage[:len(events)].copy()
+        self.event_time = events.time[:len(events)].copy()
+        self.events = None
+        self.final_size = final_size
+        self.stop_reason = stop_reason
+
+    @property
+    def time(self):
+        return self.time_buffer[:self.length]
+
+    @property
+    def stage_counts(self):
+        """The number of nodes with each stage code at every iteration, of shape (iterations, stages)"""
+        return self.stage_count_buffer[:self.length, :len(self.stage_labels)]
+
+    @property
+    def event_counts(self):
+        return self.event_count_buffer[:self.length]
+
+    @property
+    def block_counts(self):
+        """The S/I/R counts of every block at every iteration, of shape (iterations, blocks, 3), or None if blocks were not recorded"""
+        if self.block_count_buffer is None:
+            return None
+        return self.block_count_buffer[:self.length]
+
+    def counts(self, stage):
+        """Returns the number of nodes in a stage at every iteration, as a view of the result
+
+        Arguments:
+            stage {str} -- The label of the stage
+
+        Returns:
+            numpy.array -- The counts
+        """
+        if stage not in self.stage_labels:
+            return np.zeros(self.length, dtype = np.int64)
+        return self.stage_count_buffer[:self.length, self.stage_labels.index(stage)]
+
+    def nodes_in_stage(self, stage):
+        """Reconstructs the nodes in a stage at every iteration by replaying the event log. This is only done when it is asked for.
+
+        Arguments:
+            stage {str} -- The label of the stage
+
+        Returns:
+            list -- A list of the dictionary keys of the nodes in the stage, for every iteration
+        """
+        if self.event_node is None:
+            event_node, event_stage = self.events.node, self.events.stage
+        else:
+            event_node, event_stage = self.event_node, self.event_stage
+        if stage not in self.stage_labels:
+            return [[] for _ in range(self.length)]
+        code = self.stage_labels.index(stage)
+        current = np.full(len(self.node_keys), -1, dtype = np.int8)
+        nodes = []
+        start = 0
+        for end in self.event_counts:
+            current[event_node[start:end]] = event_stage[start:end]
+            start = end
+            nodes.append([self.node_keys[index] for index in np.flatnonzero(current == code)])
+        return nodes
+
+    def to_numpy(self):
+        """Returns the arrays of the result without copying them
+
+        Returns:
+            dict -- The arrays, of the form {name: array}. Stage counts are given under the label of each stage
+        """
+        arrays = {"time": self.time}
+        for code, label in enumerate(self.stage_labels):
+            arrays[label] = self.stage_count_buffer[:self.length, code]
+        if self.block_count_buffer is not None:
+            arrays["block_counts"] = self.block_counts
+        return arrays
+
+    def to_dataframe(self):
+        """Returns the time and stage counts of every iteration as a pandas DataFrame
+
+        Returns:
+            pandas.DataFrame -- One row per iteration, indexed by time
+        """
+        import pandas as pd
+        counts = pd.DataFrame(self.stage_counts, columns = list(self.stage_labels), copy = False)
+        counts.index = pd.Index(self.time, name = "time")
+        return counts
+
+    def __getstate__(self):
+        # Only the rows that were used are pickled
+        state = self.__dict__.copy()
+        state["events"] = None
+        state["stage_labels"] = list(self.stage_labels)
+        state["time_buffer"] = self.time
+        state["stage_count_buffer"] = self.stage_counts
+        state["event_count_buffer"] = self.event_counts
+        state["block_count_buffer"] = self.block_counts
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
@@ -0,0 +1,196 @@
+#This module contains the code we use to share numpy arrays between processes without copying them
+from multiprocessing import shared_memory
+import numpy as np
+from NetworkEpidemicSimulation.CompactNetworks import csr_graph
+
+
+class shared_arrays:
+    """Places a set of numpy arrays in one block of shared memory, so that several processes can read and write them without copies.
+
+    The process that creates the block copies the arrays into it. Other processes attach to the block with the handle, a small picklable tuple
+    holding the name of the block and the layout of the arrays, and receive numpy views of the same memory.
+    Every process calls close when it has finished with the views, and the process that created the block calls unlink to free it.
+    """
+
+    # The offset of every array is a multiple of this many bytes
+    alignment = 64
+
+    def __init__(self, block, layout, owner):
+        self.block = block
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {name: np.ndarray(shape, dtype = np.dtype(dtype), buffer = block.buf, offset = offset)
+                       for name, (offset, shape, dtype) in layout.items()}
+
+    @classmethod
+    def create(cls, arrays):
+        """Creates a block of shared memory holding copies of the arrays
+
+        Arguments:
+            arrays {dict} -- The arrays, of the form {name: array}
+
+        Returns:
+            shared_arrays -- The views of the arrays in the new block
+        """
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            size = -(-size // cls.alignment) * cls.alignment
+            layout[name] = (size, array.shape, array.dtype.str)
+            size += array.nbytes
+        block = shared_memory.SharedMemory(create = True, size = max(size, 1))
+        shared = cls(block, layout, owner = True)
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, handle):
+        """Attaches to a block created by another process
+
+        Arguments:
+            handle {tuple} -- The handle of the block, see handle
+
+        Returns:
+            shared_arrays -- The views of the arrays in the block
+        """
+        name, layout = handle
+        return cls(shared_memory.SharedMemory(name = name), layout, owner = False)
+
+    @property
+    def handle(self):
+        """The name and layout of the block, which is all another process needs to attach to it"""
+        return (self.block.name, self.layout)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def close(self):
+        """Releases the views of this process. Arrays that still refer to the block must not be used afterwards.
+        """
+        self.arrays = {}
+        self.block.close()
+
+    def unlink(self):
+        """Frees the block, once every process has closed it. Only the process that created the block should call this.
+        """
+        self.block.unlink()
+
+
+class shared_graph(csr_graph):
+    """A csr_graph whose arrays are placed in shared memory, so that every process of an ensemble reads the same copy of the network.
+
+    Pickling a shared_graph only sends the handle of the block, and unpickling it attaches to the block, so it can be passed to an executor,
+    or in the tasks themselves, at the cost of a few hundred bytes. For example:
+        with shared_graph(G) as network, local_executor(32) as executor:
+            executor.share(network = network)
+            parameter_sweep(network, grid, seeds, executor = executor, ...)
+
+    The nodes are labelled by their index in the order of G.nodes(), node_keys holds the original labels in the process that created the graph.
+    """
+
+    def __init__(self, G):
+        """Copies the network into a new block of shared memory
+
+        Arguments:
+            G {NetworkX graph, csr_graph} -- The network
+        """
+        if not isinstance(G, csr_graph):
+            self.node_keys = list(G.nodes())
+            G = csr_graph.from_networkx(G)
+        else:
+            self.node_keys = None
+        arrays = {"indptr": G.indptr, "indices": G.indices}
+        if G.blocks is not None:
+            arrays["blocks"] = G.blocks
+        self.shared = shared_arrays.create(arrays)
+        self.view_shared_arrays()
+
+    def view_shared_arrays(self):
+        csr_graph.__init__(self, self.shared["indptr"], self.shared["indices"], self.shared["blocks"] if "blocks" in self.shared else None)
+
+    def __getstate__(self):
+        return {"handle": self.shared.handle}
+
+    def __setstate__(self, state):
+        self.node_keys = None
+        self.shared = shared_arrays.attach(state["handle"])
+        self.view_shared_arrays()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        if self.shared.owner:
+            self.unlink()
+
+    def close(self):
+        """Releases the views of this process, the graph must not be used afterwards
+        """
+        self.indptr = self.indices = self.blocks = None
+        self.shared.close()
+
+    def unlink(self):
+        """Frees the shared memory, once every process has closed the graph. Only the process that created the graph should call this.
+        """
+        self.shared.unlink()
+
+
+def state_columns(data):
+    """Returns the columns of an epidemic_data that are read or written while the epidemic is simulated, including the pre-generated data
+
+    Arguments:
+        data {epidemic_data} -- The data structure
+
+    Returns:
+        dict -- The columns, of the form {name: array}
+    """
+    columns = {name: getattr(data, name) for name in ("stage_code", "infection_stage_started", "resistance", "infection_period", "exposure_level",
+                                                      "times_infected", "times_susceptible", "stage_duration",
+                                                      "pre_generated_resistance", "pre_generated_infection_period")}
+    for code in data.pre_generated_durations:
+        columns[f"times_entered {code}"] = data.times_entered[code]
+        columns[f"pre_generated_durations {code}"] = data.pre_generated_durations[code]
+    return columns
+
+
+def bind_columns(data, columns):
+    """Replaces the columns of an epidemic_data with the specified arrays, such as views of shared memory
+
+    Arguments:
+        data {epidemic_data} -- The data structure
+        columns {dict} -- The columns, of the form {name: array}, as returned by state_columns
+    """
+    for name, column in columns.items():
+        if name.startswith("times_entered "):
+            data.times_entered[int(name.split()[1])] = column
+        elif name.startswith("pre_generated_durations "):
+            data.pre_generated_durations[int(name.split()[1])] = column
+        else:
+            setattr(data, name, column)
+
+
+def share_state(data, **extra_arrays):
+    """Moves the columns of an epidemic_data, including the pre-generated data, into a new block of shared memory, and replaces the columns with views of it.
+
+    Other processes can then attach to the block with the handle and bind the views into their own copy of the data structure with bind_columns,
+    so that every process reads and writes the same state.
+
+    Arguments:
+        data {epidemic_data} -- The data structure
+
+    Keyword Arguments:
+        extra_arrays -- Other arrays placed in the same block, of the form name = array
+
+    Returns:
+        shared_arrays -- The block
+    """
+    columns = state_columns(data)
+    shared = shared_arrays.create(dict(columns, **extra_arrays))
+    bind_columns(data, {name: shared[name] for name in columns})
+    return shared
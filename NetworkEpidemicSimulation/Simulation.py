@@ -1,20 +1,45 @@
+import functools
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy.integrate as spi
 import networkx as nx
-from NetworkEpidemicSimulation.EpidemicSimulation import epidemic_data
+from NetworkEpidemicSimulation.EpidemicSimulation import epidemic_data, infection_stage, compartment_model
+from NetworkEpidemicSimulation.Interventions import intervention_schedule
+from NetworkEpidemicSimulation.Results import epidemic_result
+from NetworkEpidemicSimulation.CompactNetworks import csr_graph
+
+
+@functools.lru_cache()
+def gauss_lobatto(number_of_points):
+    """Returns the points and weights of the Gauss-Lobatto rule on [-1, 1].
+
+    The end points are moved inside the interval by 1e-12, so that hazard functions that are singular at the start of the infectious period can be evaluated.
+
+    Arguments:
+        number_of_points {int} -- The number of points, at least 3
+
+    Returns:
+        tuple -- (points, weights)
+    """
+    legendre = np.polynomial.legendre.Legendre.basis(number_of_points - 1)
+    points = np.concatenate([[-1], np.sort(legendre.deriv().roots().real), [1]])
+    weights = 2 / (number_of_points * (number_of_points - 1) * legendre(points) ** 2)
+    points[[0, -1]] = [-1 + 1e-12, 1 - 1e-12]
+    return points, weights
 
 
 class hazard_class:
     """For a specified hazard function, this class manages calculations of useful quantities"""
 
-    def __init__(self, hazard_function):
+    def __init__(self, hazard_function, vectorised = None):
         """Initializes the class
         
         Arguments:
             hazard_function {function} -- A function of the form f(t)
+
+        Keyword Arguments:
+            vectorised {bool} -- Whether the hazard function accepts numpy arrays. If not specified, it is found by the first call to evaluate_hazards (default: {None})
         """
         self.hazard_function = hazard_function
+        self.vectorised = vectorised
 
     def hazard(self, t, t_end):
         """Returns a variant of the hazard rate function which truncates negative values up to 0.
@@ -49,23 +74,418 @@ class hazard_class:
             t_1 {float} -- The second timepoint
             end_of_infection_time {float} -- The time at which a nodes infection will end. This is required so that values after this time are returned as 0
         """
+        # scipy.integrate is slow to import, so it is only imported when it is used
+        import scipy.integrate as spi
         def f(t): return self.hazard(t, end_of_infection_time)
         hazard_emitted = spi.quad(f, t_0, t_1)
         return hazard_emitted[0]
 
+    def evaluate_hazards(self, t, parameters = None):
+        """Evaluates the hazard function over an array of timepoints, truncating negative values up to 0.
+
+        If the hazard function is vectorised, it is called once with the whole array, otherwise it is called once per timepoint.
+        Unless this was specified when the class was created, it is decided once, by the first call: if calling the function with the whole array raises
+        an error but calling it with the first timepoint does not, the function is taken to only accept scalar inputs. Otherwise the error is raised.
+
+        Arguments:
+            t {numpy.array} -- The timepoints at which the hazard rate is evaluated
+
+        Keyword Arguments:
+            parameters {dict} -- Keyword arguments passed to the hazard function, each broadcastable against t (default: {None})
+
+        Returns:
+            numpy.array -- The hazard rates, with the same shape as t
+        """
+        if self.hazard_function is None:
+            return np.ones(np.shape(t))
+
+        if parameters is None:
+            parameters = {}
+
+        if self.vectorised is None:
+            try:
+                values = self.vectorised_call(t, parameters)
+                self.vectorised = True
+            except (TypeError, ValueError):
+                self.check_scalar_call(t, parameters)
+                self.vectorised = False
+        if self.vectorised:
+            values = self.vectorised_call(t, parameters)
+        else:
+            values = np.vectorize(self.hazard_function, otypes = [float])(t, **parameters)
+
+        return np.maximum(values, 0)
+
+    def vectorised_call(self, t, parameters):
+        values = np.asarray(self.hazard_function(t, **parameters), dtype = float)
+        return np.broadcast_to(values, np.shape(t))
+
+    def check_scalar_call(self, t, parameters):
+        """Calls the hazard function with the first timepoint only, after calling it with the whole array failed. If this fails too, the error of the function is not caused by the array and is raised again
+        """
+        first = np.unravel_index(0, np.shape(t))
+        scalar_parameters = {name: np.broadcast_to(values, np.shape(t))[first] for name, values in parameters.items()}
+        float(self.hazard_function(np.asarray(t)[first], **scalar_parameters))
+
+    def increment_hazards(self, t_0, t_1, infection_periods, parameters = None, quadrature_points = 16, tolerance = 1.49e-8, max_depth = 50):
+        """Integrates the hazard function over the domain [t_0, t_1] for many infected nodes in one call.
+
+        The integration limits are first clipped to the infectious period [0, infection_period] of each node, the clipped domains
+        are then integrated using adaptive quadrature. Every panel is integrated with a Gauss-Legendre rule of quadrature_points, and with a Gauss-Lobatto rule
+        of about half as many points, and the panels where the two disagree, such as those containing a discontinuity of the hazard rate, are halved until they agree.
+        The Gauss-Lobatto rule has points next to the ends and at the centre of the panel, where the Gauss-Legendre rule has none, so a discontinuity cannot hide there.
+        The panels of every node are integrated together, so smooth hazard functions are evaluated once per point.
+        If no hazard function was specified, the integral is computed exactly.
+
+        Arguments:
+            t_0 {numpy.array} -- The time since infection at the start of the increment, one entry per node
+            t_1 {numpy.array} -- The time since infection at the end of the increment, one entry per node
+            infection_periods {numpy.array} -- The length of the infectious period of each node, hazard is not emitted after this time
+
+        Keyword Arguments:
+            parameters {dict} -- Per-node arrays of parameters that are passed to the hazard function as keyword arguments (default: {None})
+            quadrature_points {int} -- The number of Gauss-Legendre points used per panel (default: {16})
+            tolerance {float} -- The largest accepted difference between the two estimates of a panel, relative to the integral if it is larger than 1 (default: {1.49e-8})
+            max_depth {int} -- The largest number of times a panel is halved (default: {50})
+
+        Returns:
+            numpy.array -- The hazard emitted by each node during the increment
+        """
+        lower = np.maximum(np.asarray(t_0, dtype = float), 0)
+        upper = np.minimum(np.asarray(t_1, dtype = float), np.asarray(infection_periods, dtype = float))
+        width = np.maximum(upper - lower, 0)
+
+        if self.hazard_function is None:
+            return width
+
+        points, weights = np.polynomial.legendre.leggauss(quadrature_points)
+        coarse_points, coarse_weights = gauss_lobatto(max(quadrature_points // 2 - 1, 3) | 1)
+        all_points = np.concatenate([points, coarse_points])
+
+        if parameters is not None:
+            parameters = {name: np.asarray(value) for name, value in parameters.items()}
+
+        integral = np.zeros(len(width))
+        nodes = np.flatnonzero(width > 0)
+        start, length = lower[nodes], width[nodes]
+        for depth in range(max_depth + 1):
+            t = start[:, None] + length[:, None] * (all_points[None, :] + 1) / 2
+            panel_parameters = None
+            if parameters is not None:
+                panel_parameters = {name: value if value.ndim == 0 else value[nodes][:, None] if value.ndim == 1 else value[nodes]
+                                    for name, value in parameters.items()}
+            values = self.evaluate_hazards(t, panel_parameters)
+
+            # The weighted sums are taken one quadrature point at a time, rather than with a matrix product, so that the hazard of each node
+            # does not depend on which other nodes are in the same call
+            fine = np.zeros(len(nodes))
+            for point, weight in enumerate(weights):
+                fine += values[:, point] * weight
+            coarse = np.zeros(len(nodes))
+            for point, weight in enumerate(coarse_weights):
+                coarse += values[:, len(weights) + point] * weight
+            fine = fine * length / 2
+            coarse = coarse * length / 2
+
+            accepted = np.abs(fine - coarse) <= tolerance * np.maximum(np.abs(fine), 1)
+            if depth == max_depth:
+                accepted[:] = True
+            np.add.at(integral, nodes[accepted], fine[accepted])
+            if accepted.all():
+                break
+
+            # The panels that were not accepted are split in half
+            nodes, start, length = nodes[~accepted], start[~accepted], length[~accepted] / 2
+            nodes = np.repeat(nodes, 2)
+            start = np.stack([start, start + length], axis = 1).ravel()
+            length = np.repeat(length, 2)
+        return integral
+
+
+
+class infection_frontier:
+    """Keeps track of the infectious nodes that have at least one susceptible neighbour, which are the only nodes that can emit hazard onto the susceptible population.
+
+    Nodes are referred to by their integer index in the order of G.nodes(). The frontier is updated incrementally whenever a node changes infection stage,
+    so that it never has to be recomputed by scanning the whole network.
+
+    If the network is a csr_graph, then its arrays are used as the adjacency without building a set for every node, and the network cannot change."""
+
+    def __init__(self, G, node_index, infectious_stages = (infection_stage.INFECTED,)):
+        """Builds the adjacency sets of the network. The frontier is empty until rebuild is called.
+        
+        Arguments:
+            G {NetworkX graph, csr_graph} -- The network the epidemic is spreading on
+            node_index {dict} -- A dictionary mapping node keys to their integer index
+        
+        Keyword Arguments:
+            infectious_stages {tuple} -- The codes of the stages that emit hazard (default: {(infection_stage.INFECTED,)})
+        """
+        self.node_index = node_index
+        self.infectious_stages = frozenset(int(code) for code in infectious_stages)
+        self.neighbours = None
+        self.csr_cache = None
+        self.read_network(G)
+        self.susceptible = set()
+        self.infected = set()
+        self.frontier = set()
+        self.susceptible_neighbour_count = np.zeros(len(node_index), dtype = int)
+
+    def read_network(self, G):
+        """Reads the adjacency sets from the network.
+        
+        Arguments:
+            G {NetworkX graph, csr_graph} -- The network the epidemic is spreading on
+        """
+        if isinstance(G, csr_graph):
+            self.neighbours = G
+            self.csr_cache = (G.indptr, G.indices)
+            return
+        # The adjacency sets are only built for NetworkX graphs
+        if not isinstance(self.neighbours, list):
+            self.neighbours = [set() for _ in self.node_index]
+        for node, neighbours in G.adjacency():
+            self.neighbours[self.node_index[node]] = {self.node_index[neighbour] for neighbour in neighbours if neighbour != node}
+        self.csr_cache = None
+
+    def to_csr(self):
+        """Returns the adjacency in compressed sparse row form. The arrays are cached until the network next changes.
+        
+        Returns:
+            tuple -- (indptr, indices), the neighbours of node i are indices[indptr[i]:indptr[i + 1]] in ascending order
+        """
+        if self.csr_cache is None:
+            degrees = np.fromiter((len(neighbours) for neighbours in self.neighbours), dtype = np.int64, count = len(self.neighbours))
+            indptr = np.zeros(len(self.neighbours) + 1, dtype = np.int64)
+            np.cumsum(degrees, out = indptr[1:])
+            indices = np.fromiter((neighbour for neighbours in self.neighbours for neighbour in sorted(neighbours)), dtype = np.int64, count = indptr[-1])
+            self.csr_cache = (indptr, indices)
+        return self.csr_cache
+
+    def rebuild(self, stages):
+        """Recomputes the frontier and susceptible neighbour counts from scratch.
+        
+        Arguments:
+            stages {numpy.array} -- The infection stage code of every node, in index order
+        """
+        stages = np.asarray(stages)
+        susceptible = stages == infection_stage.SUSCEPTIBLE
+        self.susceptible = set(np.flatnonzero(susceptible).tolist())
+        self.infected = set(np.flatnonzero(np.isin(stages, list(self.infectious_stages))).tolist())
+        # The susceptible neighbours of every node are counted from the CSR adjacency in one pass
+        indptr, indices = self.to_csr()
+        susceptible_before = np.concatenate([[0], np.cumsum(susceptible[indices])])
+        self.susceptible_neighbour_count[:] = susceptible_before[indptr[1:]] - susceptible_before[indptr[:-1]]
+        self.frontier = {index for index in self.infected if self.susceptible_neighbour_count[index] > 0}
+
+    def stage_changed(self, index, old_stage, new_stage):
+        """Updates the frontier after a node changes infection stage. Only the node and its neighbours are visited.
+        
+        Arguments:
+            index {int} -- The index of the node
+            old_stage {int} -- The code of the infection stage the node has left
+            new_stage {int} -- The code of the infection stage the node has entered
+        """
+        if old_stage == new_stage:
+            return
+
+        if old_stage == infection_stage.SUSCEPTIBLE:
+            self.susceptible.discard(index)
+            for neighbour in self.neighbours[index]:
+                self.susceptible_neighbour_count[neighbour] -= 1
+                if self.susceptible_neighbour_count[neighbour] == 0:
+                    self.frontier.discard(neighbour)
+        elif old_stage in self.infectious_stages:
+            self.infected.discard(index)
+            self.frontier.discard(index)
+
+        if new_stage == infection_stage.SUSCEPTIBLE:
+            self.susceptible.add(index)
+            for neighbour in self.neighbours[index]:
+                self.susceptible_neighbour_count[neighbour] += 1
+                if neighbour in self.infected:
+                    self.frontier.add(neighbour)
+        elif new_stage in self.infectious_stages:
+            self.infected.add(index)
+            if self.susceptible_neighbour_count[index] > 0:
+                self.frontier.add(index)
+
+    def add_edge(self, i, j):
+        """Adds an edge to the adjacency sets and updates the frontier
+        
+        Arguments:
+            i {int} -- The index of the first node
+            j {int} -- The index of the second node
+        """
+        if isinstance(self.neighbours, csr_graph):
+            raise ValueError("The network is a csr_graph, which cannot change.")
+        if i == j or j in self.neighbours[i]:
+            return
+        self.neighbours[i].add(j)
+        self.neighbours[j].add(i)
+        self.csr_cache = None
+        for a, b in ((i, j), (j, i)):
+            if b in self.susceptible:
+                self.susceptible_neighbour_count[a] += 1
+                if a in self.infected:
+                    self.frontier.add(a)
+
+    def remove_edge(self, i, j):
+        """Removes an edge from the adjacency sets and updates the frontier
+        
+        Arguments:
+            i {int} -- The index of the first node
+            j {int} -- The index of the second node
+        """
+        if isinstance(self.neighbours, csr_graph):
+            raise ValueError("The network is a csr_graph, which cannot change.")
+        if j not in self.neighbours[i]:
+            return
+        self.neighbours[i].discard(j)
+        self.neighbours[j].discard(i)
+        self.csr_cache = None
+        for a, b in ((i, j), (j, i)):
+            if b in self.susceptible:
+                self.susceptible_neighbour_count[a] -= 1
+                if self.susceptible_neighbour_count[a] == 0:
+                    self.frontier.discard(a)
+
+    def apply_changes(self, delta):
+        """Patches the adjacency sets and the frontier with the edge changes of a dynamic network increment
+        
+        Arguments:
+            delta {network_delta} -- An object with edges_removed and edges_added lists of (u, v) node key tuples
+        """
+        for u, v in delta.edges_removed:
+            self.remove_edge(self.node_index[u], self.node_index[v])
+        for u, v in delta.edges_added:
+            self.add_edge(self.node_index[u], self.node_index[v])
+
+    def neighbour_rows(self, index):
+        """Returns the neighbours of several nodes at once, from the CSR adjacency if it is cached, otherwise from the adjacency sets
+
+        Arguments:
+            index {numpy.array} -- The indexes of the nodes
+
+        Returns:
+            tuple -- (lengths, neighbours), the neighbours of every node in ascending order, concatenated in the order of index
+        """
+        if self.csr_cache is not None:
+            indptr, indices = self.csr_cache
+            starts = indptr[index]
+            lengths = indptr[index + 1] - starts
+            row_starts = np.cumsum(lengths) - lengths
+            return lengths, indices[np.repeat(starts - row_starts, lengths) + np.arange(lengths.sum())]
+        rows = [sorted(self.neighbours[node]) for node in index.tolist()]
+        lengths = np.fromiter((len(row) for row in rows), dtype = np.int64, count = len(rows))
+        return lengths, np.fromiter((neighbour for row in rows for neighbour in row), dtype = np.int64, count = lengths.sum())
+
+    def susceptible_neighbours(self, index):
+        """Returns the susceptible neighbours of a node
+        
+        Arguments:
+            index {int} -- The index of the node
+        
+        Returns:
+            set -- The indexes of the susceptible neighbours
+        """
+        neighbours = self.neighbours[index]
+        if isinstance(neighbours, set):
+            return neighbours & self.susceptible
+        return {neighbour for neighbour in neighbours.tolist() if neighbour in self.susceptible}
+
+
+class block_counter:
+    """Keeps count of the number of susceptible, infected and recovered nodes in every block of a SBM.
+
+    The counts are updated on every infection stage change and every migration, so that per-block statistics never require a scan over the nodes."""
+
+    # The codes of the counted stages are also their columns, other stages are not counted
+    counted_stages = (infection_stage.SUSCEPTIBLE, infection_stage.INFECTED, infection_stage.RECOVERED)
+
+    def __init__(self, node_blocks):
+        """Initialises the counter with every node outside of the counted stages. Call rebuild to count the nodes.
+        
+        Arguments:
+            node_blocks {list} -- The block of every node, in index order
+        """
+        self.node_block = np.array(node_blocks, dtype = int)
+        self.counts = np.zeros((self.node_block.max(initial = -1) + 1, 3), dtype = int)
+        self.node_column = np.full(len(self.node_block), -1, dtype = int)
+
+    @property
+    def number_of_blocks(self):
+        return self.counts.shape[0]
+
+    def add_blocks(self, block):
+        """Makes sure that there is a row of counts for the specified block
+        
+        Arguments:
+            block {int} -- The block label
+        """
+        if block >= self.number_of_blocks:
+            self.counts = np.vstack([self.counts, np.zeros((block + 1 - self.number_of_blocks, 3), dtype = int)])
+
+    def rebuild(self, stages, node_blocks = None):
+        """Recounts the nodes in every block from scratch.
+        
+        Arguments:
+            stages {numpy.array} -- The infection stage code of every node, in index order
+        
+        Keyword Arguments:
+            node_blocks {list} -- The block of every node, if it has changed (default: {None})
+        """
+        if node_blocks is not None:
+            self.node_block = np.array(node_blocks, dtype = int)
+            self.add_blocks(self.node_block.max(initial = -1))
+        stages = np.asarray(stages, dtype = int)
+        self.node_column = np.where(np.isin(stages, self.counted_stages), stages, -1)
+        counted = self.node_column >= 0
+        self.counts[:] = 0
+        np.add.at(self.counts, (self.node_block[counted], self.node_column[counted]), 1)
+
+    def stage_changed(self, index, old_stage, new_stage):
+        """Moves a node between the columns of its block
+        
+        Arguments:
+            index {int} -- The index of the node
+            old_stage {int} -- The code of the infection stage the node has left
+            new_stage {int} -- The code of the infection stage the node has entered
+        """
+        block = self.node_block[index]
+        if self.node_column[index] >= 0:
+            self.counts[block, self.node_column[index]] -= 1
+        self.node_column[index] = new_stage if new_stage in self.counted_stages else -1
+        if self.node_column[index] >= 0:
+            self.counts[block, self.node_column[index]] += 1
+
+    def node_migrated(self, index, new_block):
+        """Moves a node between blocks
+        
+        Arguments:
+            index {int} -- The index of the node
+            new_block {int} -- The block the node has joined
+        """
+        self.add_blocks(new_block)
+        column = self.node_column[index]
+        if column >= 0:
+            self.counts[self.node_block[index], column] -= 1
+            self.counts[new_block, column] += 1
+        self.node_block[index] = new_block
 
 
 class complex_epidemic_simulation(epidemic_data):
     """This class manages the simulation of the epidemic and dynamic network behavior."""
 
     def __init__(self, G, beta, infection_period_parameters, initial_infected, time_increment, max_iterations, hazard_rate=None,
-                 infection_period_distribution=None, SIS = False, increment_network = None, custom_behaviour = None):
+                 infection_period_distribution=None, SIS = False, increment_network = None, custom_behaviour = None,
+                 block_beta = None, hazard_parameters = None, random_state = None, compartments = None, writer = None, output_chunk_size = 256):
         """This class manages the simulation of the epidemic and the simulation of the dynamic network (if the network is dynamic).
         If the network is static, then
         
         Arguments:
             G {Networkx.graph} -- A NetworkX graph object
-            beta {float} -- The thinning parameter 
+            beta {float, dict, list} -- The thinning parameter. Either a single value, a dictionary keyed by node or a list in the order of G.nodes() to give every node its own infectivity
             infection_period_parameters {list} -- A list of parameters for the infection period distribution
             initial_infected {int, list} -- [description]
             time_increment {float} -- The length of the time step of the simulation
@@ -75,8 +495,17 @@ class complex_epidemic_simulation(epidemic_data):
             hazard_rate {function} -- A function of the form f(x) (default: f(x) = 1)
             infection_period_distribution {function} -- A numpy random number distribution (default: {None})
             SIS {bool} -- Boolean on whether the epidemic is SIS, if not it will be treated as SIR (default: False)
-            increment_network {method} -- A method of the form increment_network(increment_length). This method will be called during the simulation to move the network forward by the network_increment.
-            custom_behaviour {function} -- Allows users to execute custom behaviour during the simulation. This is useful for customising the simulation to your own purposes, such as treatment scenarios. (default: {None})
+            increment_network {method} -- A method of the form increment_network(increment_length). This method will be called during the simulation to move the network forward by the network_increment. If it returns the edge changes (an object with edges_added and edges_removed lists), these are used to patch the frontier, otherwise the whole network is read again.
+            custom_behaviour {function} -- Allows users to execute custom behaviour during the simulation. This is useful for customising the simulation to your own purposes, such as treatment scenarios. Interventions that only need the nodes affected by an event should use on_infection, on_recovery, on_migration, on_stage_entry or at_time instead. (default: {None})
+            block_beta {dict, list} -- Multiplies the infectivity of a node by block_beta[block], where block is the "block" attribute of the node in G. Used to vary infectivity between the blocks of a SBM (default: {None})
+            hazard_parameters {dict} -- Per-node parameters of the hazard rate, of the form {name: values}. The values are passed to hazard_rate(t, **parameters) for every infected node in one call (default: {None})
+            random_state {int, numpy.random.SeedSequence, numpy.random.Generator} -- Seeds the random number streams of the pre-generated data. If not specified, the global numpy.random functions are used (default: {None})
+            compartments {compartment_model} -- The compartments that infected nodes pass through, such as compartment_model.SEIR(). Replaces the SIS switch (default: {SIR, or SIS if SIS is True})
+            writer {background_writer} -- If specified, the S/I/R counts and the infection stage events are handed to the writer in chunks while the simulation runs, and flushed to disk when iterate_epidemic finishes (default: {None})
+            output_chunk_size {int} -- The number of iterations in each chunk handed to the writer (default: {256})
+
+        Raises:
+            ValueError: Raised if SIS is not a boolean
 
         TODO: Remove the beta parameter, too confusing
         """
@@ -91,14 +520,252 @@ class complex_epidemic_simulation(epidemic_data):
         self.SIS = SIS
         self.increment_network = increment_network
         self.custom_behaviour = custom_behaviour
+        self.interventions = intervention_schedule()
+        self.writer = writer
+        self.output_chunk_size = output_chunk_size
+
+        if compartments is None:
+            if SIS not in (True, False):
+                raise ValueError("SIS parameter not set to true or false.")
+            compartments = compartment_model.SIS() if SIS else compartment_model.SIR()
+        compartments.check_model()
+        self.compartments = compartments
 
-        self.time = 0
         self.N = nx.number_of_nodes(self.G)
         self.data_structure = epidemic_data(
-            G, initial_infected, 100, infection_period_distribution, infection_period_parameters)
+            G, initial_infected, 100, infection_period_distribution, infection_period_parameters, random_state = random_state, compartments = compartments)
         self.epi_data = self.data_structure.epi_data
         self.hazard = hazard_class(self.hazard_rate)
 
+        # Per-node quantities are stored in arrays, in the order of G.nodes(), so that the hazards can be computed in bulk
+        self.node_keys = self.data_structure.node_keys
+        self.node_index = self.data_structure.node_index
+        self.node_beta = self.per_node_array(beta)
+        self.block_beta = block_beta
+        if hazard_parameters is None:
+            hazard_parameters = {}
+        self.hazard_parameters = {name: self.per_node_array(values) for name, values in hazard_parameters.items()}
+
+        # The transitions between compartments are looked up by stage code, so that every compartment is handled by the same scan
+        stages = self.data_structure.stages
+        self.entry_code = stages.code(compartments.entry_stage)
+        self.compartment_codes = np.array([stages.code(stage) for stage in compartments.compartments], dtype = np.int8)
+        next_codes = [stages.code(compartment["Next Stage"]) for compartment in compartments.compartments.values()]
+        self.next_stage_code = np.full(len(stages), -1, dtype = np.int8)
+        self.next_stage_code[self.compartment_codes] = next_codes
+        self.stage_infectivity = np.zeros(len(stages))
+        self.stage_infectivity[self.compartment_codes] = [compartment["Infectivity"] for compartment in compartments.compartments.values()]
+
+        # The frontier is kept up to date by the data structure whenever an infection stage changes
+        self.frontier = infection_frontier(self.G, self.node_index, np.flatnonzero(self.stage_infectivity > 0))
+        self.frontier.rebuild(self.data_structure.stage_code)
+        self.data_structure.add_stage_change_listener(self.frontier.stage_changed)
+
+        # If the nodes belong to blocks of a SBM, then the S/I/R counts of each block are kept up to date in the same way
+        if all("block" in data for _, data in self.G.nodes(data = True)):
+            self.block_counts = block_counter([self.G.nodes[node]["block"] for node in self.node_keys])
+            self.block_counts.rebuild(self.data_structure.stage_code)
+            self.data_structure.add_stage_change_listener(self.block_counts.stage_changed)
+        else:
+            self.block_counts = None
+            if block_beta is not None:
+                raise ValueError("block_beta was specified, but not every node in G has a block attribute.")
+        if block_beta is not None:
+            self.block_beta = self.per_block_array(block_beta)
+
+    def update_infection_stage(self, node_list, new_stage, timepoint):
+        """Updates the infection stage of the nodes through the data structure, so that the frontier is kept up to date.
+        
+        Arguments:
+            node_list {list} -- list of node dictionary keys, the specified nodes will be updated
+            new_stage {str} -- The new infection stage the nodes will be updated to
+            timepoint {float, int} -- The time at which the change occurs
+        """
+        self.data_structure.update_infection_stage(node_list, new_stage, timepoint)
+
+    def update_exposure_level(self, node, exposure_increment):
+        """Increases a nodes exposure level through the data structure
+        
+        Arguments:
+            node {int, tuple} -- The dictionary key of the node who is receiving the exposure
+            exposure_increment {int, float} -- The amount that the nodes exposure level will be increased by
+        """
+        self.data_structure.update_exposure_level(node, exposure_increment)
+
+    def reset(self, seed = None, redraw = True):
+        """Prepares the simulation for a new replicate, reusing the allocated data structure, frontier and block counts.
+
+        Only the pre-generated data is redrawn and the initial infection chosen again. This is much cheaper than creating a new simulation.
+        The network itself is not reset, if it is dynamic then it should be reset separately.
+        
+        Keyword Arguments:
+            seed {int, numpy.random.SeedSequence} -- If specified, new random number streams are created from the seed, as if the simulation was created with random_state = seed (default: {None})
+            redraw {bool} -- If False, the pre-generated resistances and infection periods and the initial infected nodes are kept, so that the same epidemic can be re-run with different parameters (default: {True})
+        """
+        self.time = 0
+        self.interventions.reset()
+        self.data_structure.reset(seed, redraw)
+        if self.increment_network != None:
+            self.frontier.read_network(self.G)
+        self.frontier.rebuild(self.data_structure.stage_code)
+        if self.block_counts is not None:
+            self.block_counts.rebuild(self.data_structure.stage_code, [self.G.nodes[node]["block"] for node in self.node_keys])
+
+    def set_parameters(self, beta = None, block_beta = None, hazard_rate = None, hazard_parameters = None):
+        """Changes the parameters of the epidemic without rebuilding the simulation. Parameters that are not specified are left unchanged.
+        
+        Keyword Arguments:
+            beta {float, dict, list} -- The thinning parameter of every node (default: {None})
+            block_beta {dict, list} -- The infectivity multiplier of every block (default: {None})
+            hazard_rate {function} -- The hazard rate function (default: {None})
+            hazard_parameters {dict} -- Per-node parameters of the hazard rate, of the form {name: values} (default: {None})
+        """
+        if beta is not None:
+            self.beta = beta
+            self.node_beta = self.per_node_array(beta)
+        if block_beta is not None:
+            self.block_beta = self.per_block_array(block_beta)
+        if hazard_rate is not None:
+            self.hazard_rate = hazard_rate
+            self.hazard = hazard_class(hazard_rate)
+        if hazard_parameters is not None:
+            self.hazard_parameters = {name: self.per_node_array(values) for name, values in hazard_parameters.items()}
+
+    def on_infection(self, intervention):
+        """Calls the intervention after every step in which nodes were infected
+        
+        Arguments:
+            intervention {function} -- A function of the form f(simulation, nodes), where nodes are the dictionary keys of the newly infected nodes
+        """
+        self.interventions.subscribe("infection", intervention)
+
+    def on_recovery(self, intervention):
+        """Calls the intervention after every step in which nodes reached the end of their infection, either recovering or becoming susceptible again
+        
+        Arguments:
+            intervention {function} -- A function of the form f(simulation, nodes)
+        """
+        self.interventions.subscribe("recovery", intervention)
+
+    def on_migration(self, intervention):
+        """Calls the intervention after every step in which nodes migrated between the blocks of a dynamic network. Only migrations reported by increment_network are delivered.
+        
+        Arguments:
+            intervention {function} -- A function of the form f(simulation, migrations), where migrations is a list of (node, old block, new block) tuples
+        """
+        self.interventions.subscribe("migration", intervention)
+
+    def on_stage_entry(self, stage, intervention):
+        """Calls the intervention after every step in which nodes entered the stage through the compartment model, for example "Exposed" or "Treated"
+        
+        Arguments:
+            stage {str, infection_stage} -- The infection stage
+            intervention {function} -- A function of the form f(simulation, nodes)
+        """
+        self.interventions.subscribe(("stage", self.data_structure.stages.code(stage)), intervention)
+
+    def on_step(self, intervention):
+        """Calls the intervention at the end of every step, after the events of the step have been delivered
+        
+        Arguments:
+            intervention {function} -- A function of the form f(simulation)
+        """
+        self.interventions.every_step(intervention)
+
+    def at_time(self, time, intervention):
+        """Calls the intervention once, before the first step that starts at or after the time
+        
+        Arguments:
+            time {float} -- The time of the intervention
+            intervention {function} -- A function of the form f(simulation)
+        """
+        self.interventions.at_time(time, intervention)
+
+    def per_node_array(self, values):
+        """Converts a per-node quantity into an array in the order of G.nodes()
+
+        Arguments:
+            values {float, dict, list} -- Either a single value shared by every node, a dictionary keyed by node or a list in the order of G.nodes()
+
+        Raises:
+            ValueError: Raises an error if a list does not have one entry per node
+
+        Returns:
+            numpy.array -- The array of values
+        """
+        if isinstance(values, dict):
+            return np.array([values[node] for node in self.node_index], dtype = float)
+        values = np.asarray(values, dtype = float)
+        if values.ndim == 0:
+            return np.full(self.N, float(values))
+        if values.shape != (self.N,):
+            raise ValueError(f"Expected one value per node ({self.N}), received an array of shape {values.shape}.")
+        return values
+
+    def per_block_array(self, values):
+        """Converts a per-block quantity into an array indexed by block label
+
+        Arguments:
+            values {dict, list} -- Either a dictionary keyed by block label or a list in the order of the block labels
+
+        Raises:
+            ValueError: Raises an error if a block of the network has no value
+
+        Returns:
+            numpy.array -- The array of values
+        """
+        if isinstance(values, dict):
+            array = np.full(max(values) + 1, np.nan)
+            array[list(values)] = list(values.values())
+        else:
+            array = np.asarray(values, dtype = float)
+        blocks = np.unique(self.block_counts.node_block)
+        if blocks.max(initial = -1) >= len(array) or np.isnan(array[blocks]).any():
+            raise ValueError(f"Expected a value for every block of the network {blocks.tolist()}, received {values}.")
+        return array
+
+    def infectivity(self, index):
+        """Returns the thinning parameter of each of the specified nodes, including the block multiplier if block_beta was specified.
+
+        Arguments:
+            index {numpy.array} -- The indexes of the nodes
+
+        Returns:
+            numpy.array -- The infectivity of each node
+        """
+        node_beta = self.node_beta[index]
+        if self.block_beta is not None:
+            node_beta = node_beta * self.block_beta[self.block_counts.node_block[index]]
+        return node_beta
+
+    def emitted_hazards(self, index):
+        """Computes the hazard emitted during the next time increment by each of the specified infectious nodes, in one vectorised call.
+
+        The hazard rate is a function of the time since the node entered its current stage, and stops at the end of the stage.
+
+        Arguments:
+            index {numpy.array} -- The indexes of the infectious nodes
+
+        Returns:
+            numpy.array -- The hazard emitted by each node
+        """
+        index = np.asarray(index, dtype = int)
+        time_since_infected = self.time - self.data_structure.infection_stage_started[index]
+        infection_periods = self.data_structure.stage_durations(index)
+        parameters = {name: values[index] for name, values in self.hazard_parameters.items()}
+
+        hazards = self.hazard.increment_hazards(time_since_infected, time_since_infected + self.time_increment, infection_periods, parameters)
+        return self.infectivity(index) * self.stage_infectivity[self.data_structure.stage_code[index]] * hazards
+
+    @property
+    def time(self):
+        """The time of the epidemic. It is kept by the data structure, so that stages written through epi_data are entered at the current time"""
+        return self.data_structure.time
+
+    @time.setter
+    def time(self, value):
+        self.data_structure.time = value
+
     @property
     def infected_nodes(self):
         """Returns a list of dictionary keys for the nodes who are currently infected.
@@ -106,7 +773,7 @@ class complex_epidemic_simulation(epidemic_data):
         Returns:
             [list] -- List of infected nodes
         """
-        return [nodes for nodes in self.data_structure.epi_data if self.data_structure.epi_data[nodes]["Infection Stage"] == "Infected"]
+        return self.data_structure.nodes_in_stage(infection_stage.INFECTED)
 
     @property
     def susceptible_nodes(self):
@@ -115,7 +782,7 @@ class complex_epidemic_simulation(epidemic_data):
         Returns:
             [list] -- List of susceptible nodes
         """
-        return [nodes for nodes in self.epi_data if self.epi_data[nodes]["Infection Stage"] == "Susceptible"]
+        return self.data_structure.nodes_in_stage(infection_stage.SUSCEPTIBLE)
 
     @property
     def infectious_periods(self):
@@ -127,7 +794,7 @@ class complex_epidemic_simulation(epidemic_data):
             [list] -- A list of infectious periods
         """
         # There's a function that generates the infection periods as it is shared between several class objects
-        return [self.epi_data[node]["Infection Period"] for node in self.epi_data]
+        return list(self.data_structure.infection_period)
 
     @property
     def recovered_nodes(self):
@@ -136,7 +803,7 @@ class complex_epidemic_simulation(epidemic_data):
         Returns:
             [list] -- List of recovered nodes
         """
-        return [nodes for nodes in self.epi_data if self.epi_data[nodes]["Infection Stage"] == "Recovered"]
+        return self.data_structure.nodes_in_stage(infection_stage.RECOVERED)
 
     @property
     def exposure_level(self):
@@ -145,50 +812,50 @@ class complex_epidemic_simulation(epidemic_data):
         Returns:
             [list] -- A list of node exposure levels
         """
-        return [self.epi_data[node]["Exposure Level"] for node in self.epi_data]
+        return list(self.data_structure.exposure_level)
 
     def updates_exposure_levels(self):
-        """Loops over all infected nodes and updates the exposure levels of connected susceptible nodes.
-        """
-
-        for node in self.infected_nodes:
+        """Adds the hazard emitted by the infected nodes on the frontier (those with at least one susceptible neighbour) to the exposure levels of their susceptible neighbours.
 
-            infection_started = self.epi_data[node]["Infection Stage Started"]
-            end_of_infection = infection_started +\
-                self.epi_data[node]["Infection Period"]
-            time_since_infected = self.time - infection_started
-            emitted_hazard = self.beta * self.hazard.increment_hazard(
-                time_since_infected, time_since_infected + self.time_increment, end_of_infection)
-
-            connected_susceptibles = list(
-                set(self.G.neighbors(node)) & set(self.susceptible_nodes))
+        The frontier is visited in ascending order, with the neighbours of each node in ascending order, and np.add.at adds the hazards one at a time,
+        so every exposure level is accumulated in ascending order of the emitting nodes.
+        """
+        frontier = np.array(sorted(self.frontier.frontier), dtype = np.int64)
+        if len(frontier) == 0:
+            return
 
-            for exposed_node in connected_susceptibles:
-                self.data_structure.update_exposure_level(
-                    exposed_node, emitted_hazard)
+        emitted_hazards = self.emitted_hazards(frontier)
+        lengths, neighbours = self.frontier.neighbour_rows(frontier)
+        hazards = np.repeat(emitted_hazards, lengths)
+        data = self.data_structure
+        exposed = data.stage_code[neighbours] == infection_stage.SUSCEPTIBLE
+        np.add.at(data.exposure_level, neighbours[exposed], hazards[exposed])
 
     def determine_new_infections(self):
         """Compares a nodes exposure level to it's resistance and determines which nodes have been infected during this step of the iteration.
         """
-        self.new_infections = [susceptible for susceptible in self.susceptible_nodes if (
-            self.epi_data[susceptible]["Resistance"] < self.epi_data[susceptible]["Exposure Level"])]
-        self.update_infection_stage(self.new_infections, "Infected", self.time)
+        data = self.data_structure
+        exposed = np.flatnonzero((data.stage_code == infection_stage.SUSCEPTIBLE) & (data.resistance < data.exposure_level))
+        self.new_infections = [self.node_keys[index] for index in exposed]
+        self.update_infection_stage(self.new_infections, self.entry_code, self.time)
+        self.interventions.publish(("stage", self.entry_code), self.new_infections)
+        self.interventions.publish("infection", self.new_infections)
 
     def determine_recoveries(self):
-        """For nodes whose infections have ended, this method updates to the appropriate status.
-        
-        Raises:
-            ValueError: Raises an error if the SIS is not a boolean
+        """For nodes whose time in their current compartment has ended, this method updates them to the next stage of the compartment model.
+
+        Every compartment is checked in the same scan over the nodes, the nodes that have left a compartment are then grouped by their next stage.
         """
-        recoveries = [infected for infected in self.infected_nodes
-                    if self.epi_data[infected]["Infection Stage Started"] + self.epi_data[infected]["Infection Period"] < self.time]
+        data = self.data_structure
+        ended = np.flatnonzero(np.isin(data.stage_code, self.compartment_codes) & (data.infection_stage_started + data.stage_durations() < self.time))
+        next_codes = self.next_stage_code[data.stage_code[ended]]
 
-        if self.SIS == False: 
-            self.update_infection_stage(recoveries, "Recovered", self.time)
-        elif self.SIS == True:
-            self.update_infection_stage(recoveries, "Susceptible", self.time)
-        else:
-            raise ValueError("SIS parameter not set to true or false.")
+        for next_code in np.unique(next_codes):
+            nodes = [self.node_keys[index] for index in ended[next_codes == next_code]]
+            self.update_infection_stage(nodes, int(next_code), self.time)
+            self.interventions.publish(("stage", int(next_code)), nodes)
+            if next_code not in self.compartment_codes:
+                self.interventions.publish("recovery", nodes)
 
     def perform_iteration(self):
         """Executes one step of the simulation in the following order:
@@ -196,12 +863,29 @@ class complex_epidemic_simulation(epidemic_data):
         2) Determine which infections have ended
         3) Update node exposure levels
         4) Determine new infection
-        5) Perform custom behaviour
+        5) Perform custom behaviour and deliver the events of the step to the interventions
+
+        Interventions scheduled with at_time are run before step 1.
         """
+        self.interventions.run_scheduled(self)
         
         #Computation Steps
         if self.increment_network != None:
-            self.increment_network(self.time_increment)
+            delta = self.increment_network(self.time_increment)
+            if delta is not None:
+                self.frontier.apply_changes(delta)
+                migrations = getattr(delta, "migrations", [])
+                if self.block_counts is not None:
+                    for node, _, new_block in migrations:
+                        self.block_counts.node_migrated(self.node_index[node], new_block)
+                self.interventions.publish("migration", migrations)
+            else:
+                # We do not know what has changed, so the adjacency, frontier and blocks are read again
+                self.frontier.read_network(self.G)
+                stages = self.data_structure.stage_code
+                self.frontier.rebuild(stages)
+                if self.block_counts is not None:
+                    self.block_counts.rebuild(stages, [self.G.nodes[node]["block"] for node in self.node_keys])
         self.determine_recoveries()
         self.updates_exposure_levels()
         self.determine_new_infections()
@@ -211,26 +895,89 @@ class complex_epidemic_simulation(epidemic_data):
 
         if self.custom_behaviour != None:
             self.custom_behaviour(self)
+        self.interventions.deliver(self)
 
 
         #Recording data from here onwards
-        self.data_time.append(self.time)
-
-        self.data_susceptible_counts.append(len(self.susceptible_nodes))
-        self.data_infected_counts.append(len(self.infected_nodes))
-        self.data_recovered_counts.append(len(self.recovered_nodes))
+        self.record_iteration()
 
-        self.data_susceptible_nodes.append(self.susceptible_nodes)
-        self.data_infected_nodes.append(self.infected_nodes)
-        self.data_recovered_nodes.append(self.recovered_nodes)
+        if self.writer is not None and len(self.result) - self.rows_written >= self.output_chunk_size:
+            self.write_output()
 
-        if self.infected_nodes == []:
+        if self.result.stage_counts[-1, self.compartment_codes].sum() == 0:
             self.epidemic_ended = True
 
         if self.iteration == self.max_iterations:
             self.max_iterations_reached = True
 
 
+    def active_nodes(self):
+        """Returns the number of nodes in a compartment, the epidemic has ended when there are none
+        """
+        return int(np.count_nonzero(np.isin(self.data_structure.stage_code, self.compartment_codes)))
+
+    def record_iteration(self):
+        """Appends the time, the number of nodes in every stage, the length of the event log and the S/I/R counts of each block to the result.
+        """
+        block_counts = None if self.block_counts is None else self.block_counts.counts
+        self.result.append(self.time, self.data_structure.stage_counts(), len(self.data_structure.events), block_counts)
+
+    def write_output(self):
+        """Hands the iterations and infection stage events recorded since the last chunk to the writer. The writer compresses and writes them on its own thread.
+        """
+        rows = slice(self.rows_written, len(self.result))
+        events = self.data_structure.events
+        columns = dict(time = self.result.time[rows],
+                       susceptible = self.result.counts("Susceptible")[rows],
+                       infected = self.result.counts("Infected")[rows],
+                       recovered = self.result.counts("Recovered")[rows],
+                       event_node = events.node[self.events_written:len(events)],
+                       event_stage = events.stage[self.events_written:len(events)],
+                       event_time = events.time[self.events_written:len(events)])
+        if self.result.block_counts is not None:
+            columns["block_counts"] = self.result.block_counts[rows]
+        self.writer.write_chunk(**columns)
+        self.rows_written = len(self.result)
+        self.events_written = len(events)
+
+    @property
+    def data_time(self):
+        return self.result.time.tolist()
+
+    @property
+    def data_susceptible_counts(self):
+        return self.result.counts("Susceptible").tolist()
+
+    @property
+    def data_infected_counts(self):
+        return self.result.counts("Infected").tolist()
+
+    @property
+    def data_recovered_counts(self):
+        return self.result.counts("Recovered").tolist()
+
+    @property
+    def data_susceptible_nodes(self):
+        return self.result.nodes_in_stage("Susceptible")
+
+    @property
+    def data_infected_nodes(self):
+        return self.result.nodes_in_stage("Infected")
+
+    @property
+    def data_recovered_nodes(self):
+        return self.result.nodes_in_stage("Recovered")
+
+    @property
+    def data_compartment_counts(self):
+        """The number of nodes in each of the compartments other than "Infected", such as "Exposed", of the form {stage: [counts]}"""
+        return {stage: self.result.counts(stage).tolist() for stage in self.compartments.pre_generated_stages}
+
+    @property
+    def data_block_counts(self):
+        """The S/I/R counts of each block at every iteration, an array of shape (iterations, blocks, 3), or None if the nodes do not have blocks"""
+        return self.result.block_counts
+
     def iterate_epidemic(self):
         """Performs iterations of the simulation until either there is epidemic die out, or the maximum number of iterations is reached.
         """
@@ -240,26 +987,40 @@ class complex_epidemic_simulation(epidemic_data):
 
         #variables for controlling the iteration
         
+        # The infection stages may have been edited directly since the simulation was created
+        stages = self.data_structure.stage_code
+        self.frontier.rebuild(stages)
+        if self.block_counts is not None:
+            self.block_counts.rebuild(stages)
+
         self.iteration = 0
         self.epidemic_ended = False
         self.max_iterations_reached = False
 
-                #Data for the results
-        self.data_time = [0]
-        self.data_susceptible_counts = [len(self.susceptible_nodes)]
-        self.data_infected_counts = [len(self.infected_nodes)]
-        self.data_recovered_counts = [len(self.recovered_nodes)]
+        # The results are recorded into the contiguous arrays of an epidemic_result, one row per iteration
+        number_of_blocks = None if self.block_counts is None else self.block_counts.number_of_blocks
+        self.result = epidemic_result(self.node_keys, self.data_structure.stages.labels, self.data_structure.events,
+                                      capacity = min(self.max_iterations + 1, 1024), number_of_blocks = number_of_blocks)
+        self.record_iteration()
 
-        self.data_susceptible_nodes = [self.susceptible_nodes]
-        self.data_infected_nodes = [self.infected_nodes]
-        self.data_recovered_nodes = [self.recovered_nodes]
+        # The rows and events that have already been handed to the writer
+        self.rows_written = 0
+        self.events_written = 0
 
         while (self.epidemic_ended == False) and (self.max_iterations_reached == False):
             self.perform_iteration()
 
-        self.final_size = len(self.recovered_nodes)
+        self.final_size = self.data_structure.count_nodes(infection_stage.RECOVERED)
+
+        # Guarantee that the whole trajectory is on disk before returning
+        if self.writer is not None:
+            if self.rows_written < len(self.result):
+                self.write_output()
+            self.writer.flush()
 
         if self.epidemic_ended == True:
             self.stop_reason = f"The epidemic died out at time = {self.time} ({self.iteration} iterations)"
         else:
             self.stop_reason = f"The simulation stopped because the max number of iteration was reached (max = {self.iteration} iterations)."
+        self.result.finish(self.data_structure.events, self.final_size, self.stop_reason)
+        return self.result
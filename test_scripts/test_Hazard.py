@@ -4,7 +4,7 @@ import networkx as nx
 import numpy as np
 import numpy.random as npr
 from NetworkEpidemicSimulation.Simulation import hazard_class
-from pytest import approx
+from pytest import approx, raises
 
 def test_hazard_increment():
     """We test the hazard increment works with a simple function, x^2 between the values of 2 and 3.
@@ -47,4 +47,77 @@ def test_hazard_integral():
 
     def my_hazard(t): return 4*t
     my_hazard = hazard_class(hazard_function = my_hazard)
-    assert my_hazard.increment_hazard(0,10,10) == 200
\ No newline at end of file
+    assert my_hazard.increment_hazard(0,10,10) == 200
+
+def test_increment_hazards_matches_scalar_integration():
+    '''The vectorised integrator should agree with the scalar integrator for every node'''
+    def my_hazard_fn(t): return t**2
+    my_hazard = hazard_class(hazard_function = my_hazard_fn)
+    t_0 = np.array([0, 1, 2.5])
+    t_1 = t_0 + 1
+    periods = np.array([10, 1.5, 2])
+    out = my_hazard.increment_hazards(t_0, t_1, periods)
+    expected = [my_hazard.increment_hazard(t_0[i], t_1[i], periods[i]) for i in range(3)]
+    assert out == approx(expected)
+    # The last node is no longer infectious during the increment
+    assert out[2] == 0
+
+
+def test_increment_hazards_default_hazard():
+    '''With no hazard function the integral is the length of the increment that overlaps the infectious period'''
+    my_hazard = hazard_class(hazard_function = None)
+    out = my_hazard.increment_hazards(np.array([-0.5, 0, 4.9]), np.array([0.5, 1, 5.9]), np.array([5, 5, 5]))
+    assert out == approx([0.5, 1, 0.1])
+
+
+def test_increment_hazards_per_node_parameters():
+    '''Per-node parameters are passed to the hazard function as keyword arguments'''
+    def my_hazard_fn(t, scale): return scale * t
+    my_hazard = hazard_class(hazard_function = my_hazard_fn)
+    out = my_hazard.increment_hazards(np.zeros(2), np.full(2, 10), np.full(2, 10), parameters = {"scale": np.array([1, 4])})
+    assert out == approx([50, 200])
+
+
+def test_increment_hazards_scalar_only_function():
+    '''Hazard functions that cannot take arrays are still supported'''
+    def my_hazard_fn(t):
+        if t < 1:
+            return 4
+        return 0
+    my_hazard = hazard_class(hazard_function = my_hazard_fn)
+    out = my_hazard.increment_hazards(np.zeros(2), np.full(2, 2), np.array([10, 0.5]))
+    assert out == approx([4, 2])
+    assert my_hazard.vectorised is False
+    assert hazard_class(my_hazard_fn, vectorised = False).evaluate_hazards(np.array([0.5, 2])) == approx([4, 0])
+
+
+def test_evaluate_hazards_raises_errors_of_the_hazard_function():
+    '''Errors that are not caused by passing an array are raised, rather than retried one timepoint at a time'''
+    my_hazard = hazard_class(hazard_function = lambda t, scale: scale * np.exp(-t))
+    with raises(TypeError):
+        my_hazard.evaluate_hazards(np.linspace(0, 1, 5), {"shape": np.ones(5)})
+    assert my_hazard.vectorised is None
+    assert my_hazard.evaluate_hazards(np.zeros(3), {"scale": np.arange(3)}) == approx([0, 1, 2])
+    assert my_hazard.vectorised is True
+
+    def broken_hazard(t):
+        if np.any(t > 1):
+            raise ValueError("broken")
+        return np.ones(np.shape(t))
+    my_hazard = hazard_class(hazard_function = broken_hazard)
+    assert my_hazard.evaluate_hazards(np.zeros(3)) == approx([1, 1, 1])
+    with raises(ValueError):
+        my_hazard.evaluate_hazards(np.array([0, 2]))
+
+
+def test_increment_hazards_discontinuous():
+    '''Discontinuous hazard functions are integrated accurately, wherever the discontinuity is'''
+    def vectorised_step(t): return np.where(t < 0.37, 1.0, 0.0)
+    def scalar_step(t):
+        if t < 0.37:
+            return 1
+        return 0
+    for hazard_function in (vectorised_step, scalar_step):
+        my_hazard = hazard_class(hazard_function = hazard_function)
+        out = my_hazard.increment_hazards(np.array([0, 0.2, 0.5]), np.array([1, 0.3, 2]), np.array([10, 10, 10]))
+        assert out == approx([0.37, 0.1, 0], abs = 1e-7)
@@ -3,6 +3,7 @@ import networkx as nx
 import numpy as np
 import numpy.random as npr
 from NetworkEpidemicSimulation.EpidemicSimulation import epidemic_data
+from pytest import approx, raises
 
 G_complete = nx.complete_graph(10)
 G_lattice = nx.grid_2d_graph(5, 5)
@@ -190,3 +191,66 @@ def test_data_pre_gen():
     assert len(test_infection_periods) == 100
 
     assert all([test_infection_periods[i] == 5 for i in range(100)]) == True
+
+
+def test_scipy_distribution():
+    import scipy.stats as st
+    my_data = epidemic_data(G_complete,
+                            initial_infected=[1],
+                            pre_gen_data=20,
+                            infection_period_distribution=st.uniform(loc=2, scale=1),
+                            random_state=1)
+    periods = my_data.pre_generated_infection_period
+    assert periods.shape == (10, 20)
+    assert ((periods >= 2) & (periods <= 3)).all()
+
+
+def test_generator_method_distribution():
+    my_data = epidemic_data(G_complete,
+                            initial_infected=[1],
+                            pre_gen_data=20,
+                            infection_period_distribution="gamma",
+                            infection_period_parameters=[2, 3],
+                            random_state=1)
+    assert my_data.pre_generated_infection_period.shape == (10, 20)
+    assert (my_data.pre_generated_infection_period > 0).all()
+
+
+def test_block_shapes():
+    from NetworkEpidemicSimulation.EpidemicSimulation import infection_period_handler
+    handler = infection_period_handler(5, "exponential", 2, npr.default_rng(1))
+    assert handler.generate().shape == (5,)
+    assert handler.generate((4, 3)).shape == (4, 3)
+
+
+def test_empirical_distribution():
+    from NetworkEpidemicSimulation.EpidemicSimulation import empirical_distribution
+    distribution = empirical_distribution([1, 2, 7], weights=[1, 0, 3])
+    draws = distribution.rvs(size=(100, 10), random_state=1)
+    assert draws.shape == (100, 10)
+    assert set(np.unique(draws)) == {1, 7}
+    assert 0.7 < (draws == 7).mean() < 0.8
+    assert list(distribution.ppf(np.array([0, 0.2, 0.3, 0.99]))) == [1, 1, 7, 7]
+
+
+def test_tabulated_distribution():
+    import scipy.stats as st
+    from NetworkEpidemicSimulation.EpidemicSimulation import empirical_distribution
+    distribution = empirical_distribution.from_distribution(st.gamma(2, scale=1.5))
+    assert distribution.ppf(0.5) == approx(st.gamma(2, scale=1.5).ppf(0.5), rel=1e-3)
+    my_data = epidemic_data(G_complete,
+                            initial_infected=[1],
+                            pre_gen_data=100,
+                            infection_period_distribution=distribution,
+                            random_state=2)
+    assert my_data.pre_generated_infection_period.mean() == approx(3, rel=0.1)
+
+
+def test_bad_parameters_raise():
+    with raises(ValueError):
+        epidemic_data(G_complete, initial_infected=[1], pre_gen_data=10, infection_period_parameters=[1, 2])
+    with raises(ValueError):
+        epidemic_data(G_complete, initial_infected=[1], pre_gen_data=10, infection_period_distribution="not_a_distribution")
+    with raises(ValueError):
+        epidemic_data(G_complete, initial_infected=[1], pre_gen_data=10,
+                      infection_period_distribution=npr.normal, infection_period_parameters=[0, 1])
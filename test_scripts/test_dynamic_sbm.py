@@ -1,5 +1,5 @@
 #Test dynamic_sbm
-from NetworkEpidemicSimulation.DynamicNetworks import dynamic_stochastic_block_model
+from NetworkEpidemicSimulation.DynamicNetworks import dynamic_stochastic_block_model, compact_stochastic_block_model
 
 sizes = [100, 100, 100]
 probs = [[0.4, 0.001, 0.001],[0.001, 0.4, 0.001], [0.001, 0.001, 0.4]]
@@ -102,3 +102,122 @@ def test_increment_network():
     # We perform the migration event for node 201, it will be moving to block 0, and should be connected to nodes 0:100
     # It possible that the node could be migrated twice but really unlikely
     assert list(test_class.G.neighbors(201)) == list(range(100))
+
+def test_increment_network_edge_changes():
+    # The returned edge changes should be exactly the difference between the networks before and after the increment
+    test_class = dynamic_stochastic_block_model(sizes, probs, migration, 1, time_until)
+    edges_before = {frozenset(edge) for edge in test_class.G.edges()}
+
+    delta = test_class.increment_network(1)
+    edges_after = {frozenset(edge) for edge in test_class.G.edges()}
+
+    assert {frozenset(edge) for edge in delta.edges_added} == edges_after - edges_before
+    assert {frozenset(edge) for edge in delta.edges_removed} == edges_before - edges_after
+
+def test_network_delta_ignores_reverted_changes():
+    from NetworkEpidemicSimulation.DynamicNetworks import network_delta
+    delta = network_delta()
+    delta.record(1, 2, True, False)
+    delta.record(2, 1, False, True)
+    delta.record(3, 4, False, True)
+    assert delta.edges_removed == []
+    assert delta.edges_added == [(3, 4)]
+
+def test_random_state_reproducible():
+    first_class = dynamic_stochastic_block_model(sizes, probs, migration, exp_par, time_until, random_state = 2)
+    second_class = dynamic_stochastic_block_model(sizes, probs, migration, exp_par, time_until, random_state = 2)
+    assert sorted(first_class.G.edges()) == sorted(second_class.G.edges())
+    assert first_class.get_next_migration_times() == second_class.get_next_migration_times()
+
+    first_class.increment_network(5)
+    second_class.increment_network(5)
+    assert sorted(first_class.G.edges()) == sorted(second_class.G.edges())
+
+
+def test_csr_stochastic_block_model():
+    """The CSR sampler produces simple symmetric graphs, with the expected number of edges in every pair of blocks"""
+    import numpy as np
+    from NetworkEpidemicSimulation.CompactNetworks import csr_graph
+    test_sizes = [300, 400]
+    test_probs = [[0.05, 0.01], [0.01, 0.8]]
+    graph = csr_graph.stochastic_block_model(test_sizes, test_probs, random_state=1)
+    sources = np.repeat(np.arange(700), np.diff(graph.indptr))
+    assert all(np.all(np.diff(graph[node]) > 0) for node in range(700))
+    assert not np.any(sources == graph.indices)
+    assert sorted(zip(sources, graph.indices)) == sorted(zip(graph.indices, sources))
+
+    counts = np.zeros((2, 2))
+    np.add.at(counts, (graph.blocks[sources], graph.blocks[graph.indices]), 1)
+    pairs = np.array([[300 * 299 / 2, 300 * 400], [300 * 400, 400 * 399 / 2]])
+    expected = pairs * np.array(test_probs)
+    observed = counts / np.array([[2, 1], [1, 2]])
+    assert np.all(np.abs(observed - expected) < 5 * np.sqrt(expected) + 1)
+
+    repeated = csr_graph.stochastic_block_model(test_sizes, test_probs, random_state=1)
+    assert np.array_equal(repeated.indices, graph.indices)
+
+
+def test_compact_membership_schedules():
+    """The schedules start in the initial block at time 0, and end with the first migration after the end time"""
+    import numpy as np
+    from NetworkEpidemicSimulation.DynamicNetworks import compact_stochastic_block_model
+    model = compact_stochastic_block_model(sizes, probs, migration, exp_par, time_until, random_state=4)
+    for node in (0, 150, 299):
+        blocks = model.get_node_memberships(node)
+        times = model.get_node_migration_times(node)
+        assert blocks[0] == model.graph.blocks[node] and times[0] == 0
+        assert np.all(np.diff(times) > 0)
+        assert times[-1] > time_until and times[-2] < time_until
+        assert np.all(blocks[1:] != blocks[:-1])
+    assert np.array_equal(model.get_next_migration_times(), model.membership_times[model.membership_indptr[:-1] + 1])
+
+
+def test_compact_to_dynamic():
+    """The compact model can be turned into a dynamic SBM that is incremented as usual"""
+    model = compact_stochastic_block_model(sizes, probs, migration, exp_par, time_until, random_state=5)
+    network = model.to_dynamic()
+    assert network.G.number_of_edges() == model.graph.number_of_edges()
+    assert network.get_node_memberships(7) == model.get_node_memberships(7).tolist()
+    assert network.get_node_next_migration_time(7) == model.get_next_migration_times()[7]
+    delta = network.increment_network(20)
+    assert delta.migrations != []
+    for node, _, new_block in delta.migrations:
+        assert network.get_node_current_block(node) in model.get_node_memberships(node)
+
+
+def test_migration_sampler_frequencies():
+    """Both sampling methods draw destinations with the probabilities of the migration matrix, and never draw an impossible destination"""
+    import numpy as np
+    from pytest import approx
+    from NetworkEpidemicSimulation.DynamicNetworks import migration_sampler
+    m = [[0, 0.2, 0.8, 0], [0.25, 0.25, 0.25, 0.25], [0, 0, 0, 1], [0.1, 0, 0.6, 0.3]]
+    rows = np.repeat(np.arange(4), 20000)
+    for method in ("alias", "searchsorted"):
+        destinations = migration_sampler(m, method).sample(rows, np.random.default_rng(3))
+        for row in range(4):
+            frequencies = np.bincount(destinations[rows == row], minlength=4) / 20000
+            assert frequencies == approx(m[row], abs=0.015)
+            assert np.all(frequencies[np.array(m[row]) == 0] == 0)
+    assert migration_sampler(migration).sample(2, np.random.default_rng(1)) in (0, 1)
+
+
+def test_migration_sampler_invalid():
+    """The rows of the migration matrix must be probability distributions"""
+    from pytest import raises
+    from NetworkEpidemicSimulation.DynamicNetworks import migration_sampler
+    with raises(ValueError):
+        migration_sampler([[0.5, 0.4], [0.5, 0.5]])
+    with raises(ValueError):
+        migration_sampler([[1.5, -0.5], [0.5, 0.5]])
+    with raises(ValueError):
+        migration_sampler(migration, "multinomial")
+
+
+def test_migration_matrix_update():
+    """Setting a new migration matrix recomputes the sampling tables"""
+    network = dynamic_stochastic_block_model(sizes, probs, migration, exp_par, time_until, random_state=2, migration_sampling="searchsorted")
+    network.m = [[0, 1, 0], [0, 0, 1], [1, 0, 0]]
+    assert network.migration_sampler.method == "searchsorted"
+    memberships = network.generate_migration_times(0)
+    blocks = [block for block, _ in memberships]
+    assert all(new == (old + 1) % 3 for old, new in zip(blocks, blocks[1:]))
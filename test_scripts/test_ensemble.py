@@ -0,0 +1,121 @@
+# Testing script for the ensembles of replicate simulations
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.Ensemble import welford_estimator, quantile_sketch, adaptive_ensemble
+from NetworkEpidemicSimulation.HomogenousEpidemic import SIR_Selke
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+from pytest import approx, raises
+
+
+def test_welford_matches_numpy():
+    """The running mean and variance should match numpy, including after merging estimators"""
+    values = np.random.default_rng(1).normal(3, 2, 1000)
+    first, second = welford_estimator(), welford_estimator()
+    for value in values[:400]:
+        first.update(value)
+    for value in values[400:]:
+        second.update(value)
+    first.merge(second)
+    assert first.count == 1000
+    assert first.mean == approx(values.mean())
+    assert first.variance == approx(values.var(ddof=1))
+
+
+def test_quantile_sketch():
+    """The P-squared sketch should estimate quantiles of a large stream closely"""
+    values = np.random.default_rng(2).exponential(1, 20000)
+    sketches = [quantile_sketch(quantile) for quantile in (0.1, 0.5, 0.9)]
+    for value in values:
+        for sketch in sketches:
+            sketch.update(value)
+    for sketch in sketches:
+        assert sketch.value == approx(np.quantile(values, sketch.quantile), rel=0.05)
+
+
+def test_adaptive_ensemble_stops_early():
+    """The ensemble should stop once the target width is reached, well before max_replicates"""
+    ensemble = adaptive_ensemble(lambda seed: SIR_Selke(100, 0.02, 1, 5, random_state=seed).compute_final_size(),
+                                 target_width=10, statistics=["final size"], max_replicates=5000, seed=1)
+    summary = ensemble.run()["final size"]
+    assert summary["converged"]
+    assert 10 <= summary["replicates"] < 5000
+    lower, upper = summary["confidence interval"]
+    assert upper - lower <= 10
+    assert summary["quantiles"][0.05] <= summary["quantiles"][0.5] <= summary["quantiles"][0.95]
+
+    # The same seed gives the same replicates
+    repeated = adaptive_ensemble(lambda seed: SIR_Selke(100, 0.02, 1, 5, random_state=seed).compute_final_size(),
+                                 target_width=10, statistics=["final size"], max_replicates=5000, seed=1).run()["final size"]
+    assert repeated["mean"] == summary["mean"]
+
+
+def test_adaptive_ensemble_network():
+    """Network replicates report both the final size and the peak"""
+    simulation = complex_epidemic_simulation(nx.grid_2d_graph(6, 6), beta=1, infection_period_parameters=1, initial_infected=3,
+                                             time_increment=0.1, max_iterations=200)
+
+    def replicate(seed):
+        simulation.reset(seed)
+        return simulation.iterate_epidemic()
+
+    summary = adaptive_ensemble(replicate, target_width=0.01, max_replicates=25, batch_size=10, seed=3).run()
+    assert summary["final size"]["replicates"] == 25
+    assert not summary["final size"]["converged"]
+    assert summary["peak"]["mean"] >= 3
+
+
+def test_parameter_sweep_common_random_numbers():
+    """With common random numbers, the final size of every replicate never decreases as beta increases"""
+    from NetworkEpidemicSimulation.Ensemble import parameter_sweep
+    sweep = parameter_sweep(nx.grid_2d_graph(6, 6), [{"beta": beta} for beta in (0.2, 0.5, 1, 2)], 6,
+                            infection_period_parameters=1, initial_infected=2, time_increment=0.1, max_iterations=300)
+    assert sweep["final size"].shape == (4, 6)
+    assert (np.diff(sweep["final size"], axis=0) >= 0).all()
+    assert sweep["grid"][2] == {"beta": 1}
+
+
+def test_simulation_replicate_keeps_one_simulation():
+    """Each process only keeps the simulation of the latest replicate"""
+    from NetworkEpidemicSimulation.Ensemble import simulation_replicate, worker_simulations
+    parameters = dict(beta=1, infection_period_parameters=1, initial_infected=2, time_increment=0.1, max_iterations=100)
+    first = simulation_replicate(nx.grid_2d_graph(4, 4), **parameters)
+    second = simulation_replicate(nx.grid_2d_graph(5, 5), **parameters)
+    first(1)
+    first(2)
+    assert list(worker_simulations) == [first.key]
+    second(1)
+    assert list(worker_simulations) == [second.key]
+
+
+def test_parameter_sweep_points_are_independent():
+    """Every point of a grid with different keys gives the same statistics as the point swept on its own"""
+    from NetworkEpidemicSimulation.Ensemble import parameter_sweep
+    G = nx.stochastic_block_model([20, 20], [[0.3, 0.05], [0.05, 0.3]], seed=1)
+    grid = [{"beta": 0.05}, {"hazard_rate": lambda t: 2 * np.exp(-t)}, {"block_beta": [1, 3]}, {"beta": 0.5, "hazard_parameters": {}}]
+    parameters = dict(beta=1, infection_period_parameters=1, initial_infected=2, time_increment=0.1, max_iterations=300)
+    sweep = parameter_sweep(G, grid, 3, **parameters)
+    for point, grid_parameters in enumerate(grid):
+        alone = parameter_sweep(G, [grid_parameters], 3, **parameters)
+        assert (sweep["final size"][point] == alone["final size"][0]).all()
+        assert (sweep["peak"][point] == alone["peak"][0]).all()
+
+
+def test_parameter_sweep_errors():
+    from NetworkEpidemicSimulation.Ensemble import parameter_sweep
+    G = nx.grid_2d_graph(4, 4)
+    with raises(ValueError):
+        parameter_sweep(G, [{"beta": 1}, {"time_increment": 0.5}], 2, infection_period_parameters=1, initial_infected=2, time_increment=0.1)
+    with raises(ValueError):
+        parameter_sweep(G, [{"beta": 1}, {"block_beta": [1, 2]}], 2, infection_period_parameters=1, initial_infected=2, time_increment=0.1)
+
+
+def test_reset_without_redraw():
+    """Resetting without redrawing re-runs exactly the same epidemic"""
+    simulation = complex_epidemic_simulation(nx.grid_2d_graph(6, 6), beta=1, infection_period_parameters=1, initial_infected=3,
+                                             time_increment=0.1, max_iterations=200, random_state=2)
+    first = simulation.iterate_epidemic()
+    resistance = simulation.data_structure.pre_generated_resistance.copy()
+    simulation.reset(redraw=False)
+    second = simulation.iterate_epidemic()
+    assert (simulation.data_structure.pre_generated_resistance == resistance).all()
+    assert (first.counts("Infected") == second.counts("Infected")).all()
@@ -116,3 +116,96 @@ def test_resistances_not_same_element():
 
 
 
+
+def test_reset_reuses_columns():
+    """Resetting the data structure should redraw the pre-generated data in the existing arrays and re-initialise the infection
+    """
+    G_test = nx.complete_graph(10)
+    my_data = epidemic_data(G_test, initial_infected = 2, pre_gen_data = 100)
+    resistances = my_data.pre_generated_resistance
+    my_data.update_infection_stage([node for node in G_test if my_data.epi_data[node]["Infection Stage"] == "Susceptible"], "Infected", 5)
+
+    my_data.reset(seed = 1)
+    assert my_data.pre_generated_resistance is resistances
+    assert sum(stage == "Infected" for stage in my_data.infection_stage) == 2
+    assert all(my_data.times_infected <= 1)
+    infected = [node for node in G_test if my_data.epi_data[node]["Infection Stage"] == "Infected"]
+    assert all(my_data.epi_data[node]["History"]["Infection Stage Times"] == [0] for node in G_test)
+    first_draw = resistances.copy()
+
+    my_data.reset(seed = 1)
+    assert (my_data.pre_generated_resistance == first_draw).all()
+    assert [node for node in G_test if my_data.epi_data[node]["Infection Stage"] == "Infected"] == infected
+
+def test_node_record_custom_keys():
+    """Keys that are not part of the data structure can still be stored against a node
+    """
+    G_test = nx.complete_graph(3)
+    my_data = epidemic_data(G_test, initial_infected = [0], pre_gen_data = 10)
+    my_data.epi_data[1].update({"Treated": True, "Resistance": 5})
+    assert my_data.epi_data[1]["Treated"] == True
+    assert my_data.resistance[1] == 5
+    assert "Treated" not in my_data.epi_data[2]
+
+def test_random_streams_independent():
+    """The resistances should not depend on how many infection periods are drawn, as they come from different streams
+    """
+    G_test = nx.complete_graph(10)
+    my_data = epidemic_data(G_test, initial_infected = [0], pre_gen_data = 10, random_state = 7)
+    other_data = epidemic_data(G_test, initial_infected = [0], pre_gen_data = 10, random_state = 7,
+                               infection_period_distribution = npr.exponential, infection_period_parameters = 1)
+    assert (my_data.pre_generated_resistance == other_data.pre_generated_resistance).all()
+
+def test_event_log():
+    """The event log should grow as required and return the events of each node in order
+    """
+    from NetworkEpidemicSimulation.EpidemicSimulation import event_log
+    log = event_log(capacity = 2)
+    log.extend([0, 1, 2], "Susceptible", 0)
+    log.extend([1], "Infected", 1.5)
+    log.extend([1, 2], "Recovered", 3)
+    assert len(log) == 6
+    assert log.node.dtype == np.int64 and log.stage.dtype == np.int8 and log.time.dtype == np.float64
+
+    stages, times = log.node_events(1)
+    assert [log.stages.label(code) for code in stages] == ["Susceptible", "Infected", "Recovered"]
+    assert list(times) == [0, 1.5, 3]
+    assert log.history(0) == {"Node Created": 0, "Infection Stage Log": ["Susceptible"], "Infection Stage Times": [0]}
+
+    # Adding events after a query should be reflected in the next query
+    log.extend([0], "Infected", 4)
+    assert log.history(0)["Infection Stage Log"] == ["Susceptible", "Infected"]
+
+def test_history_in_event_log():
+    """The history of every node is kept in the one event log, and reset clears it
+    """
+    G_test = nx.complete_graph(10)
+    my_data = epidemic_data(G_test, initial_infected = [1], pre_gen_data = 100)
+    my_data.update_infection_stage([0, 2], "Infected", 10)
+    assert len(my_data.events) == 12
+    assert my_data.epi_data[2]["History"]["Infection Stage Log"] == ["Susceptible", "Infected"]
+    my_data.reset()
+    assert len(my_data.events) == 10
+
+def test_stage_codes():
+    """Infection stages are stored as int8 codes, the string labels are still used by the dictionary views
+    """
+    from NetworkEpidemicSimulation.EpidemicSimulation import infection_stage
+    G_test = nx.complete_graph(5)
+    my_data = epidemic_data(G_test, initial_infected = [0], pre_gen_data = 10)
+    assert my_data.stage_code.dtype == np.int8
+    assert list(my_data.stage_code) == [infection_stage.INFECTED] + [infection_stage.SUSCEPTIBLE] * 4
+    assert my_data.infection_stage == ["Infected"] + ["Susceptible"] * 4
+    assert my_data.count_nodes("Susceptible") == 4
+    assert my_data.nodes_in_stage(infection_stage.INFECTED) == [0]
+
+    # The built-in extra compartments and user-defined stages are handled the same way
+    my_data.update_infection_stage([1], infection_stage.EXPOSED, 1)
+    my_data.update_infection_stage([2, 3], "Quarantined", 2)
+    assert my_data.epi_data[1]["Infection Stage"] == "Exposed"
+    assert my_data.nodes_in_stage("Quarantined") == [2, 3]
+    assert my_data.stage_mask("Quarantined").sum() == 2
+    assert my_data.epi_data[3]["History"]["Infection Stage Log"] == ["Susceptible", "Quarantined"]
+
+    my_data.epi_data[4]["Infection Stage"] = "Recovered"
+    assert my_data.stage_code[4] == infection_stage.RECOVERED
@@ -0,0 +1,88 @@
+# Testing script for the executors that run ensembles and sweeps on several processes
+import os
+import threading
+import networkx as nx
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from NetworkEpidemicSimulation.Executors import local_executor, futures_executor, file_queue_executor, file_queue_worker, shared_reference, resolve_shared
+from NetworkEpidemicSimulation.Ensemble import parameter_sweep, simulation_replicate, adaptive_ensemble
+from pytest import raises
+
+simulation_parameters = dict(infection_period_parameters=1, initial_infected=2, time_increment=0.1, max_iterations=300)
+grid = [{"beta": beta} for beta in (0.3, 1, 3)]
+
+
+def shared_size(task):
+    return len(resolve_shared(shared_reference("network"))) * task
+
+
+def failing_task(task):
+    raise ValueError("task failed")
+
+
+def test_local_executor_shares_objects():
+    """Tasks resolve the objects shared with the pool"""
+    with local_executor(processes=2) as executor:
+        executor.share(network=nx.path_graph(5))
+        assert executor.map(shared_size, [1, 2, 3]) == [5, 10, 15]
+
+
+def test_futures_executor_shares_objects(tmp_path):
+    """The shared objects are loaded from shared storage by the workers of any concurrent.futures executor"""
+    with futures_executor(ThreadPoolExecutor(2), shared_directory=str(tmp_path)) as executor:
+        executor.share(network=nx.path_graph(4))
+        assert executor.map(shared_size, range(4)) == [0, 4, 8, 12]
+    assert not list(tmp_path.iterdir())
+
+
+def test_futures_executor_removes_temporary_directory():
+    """The temporary directory holding the shared objects is removed when the executor is closed"""
+    with futures_executor(ThreadPoolExecutor(2)) as executor:
+        executor.share(network=nx.path_graph(4))
+        executor.share(network=nx.path_graph(3))
+        assert executor.map(shared_size, [1]) == [3]
+        directory = executor.shared_directory
+        assert os.path.isdir(directory)
+    assert not os.path.exists(directory)
+
+
+def test_file_queue_sweep_matches_serial(tmp_path):
+    """A sweep run by several worker processes through a file queue gives the same results as a serial sweep"""
+    G = nx.grid_2d_graph(6, 6)
+    serial = parameter_sweep(G, grid, 4, **simulation_parameters)
+    with file_queue_executor(str(tmp_path), local_workers=3, timeout=60) as executor:
+        queued = parameter_sweep(G, grid, 4, executor=executor, **simulation_parameters)
+    assert (queued["final size"] == serial["final size"]).all()
+    assert (queued["peak"] == serial["peak"]).all()
+    assert os.listdir(os.path.join(str(tmp_path), "tasks")) == []
+    assert os.listdir(os.path.join(str(tmp_path), "results")) == []
+
+
+def test_file_queue_ensemble_matches_serial(tmp_path):
+    """Replicates reset a simulation built once per worker, without changing their results"""
+    with file_queue_executor(str(tmp_path), local_workers=2, timeout=60) as executor:
+        executor.share(network=nx.grid_2d_graph(5, 5))
+        replicate = simulation_replicate(shared_reference("network"), beta=1, **simulation_parameters)
+        queued = adaptive_ensemble(replicate, target_width=0.01, max_replicates=12, batch_size=6, seed=4, map_function=executor.map).run()
+        serial = adaptive_ensemble(simulation_replicate(nx.grid_2d_graph(5, 5), beta=1, **simulation_parameters),
+                                   target_width=0.01, max_replicates=12, batch_size=6, seed=4).run()
+    assert queued["final size"]["mean"] == serial["final size"]["mean"]
+    assert queued["peak"]["variance"] == serial["peak"]["variance"]
+
+
+def test_file_queue_errors(tmp_path):
+    """Exceptions raised by a task are raised again by map, and workers stop once the queue is closed"""
+    executor = file_queue_executor(str(tmp_path), timeout=5)
+    worker = threading.Thread(target=file_queue_worker, args=(str(tmp_path), 0.01))
+    worker.start()
+    with raises(ValueError):
+        executor.map(failing_task, [1])
+    executor.close()
+    worker.join(5)
+    assert not worker.is_alive()
+
+
+def test_file_queue_timeout(tmp_path):
+    """Without any workers, map gives up after the timeout"""
+    with raises(TimeoutError):
+        file_queue_executor(str(tmp_path), timeout=0.2).map(shared_size, [1])
@@ -0,0 +1,57 @@
+# Testing script for the trajectory engines of the homogeneous epidemic
+import numpy as np
+import networkx as nx
+from NetworkEpidemicSimulation.HomogenousEpidemic import SIR_gillespie
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+
+
+def check_counts(result, N):
+    counts = result.stage_counts[:, :3]
+    assert (counts.sum(axis=1) == N).all()
+    assert (np.diff(result.time) >= 0).all()
+    assert (np.diff(result.counts("Recovered")) >= 0).all()
+
+
+def test_exact_final_size_matches_sellke():
+    """The exact engine infects individuals in order of resistance, so its final size is given by the Sellke construction"""
+    simulation = SIR_gillespie(300, 0.005, 1, 3, random_state=2)
+    result = simulation.simulate()
+    check_counts(result, 300)
+
+    # The k-th resistance is reached iff it is less than the hazard of the first 3 + k infectives
+    pressure = simulation.beta * np.cumsum(simulation.inf_periods)[2:-1]
+    escaped = np.flatnonzero(simulation.resistances >= pressure)
+    expected = escaped[0] + 3 if escaped.size > 0 else 300
+    assert result.final_size == expected
+
+
+def test_hazard_rate_and_max_time():
+    """A time varying hazard rate is integrated in bulk, and the simulation stops at max_time"""
+    simulation = SIR_gillespie(200, 0.01, 2, 5, hazard_rate=lambda t: np.exp(-t), random_state=1)
+    result = simulation.simulate(max_time=1)
+    check_counts(result, 200)
+    assert result.time[-1] <= 1
+    assert "maximum time" in result.stop_reason or result.counts("Infected")[-1] == 0
+
+
+def test_tau_leap_matches_exact():
+    """For small steps, tau-leaping and the exact engine give similar mean final sizes"""
+    exact = SIR_gillespie(200, 0.01, 1, 5, random_state=4)
+    leaping = SIR_gillespie(200, 0.01, 1, 5, random_state=5)
+    exact_sizes = [exact.simulate().final_size for _ in range(40)]
+    leaping_sizes = [leaping.tau_leap(0.01).final_size for _ in range(40)]
+    check_counts(leaping.tau_leap(0.01), 200)
+    assert abs(np.mean(exact_sizes) - np.mean(leaping_sizes)) < 25
+
+
+def test_complete_graph_baseline():
+    """The network simulation on a complete graph and the exact engine have the same parameters"""
+    fixed_length = lambda length, n: np.full(n, length)
+    network_sizes = []
+    for seed in range(10):
+        network = complex_epidemic_simulation(nx.complete_graph(100), beta=0.02, infection_period_parameters=1, initial_infected=5,
+                                              infection_period_distribution=fixed_length, time_increment=0.05, max_iterations=1000, random_state=seed)
+        network_sizes.append(network.iterate_epidemic().final_size)
+    exact = SIR_gillespie(100, 0.02, 1, 5, infection_period_distribution=fixed_length, random_state=0)
+    exact_sizes = [exact.simulate().final_size for _ in range(10)]
+    assert abs(np.mean(network_sizes) - np.mean(exact_sizes)) < 20
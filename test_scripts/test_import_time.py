@@ -0,0 +1,24 @@
+# Testing script guarding the start-up time of the package
+import json
+import subprocess
+import sys
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import NetworkEpidemicSimulation.Simulation
+import NetworkEpidemicSimulation.HomogenousEpidemic
+import NetworkEpidemicSimulation.DynamicNetworks
+elapsed = time.perf_counter() - start
+heavy = [name for name in ("matplotlib.pyplot", "scipy.integrate", "pandas") if name in sys.modules]
+print(json.dumps({"elapsed": elapsed, "heavy": heavy}))
+"""
+
+
+def test_import_does_not_load_heavy_modules():
+    """Importing the simulations should not import matplotlib, scipy.integrate or pandas, and should be quick"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, text=True, check=True)
+    start_up = json.loads(output.stdout.strip().splitlines()[-1])
+    assert start_up["heavy"] == []
+    # A generous bound, so that the test only fails if something heavy is imported again
+    assert start_up["elapsed"] < 3
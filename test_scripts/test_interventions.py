@@ -0,0 +1,118 @@
+# Testing script for the interventions
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+from NetworkEpidemicSimulation.DynamicNetworks import dynamic_stochastic_block_model
+from NetworkEpidemicSimulation.Interventions import intervention_schedule, contact_tracing
+from pytest import raises
+
+
+def test_events_match_history():
+    """Every infection and recovery should be delivered exactly once, with the nodes it affected"""
+    infections = []
+    recoveries = []
+    my_epidemic = complex_epidemic_simulation(nx.grid_2d_graph(8, 8), beta=1, infection_period_parameters=1, initial_infected=3,
+                                              time_increment=0.1, max_iterations=500, random_state=2)
+    my_epidemic.on_infection(lambda simulation, nodes: infections.extend((simulation.time, node) for node in nodes))
+    my_epidemic.on_recovery(lambda simulation, nodes: recoveries.extend(nodes))
+    my_epidemic.iterate_epidemic()
+
+    assert len(infections) == my_epidemic.final_size - 3
+    assert sorted(recoveries) == sorted(my_epidemic.recovered_nodes)
+    for time, node in infections:
+        history = my_epidemic.epi_data[node]["History"]
+        assert history["Infection Stage Log"][1] == "Infected"
+        assert np.isclose(history["Infection Stage Times"][1] + my_epidemic.time_increment, time)
+
+
+def test_treatment_on_infection():
+    """An intervention can move the nodes it receives into another stage, which stops them from spreading the infection"""
+    def treat(simulation, nodes):
+        simulation.update_infection_stage(nodes, "Recovered", simulation.time)
+
+    my_epidemic = complex_epidemic_simulation(nx.complete_graph(50), beta=0.1, infection_period_parameters=10, initial_infected=[0],
+                                              time_increment=0.1, max_iterations=500, random_state=1)
+    my_epidemic.on_infection(treat)
+    my_epidemic.iterate_epidemic()
+    for node in my_epidemic.recovered_nodes:
+        if node != 0:
+            assert my_epidemic.epi_data[node]["History"]["Infection Stage Log"] == ["Susceptible", "Infected", "Recovered"]
+
+
+def test_at_time_and_reset():
+    """Scheduled interventions run once per replicate, before the first step starting at or after their time"""
+    times = []
+    my_epidemic = complex_epidemic_simulation(nx.complete_graph(20), beta=0.5, infection_period_parameters=5, initial_infected=[0],
+                                              time_increment=0.5, max_iterations=20, random_state=1)
+    my_epidemic.at_time(1.2, lambda simulation: times.append(simulation.time))
+    my_epidemic.at_time(0, lambda simulation: times.append(simulation.time))
+    my_epidemic.iterate_epidemic()
+    assert times == [0, 1.5]
+    my_epidemic.reset()
+    my_epidemic.iterate_epidemic()
+    assert times == [0, 1.5, 0, 1.5]
+
+
+def test_migration_events():
+    """Migrations reported by the dynamic network are delivered to the interventions"""
+    migrations = []
+    network = dynamic_stochastic_block_model([10, 10], [[0.3, 0.05], [0.05, 0.3]], [[0, 1], [1, 0]], 1, 100, random_state=4)
+    my_epidemic = complex_epidemic_simulation(network.G, beta=0.1, infection_period_parameters=2, initial_infected=2, time_increment=0.5,
+                                              max_iterations=10, SIS=True, increment_network=network.increment_network)
+    my_epidemic.on_migration(lambda simulation, events: migrations.extend(events))
+    my_epidemic.iterate_epidemic()
+    assert len(migrations) > 0
+    for node, old_block, new_block in migrations:
+        assert old_block != new_block
+
+
+def test_unknown_event():
+    with raises(ValueError):
+        intervention_schedule().subscribe("vaccination", print)
+
+
+def test_csr_adjacency():
+    """The CSR adjacency should match the network, and be rebuilt after the network changes"""
+    G_path = nx.path_graph(4)
+    my_epidemic = complex_epidemic_simulation(G_path, beta=1, infection_period_parameters=1, initial_infected=[0], time_increment=0.1, max_iterations=10)
+    indptr, indices = my_epidemic.frontier.to_csr()
+    assert list(indptr) == [0, 1, 3, 5, 6]
+    assert list(indices) == [1, 0, 2, 1, 3, 2]
+    assert my_epidemic.frontier.to_csr()[0] is indptr
+    my_epidemic.frontier.add_edge(0, 3)
+    assert list(my_epidemic.frontier.to_csr()[1]) == [1, 3, 0, 2, 1, 3, 0, 2]
+
+
+def test_trace_bounded_depth():
+    """Contacts should be found up to depth hops away, each at the smallest number of hops"""
+    my_epidemic = complex_epidemic_simulation(nx.path_graph(10), beta=1, infection_period_parameters=1, initial_infected=[0], time_increment=0.1, max_iterations=10)
+    tracing = contact_tracing(my_epidemic, depth=2)
+    traced, hops = tracing.trace([4, 5])
+    assert dict(zip(traced, hops)) == {3: 1, 6: 1, 2: 2, 7: 2}
+
+    tracing.tracing_probability = 0
+    traced, hops = tracing.trace([4])
+    assert len(traced) == 0
+
+
+def test_tracing_action_after_delay():
+    """The contacts of newly infected nodes are quarantined once the delay has passed"""
+    quarantined = []
+
+    def quarantine(simulation, nodes):
+        quarantined.append(simulation.time)
+        simulation.update_infection_stage([node for node in nodes if simulation.epi_data[node]["Infection Stage"] == "Susceptible"], "Quarantined", simulation.time)
+
+    my_epidemic = complex_epidemic_simulation(nx.grid_2d_graph(10, 10), beta=5, infection_period_parameters=2, initial_infected=[(0, 0)],
+                                              infection_period_distribution=lambda length, n: np.full(n, length), time_increment=0.1, max_iterations=500, random_state=3)
+    tracing = contact_tracing(my_epidemic, depth=2, tracing_probability=0.9, delay=0.5, action=quarantine, random_state=3)
+    my_epidemic.iterate_epidemic()
+
+    first_iteration = min(tracing.results)
+    index_cases, traced_nodes, hops = tracing.results[first_iteration]
+    assert len(traced_nodes) == len(hops) and set(hops) <= {1, 2}
+    assert np.isclose(quarantined[0], first_iteration * 0.1 + 0.5, atol=0.11)
+    assert my_epidemic.data_structure.count_nodes("Quarantined") > 0
+
+    my_epidemic.reset()
+    assert tracing.results == {} and tracing.queue == []
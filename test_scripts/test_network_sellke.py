@@ -3,6 +3,7 @@ import networkx as nx
 import numpy as np
 import numpy.random as npr
 from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+from pytest import approx, raises
 
 G_test = nx.complete_graph(200)
 
@@ -139,3 +140,250 @@ def test_complex_node_list_iteration_larger_network():
 #    my_epidemic.iterate_epidemic()
 #    assert my_epidemic.final_size > 4
 #    assert my_epidemic.time > 3
+
+
+def test_per_node_beta():
+    """Only nodes with a non-zero beta can infect their neighbours"""
+    G_path = nx.path_graph(3)
+    my_epidemic = complex_epidemic_simulation(G_path,
+                                              beta={0: 0, 1: 100, 2: 100},
+                                              infection_period_parameters=1,
+                                              initial_infected=[0],
+                                              time_increment=0.1,
+                                              max_iterations=1000)
+    my_epidemic.iterate_epidemic()
+    assert my_epidemic.final_size == 1
+
+
+def test_block_beta():
+    """Nodes in a block with zero infectivity do not emit hazard"""
+    G_sbm = nx.stochastic_block_model([5, 5], [[1, 0], [0, 1]])
+    my_epidemic = complex_epidemic_simulation(G_sbm,
+                                              beta=100,
+                                              block_beta=[1, 0],
+                                              infection_period_parameters=1,
+                                              infection_period_distribution=fixed_length,
+                                              initial_infected=[0, 5],
+                                              time_increment=0.1,
+                                              max_iterations=1000)
+    my_epidemic.iterate_epidemic()
+    assert sorted(my_epidemic.recovered_nodes) == [0, 1, 2, 3, 4, 5]
+
+
+def test_block_beta_dict():
+    """block_beta can be a dictionary keyed by block, and must have a value for every block"""
+    G_sbm = nx.stochastic_block_model([5, 5], [[1, 0], [0, 1]])
+    my_epidemic = complex_epidemic_simulation(G_sbm,
+                                              beta=100,
+                                              block_beta={1: 0, 0: 1},
+                                              infection_period_parameters=1,
+                                              infection_period_distribution=fixed_length,
+                                              initial_infected=[0, 5],
+                                              time_increment=0.1,
+                                              max_iterations=1000)
+    my_epidemic.iterate_epidemic()
+    assert sorted(my_epidemic.recovered_nodes) == [0, 1, 2, 3, 4, 5]
+
+    with raises(ValueError):
+        my_epidemic.set_parameters(block_beta={0: 1})
+
+
+def test_per_node_beta_wrong_length():
+    with raises(ValueError):
+        complex_epidemic_simulation(G_test,
+                                    beta=[1, 2],
+                                    infection_period_parameters=1,
+                                    initial_infected=[0],
+                                    time_increment=0.1,
+                                    max_iterations=10)
+
+
+def test_frontier_excludes_interior_nodes():
+    """An infected node whose neighbours are all infected should not be on the frontier"""
+    G_path = nx.path_graph(5)
+    my_epidemic = complex_epidemic_simulation(G_path,
+                                              beta=1,
+                                              infection_period_parameters=1,
+                                              initial_infected=[0, 1, 2],
+                                              time_increment=0.1,
+                                              max_iterations=10)
+    assert my_epidemic.frontier.frontier == {2}
+    assert list(my_epidemic.frontier.susceptible_neighbour_count) == [0, 0, 1, 1, 1]
+
+
+def test_frontier_updated_incrementally():
+    """The incrementally updated frontier should match a frontier rebuilt from scratch"""
+    G_lattice = nx.grid_2d_graph(6, 6)
+    my_epidemic = complex_epidemic_simulation(G_lattice,
+                                              beta=2,
+                                              infection_period_parameters=1,
+                                              initial_infected=3,
+                                              time_increment=0.1,
+                                              max_iterations=20,
+                                              SIS=True)
+    my_epidemic.iterate_epidemic()
+    my_epidemic.data_structure.update_infection_stage([(0, 0), (3, 3)], "Infected", my_epidemic.time)
+    frontier = set(my_epidemic.frontier.frontier)
+    counts = my_epidemic.frontier.susceptible_neighbour_count.copy()
+
+    my_epidemic.frontier.rebuild(my_epidemic.data_structure.stage_code)
+    assert frontier == my_epidemic.frontier.frontier
+    assert all(counts == my_epidemic.frontier.susceptible_neighbour_count)
+
+
+def test_frontier_patched_by_network_changes():
+    """On a dynamic network the frontier is patched using the edge changes, it should match a frontier rebuilt from the graph"""
+    from NetworkEpidemicSimulation.DynamicNetworks import dynamic_stochastic_block_model
+    from NetworkEpidemicSimulation.Simulation import infection_frontier
+    network = dynamic_stochastic_block_model([20, 20], [[0.3, 0.05], [0.05, 0.3]], [[0, 1], [1, 0]], 1, 100)
+    my_epidemic = complex_epidemic_simulation(network.G,
+                                              beta=0.5,
+                                              infection_period_parameters=2,
+                                              initial_infected=5,
+                                              time_increment=0.5,
+                                              max_iterations=10,
+                                              SIS=True,
+                                              increment_network=network.increment_network)
+    my_epidemic.iterate_epidemic()
+
+    rebuilt = infection_frontier(network.G, my_epidemic.node_index)
+    rebuilt.rebuild(my_epidemic.data_structure.stage_code)
+    assert rebuilt.neighbours == my_epidemic.frontier.neighbours
+    assert rebuilt.frontier == my_epidemic.frontier.frontier
+    assert all(rebuilt.susceptible_neighbour_count == my_epidemic.frontier.susceptible_neighbour_count)
+
+
+def test_block_counts_on_dynamic_sbm():
+    """The per-block counts should add up to the overall counts, and match the blocks of the nodes at the end of the simulation"""
+    from NetworkEpidemicSimulation.DynamicNetworks import dynamic_stochastic_block_model
+    network = dynamic_stochastic_block_model([20, 20, 20], [[0.3, 0.05, 0], [0.05, 0.3, 0.05], [0, 0.05, 0.3]],
+                                             [[0, 0.5, 0.5], [0.5, 0, 0.5], [0.5, 0.5, 0]], 1, 100)
+    my_epidemic = complex_epidemic_simulation(network.G,
+                                              beta=0.5,
+                                              infection_period_parameters=2,
+                                              initial_infected=5,
+                                              time_increment=0.5,
+                                              max_iterations=20,
+                                              increment_network=network.increment_network)
+    my_epidemic.iterate_epidemic()
+
+    block_counts = my_epidemic.data_block_counts
+    assert block_counts.shape == (len(my_epidemic.data_time), 3, 3)
+    assert list(block_counts[:, :, 0].sum(axis=1)) == my_epidemic.data_susceptible_counts
+    assert list(block_counts[:, :, 1].sum(axis=1)) == my_epidemic.data_infected_counts
+    assert list(block_counts[:, :, 2].sum(axis=1)) == my_epidemic.data_recovered_counts
+
+    for block in range(3):
+        block_nodes = [node for node in network.G.nodes() if network.G.nodes[node]["block"] == block]
+        assert block_counts[-1, block, 1] == len(set(block_nodes) & set(my_epidemic.infected_nodes))
+        assert block_counts[-1, block, 2] == len(set(block_nodes) & set(my_epidemic.recovered_nodes))
+
+
+def test_no_block_counts_without_blocks():
+    my_epidemic = complex_epidemic_simulation(nx.path_graph(3),
+                                              beta=1,
+                                              infection_period_parameters=1,
+                                              initial_infected=[0],
+                                              time_increment=0.1,
+                                              max_iterations=10)
+    my_epidemic.iterate_epidemic()
+    assert my_epidemic.data_block_counts is None
+
+
+def test_reset_matches_new_simulation():
+    """Resetting a simulation with a seed should give the same epidemic as a newly created simulation with the same seed"""
+    G_lattice = nx.grid_2d_graph(8, 8)
+    parameters = dict(beta=1, infection_period_parameters=1, initial_infected=3, time_increment=0.1, max_iterations=200)
+
+    fresh_epidemic = complex_epidemic_simulation(G_lattice, random_state=3, **parameters)
+    fresh_epidemic.iterate_epidemic()
+
+    my_epidemic = complex_epidemic_simulation(G_lattice, **parameters)
+    my_epidemic.iterate_epidemic()
+    my_epidemic.reset(seed=3)
+    assert my_epidemic.time == 0
+    my_epidemic.iterate_epidemic()
+
+    assert my_epidemic.data_infected_counts == fresh_epidemic.data_infected_counts
+    assert my_epidemic.recovered_nodes == fresh_epidemic.recovered_nodes
+
+
+def test_random_state_reproducible():
+    """Simulations created with the same random_state should be identical, and should not depend on the global numpy seed"""
+    G_lattice = nx.grid_2d_graph(8, 8)
+    parameters = dict(beta=1, infection_period_parameters=1, initial_infected=3, time_increment=0.1, max_iterations=200)
+
+    npr.seed(1)
+    first_epidemic = complex_epidemic_simulation(G_lattice, random_state=5, **parameters)
+    first_epidemic.iterate_epidemic()
+    npr.seed(2)
+    second_epidemic = complex_epidemic_simulation(G_lattice, random_state=np.random.SeedSequence(5), **parameters)
+    second_epidemic.iterate_epidemic()
+
+    assert first_epidemic.data_infected_counts == second_epidemic.data_infected_counts
+    assert (first_epidemic.data_structure.pre_generated_infection_period == second_epidemic.data_structure.pre_generated_infection_period).all()
+
+
+def test_SEIR_compartments():
+    """Newly infected nodes should spend their pre-generated latent period in the Exposed compartment, without emitting hazard"""
+    from NetworkEpidemicSimulation.EpidemicSimulation import compartment_model
+    G_path = nx.path_graph(3)
+    my_epidemic = complex_epidemic_simulation(G_path,
+                                              beta=100,
+                                              infection_period_parameters=1,
+                                              initial_infected=[0],
+                                              infection_period_distribution=fixed_length,
+                                              time_increment=0.1,
+                                              max_iterations=1000,
+                                              compartments=compartment_model.SEIR(fixed_length, 2),
+                                              random_state=1)
+    my_epidemic.iterate_epidemic()
+    history = my_epidemic.epi_data[1]["History"]
+    assert history["Infection Stage Log"] == ["Susceptible", "Exposed", "Infected", "Recovered"]
+    assert history["Infection Stage Times"][2] - history["Infection Stage Times"][1] == approx(5, abs=0.15)
+    assert my_epidemic.epi_data[2]["History"]["Infection Stage Log"] == ["Susceptible", "Exposed", "Infected", "Recovered"]
+
+    # The epidemic does not end while nodes are exposed, and the exposed nodes are counted
+    assert my_epidemic.final_size == 3
+    assert max(my_epidemic.data_compartment_counts["Exposed"]) == 1
+    assert len(my_epidemic.data_compartment_counts["Exposed"]) == len(my_epidemic.data_time)
+
+
+def test_custom_compartments():
+    """A compartment with reduced infectivity and a user-defined label is handled by the same engine"""
+    from NetworkEpidemicSimulation.EpidemicSimulation import compartment_model
+    model = (compartment_model()
+             .add_compartment("Infected", "Treated")
+             .add_compartment("Treated", "Recovered", fixed_length, 1, infectivity=0.5))
+    my_epidemic = complex_epidemic_simulation(nx.complete_graph(5),
+                                              beta=1,
+                                              infection_period_parameters=1,
+                                              initial_infected=[0],
+                                              time_increment=0.1,
+                                              max_iterations=1000,
+                                              compartments=model)
+    treated = my_epidemic.data_structure.stages.code("Treated")
+    assert treated in my_epidemic.frontier.infectious_stages
+    my_epidemic.update_infection_stage([0], "Treated", 0)
+    assert my_epidemic.data_structure.stage_duration[0] == 5
+    assert my_epidemic.emitted_hazards([0]) == approx(0.05)
+    my_epidemic.iterate_epidemic()
+    assert my_epidemic.final_size == my_epidemic.data_structure.count_nodes("Recovered")
+    assert my_epidemic.active_nodes() == 0
+
+    with raises(ValueError):
+        compartment_model().add_compartment("Infected", "Recovered", fixed_length, 1)
+    with raises(ValueError):
+        complex_epidemic_simulation(nx.complete_graph(5), 1, 1, [0], 0.1, 10, compartments=compartment_model("Exposed"))
+
+
+def test_epi_data_stage_write():
+    """Writing a stage through epi_data updates the frontier and the history, at the current time"""
+    my_epidemic = complex_epidemic_simulation(nx.path_graph(5), beta=1, infection_period_parameters=1, initial_infected=[3], time_increment=0.1, max_iterations=10)
+    my_epidemic.time = 0.5
+    my_epidemic.epi_data[0]["Infection Stage"] = "Infected"
+    assert my_epidemic.frontier.infected == {0, 3}
+    assert 0 in my_epidemic.frontier.frontier
+    assert my_epidemic.epi_data[0]["Infection Stage Started"] == 0.5
+    assert my_epidemic.epi_data[0]["History"]["Infection Stage Times"] == [0, 0.5]
+    assert my_epidemic.epi_data[0]["Infection Period"] > 0
@@ -0,0 +1,42 @@
+# Testing script for the background writer
+import os
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+from NetworkEpidemicSimulation.Output import background_writer
+from pytest import raises
+
+
+def test_chunks_written_in_order(tmp_path):
+    """Chunks should be written to their own files and read back in order"""
+    with background_writer(str(tmp_path), max_queued_chunks=1, compress=False) as writer:
+        for chunk in range(5):
+            values = np.arange(3) + 3 * chunk
+            writer.write_chunk(values=values)
+            values[:] = -1
+    assert writer.chunks_written == 5
+    assert list(background_writer.read(str(tmp_path))["values"]) == list(range(15))
+
+
+def test_writer_error_raised(tmp_path):
+    """An error on the background thread should be raised by the next flush"""
+    writer = background_writer(str(tmp_path / "output"))
+    os.rmdir(tmp_path / "output")
+    writer.write_chunk(values=np.arange(3))
+    with raises(IOError):
+        writer.flush()
+    writer.close()
+
+
+def test_simulation_output_flushed(tmp_path):
+    """The whole trajectory should be on disk when iterate_epidemic returns"""
+    writer = background_writer(str(tmp_path))
+    my_epidemic = complex_epidemic_simulation(nx.grid_2d_graph(8, 8), beta=1, infection_period_parameters=1, initial_infected=3,
+                                              time_increment=0.1, max_iterations=200, random_state=1, writer=writer, output_chunk_size=7)
+    my_epidemic.iterate_epidemic()
+    output = background_writer.read(str(tmp_path))
+    assert list(output["time"]) == my_epidemic.data_time
+    assert list(output["infected"]) == my_epidemic.data_infected_counts
+    assert len(output["event_node"]) == len(my_epidemic.data_structure.events)
+    assert list(output["event_time"]) == list(my_epidemic.data_structure.events.time[:len(my_epidemic.data_structure.events)])
+    writer.close()
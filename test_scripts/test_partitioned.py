@@ -0,0 +1,91 @@
+# Testing script for the simulation of one epidemic on several processes
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.EpidemicSimulation import compartment_model
+from NetworkEpidemicSimulation.Partitioned import partitioned_epidemic_simulation, partition_network, partition_worker
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+from pytest import raises
+
+
+def hazard(t, scale=1):
+    return scale * np.exp(-t)
+
+
+def assert_identical(serial, partitioned):
+    serial_result = serial.iterate_epidemic()
+    partitioned_result = partitioned.iterate_epidemic()
+    assert np.array_equal(serial_result.stage_counts, partitioned_result.stage_counts)
+    assert np.array_equal(serial_result.event_node, partitioned_result.event_node)
+    assert np.array_equal(serial_result.event_stage, partitioned_result.event_stage)
+    assert np.array_equal(serial_result.event_time, partitioned_result.event_time)
+    assert np.array_equal(serial.data_structure.exposure_level, partitioned.data_structure.exposure_level)
+    assert serial_result.final_size == partitioned_result.final_size
+    return serial_result, partitioned_result
+
+
+def test_partitioned_matches_serial():
+    """The partitioned simulation gives exactly the same epidemic as the serial simulation"""
+    parameters = dict(beta=0.4, infection_period_parameters=1, initial_infected=3, time_increment=0.1, max_iterations=400, random_state=7)
+    G = nx.grid_2d_graph(15, 15)
+    serial, _ = assert_identical(complex_epidemic_simulation(G, **parameters), partitioned_epidemic_simulation(G, number_of_parts=3, **parameters))
+    assert serial.final_size > 3
+
+
+def test_partitioned_blocks_compartments_and_hazard():
+    """Blocks, SEIRS compartments and hazard functions with per-node parameters are simulated identically"""
+    G = nx.stochastic_block_model([40, 30, 50], [[0.2, 0.02, 0.01], [0.02, 0.25, 0.02], [0.01, 0.02, 0.2]], seed=3)
+    scale = np.linspace(0.5, 1.5, G.number_of_nodes())
+    parameters = dict(beta=0.8, infection_period_parameters=2, initial_infected=4, time_increment=0.1, max_iterations=300, random_state=11,
+                      hazard_rate=hazard, hazard_parameters={"scale": scale}, block_beta=[1, 1.5, 0.5],
+                      compartments=compartment_model.SEIR(latent_period_parameters=0.5, SIS=True))
+    serial, partitioned = assert_identical(complex_epidemic_simulation(G, **parameters), partitioned_epidemic_simulation(G, number_of_parts=3, **parameters))
+    assert np.array_equal(serial.block_counts, partitioned.block_counts)
+
+
+def test_partitioned_spawn():
+    """Workers started with the spawn method, which pickles everything they are given, simulate identically without being sent the network"""
+    G = nx.stochastic_block_model([40, 30, 50], [[0.2, 0.02, 0.01], [0.02, 0.25, 0.02], [0.01, 0.02, 0.2]], seed=3)
+    scale = np.linspace(0.5, 1.5, G.number_of_nodes())
+    parameters = dict(beta=0.8, infection_period_parameters=2, initial_infected=4, time_increment=0.1, max_iterations=300, random_state=11,
+                      hazard_rate=hazard, hazard_parameters={"scale": scale}, block_beta={0: 1, 1: 1.5, 2: 0.5},
+                      compartments=compartment_model.SEIR(latent_period_parameters=0.5, SIS=True))
+    partitioned = partitioned_epidemic_simulation(G, number_of_parts=2, start_method="spawn", **parameters)
+    assert_identical(complex_epidemic_simulation(G, **parameters), partitioned)
+    worker = partition_worker(partitioned, np.arange(10))
+    assert not any(value is partitioned or value is G for value in vars(worker).values())
+
+
+def test_partitioned_reset():
+    """The simulation can be reset and iterated again, and the frontier is rebuilt afterwards"""
+    parameters = dict(beta=1, infection_period_parameters=1, initial_infected=2, time_increment=0.1, max_iterations=200, random_state=5)
+    G = nx.grid_2d_graph(8, 8)
+    serial = complex_epidemic_simulation(G, **parameters)
+    partitioned = partitioned_epidemic_simulation(G, number_of_parts=2, **parameters)
+    partitioned.iterate_epidemic()
+    serial.iterate_epidemic()
+    serial.reset(9)
+    partitioned.reset(9)
+    assert_identical(serial, partitioned)
+    assert partitioned.frontier.frontier == serial.frontier.frontier
+
+
+def test_partition_network():
+    """Blocks are kept together, and otherwise the parts have roughly equal size"""
+    G = nx.stochastic_block_model([10, 20, 30, 40], [[0.1] * 4] * 4, seed=1)
+    parts = partition_network(G, 2)
+    blocks = np.array([G.nodes[node]["block"] for node in G.nodes()])
+    for block in range(4):
+        assert len(set(parts[blocks == block])) == 1
+    assert sorted(np.bincount(parts)) == [50, 50]
+
+    sizes = np.bincount(partition_network(nx.path_graph(10), 3))
+    assert sizes.sum() == 10 and sizes.max() - sizes.min() <= 1
+
+
+def test_partitioned_errors():
+    """Dynamic networks and partitions of the wrong length are rejected"""
+    G = nx.path_graph(5)
+    with raises(ValueError):
+        partitioned_epidemic_simulation(G, 1, 1, 1, 0.1, 10, increment_network=lambda time_increment: None)
+    with raises(ValueError):
+        partitioned_epidemic_simulation(G, 1, 1, 1, 0.1, 10, partition=[0, 1])
@@ -0,0 +1,32 @@
+#Testing script for the random number streams
+import numpy as np
+import numpy.random as npr
+from NetworkEpidemicSimulation.RandomNumbers import spawn_random_streams, spawn_seeds
+
+def test_no_random_state_uses_global_functions():
+    streams = spawn_random_streams(None, ["a", "b"])
+    assert streams["a"] is np.random
+    assert streams["b"] is np.random
+
+def test_streams_reproducible_and_independent():
+    streams = spawn_random_streams(1, ["a", "b"])
+    same_streams = spawn_random_streams(np.random.SeedSequence(1), ["a", "b"])
+    draw_a = streams["a"].random(5)
+    assert (draw_a == same_streams["a"].random(5)).all()
+    assert not (draw_a == streams["b"].random(5)).any()
+
+def test_bit_generator():
+    streams = spawn_random_streams(1, ["a"], bit_generator = npr.Philox)
+    assert isinstance(streams["a"].bit_generator, npr.Philox)
+
+def test_spawn_from_generator():
+    streams = spawn_random_streams(npr.default_rng(3), ["a"])
+    same_streams = spawn_random_streams(npr.default_rng(3), ["a"])
+    assert streams["a"].random() == same_streams["a"].random()
+
+def test_spawn_seeds():
+    seeds = spawn_seeds(4, 3)
+    assert len(seeds) == 3
+    draws = [npr.default_rng(seed).random() for seed in seeds]
+    assert len(set(draws)) == 3
+    assert draws[0] == npr.default_rng(spawn_seeds(4, 3)[0]).random()
@@ -0,0 +1,51 @@
+# Testing script for the result object
+import pickle
+import networkx as nx
+import numpy as np
+import pytest
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+
+
+def run_epidemic(custom_behaviour=None):
+    my_epidemic = complex_epidemic_simulation(nx.grid_2d_graph(8, 8), beta=1, infection_period_parameters=1, initial_infected=3,
+                                              time_increment=0.1, max_iterations=300, random_state=4, custom_behaviour=custom_behaviour)
+    return my_epidemic, my_epidemic.iterate_epidemic()
+
+
+def test_nodes_reconstructed_from_events():
+    """The nodes in each stage are reconstructed from the event log, and match the nodes seen during the run"""
+    seen = []
+    my_epidemic, result = run_epidemic(lambda simulation: seen.append(simulation.infected_nodes))
+    infected_nodes = my_epidemic.data_infected_nodes
+    assert infected_nodes[1:] == seen
+    assert [len(nodes) for nodes in infected_nodes] == my_epidemic.data_infected_counts
+    assert [len(nodes) for nodes in my_epidemic.data_recovered_nodes] == list(result.counts("Recovered"))
+    assert result.final_size == my_epidemic.final_size and result.stop_reason == my_epidemic.stop_reason
+
+
+def test_to_numpy_zero_copy():
+    """to_numpy should return views of the arrays of the result"""
+    _, result = run_epidemic()
+    arrays = result.to_numpy()
+    assert np.shares_memory(arrays["time"], result.time_buffer)
+    assert np.shares_memory(arrays["Infected"], result.stage_count_buffer)
+    assert len(arrays["time"]) == len(result)
+    assert (arrays["Susceptible"] + arrays["Infected"] + arrays["Recovered"] == 64).all()
+
+
+def test_compact_pickle():
+    """Only the used rows are pickled, and the unpickled result holds the same data"""
+    _, result = run_epidemic()
+    restored = pickle.loads(pickle.dumps(result))
+    assert restored.time_buffer.shape == (len(result),)
+    assert (restored.counts("Infected") == result.counts("Infected")).all()
+    assert restored.nodes_in_stage("Recovered") == result.nodes_in_stage("Recovered")
+    assert restored.events is None
+
+
+def test_to_dataframe():
+    pd = pytest.importorskip("pandas")
+    _, result = run_epidemic()
+    frame = result.to_dataframe()
+    assert list(frame["Infected"]) == list(result.counts("Infected"))
+    assert frame.index.name == "time"
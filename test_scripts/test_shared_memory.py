@@ -0,0 +1,79 @@
+# Testing script for the compact networks and the arrays shared between processes
+import pickle
+import networkx as nx
+import numpy as np
+from NetworkEpidemicSimulation.CompactNetworks import csr_graph
+from NetworkEpidemicSimulation.Ensemble import parameter_sweep
+from NetworkEpidemicSimulation.Executors import local_executor
+from NetworkEpidemicSimulation.SharedMemory import shared_arrays, shared_graph, share_state, state_columns, bind_columns
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+from pytest import raises
+
+simulation_parameters = dict(infection_period_parameters=1, initial_infected=3, time_increment=0.1, max_iterations=300)
+
+
+def test_csr_graph_round_trip():
+    """Converting to CSR keeps the edges and blocks, and drops self loops"""
+    G = nx.stochastic_block_model([5, 7], [[0.5, 0.1], [0.1, 0.5]], seed=2)
+    G.add_edge(0, 0)
+    compact = csr_graph.from_networkx(G)
+    assert compact.number_of_nodes() == 12
+    assert compact.number_of_edges() == G.number_of_edges() - 1
+    assert list(compact[3]) == sorted(neighbour for neighbour in G[3] if neighbour != 3)
+    assert compact.nodes[6] == {"block": 1}
+    H = compact.to_networkx()
+    assert sorted(H.edges()) == sorted(tuple(sorted(edge)) for edge in G.edges() if edge[0] != edge[1])
+
+
+def test_simulation_on_csr_graph():
+    """A simulation on a csr_graph is identical to one on the NetworkX graph"""
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(10, 10))
+    serial = complex_epidemic_simulation(G, beta=0.5, random_state=3, **simulation_parameters).iterate_epidemic()
+    simulation = complex_epidemic_simulation(csr_graph.from_networkx(G), beta=0.5, random_state=3, **simulation_parameters)
+    compact = simulation.iterate_epidemic()
+    assert np.array_equal(serial.stage_counts, compact.stage_counts)
+    assert np.array_equal(serial.event_time, compact.event_time)
+    # The frontier reads the CSR arrays, without building an adjacency set for every node
+    assert simulation.frontier.neighbours is simulation.G
+    with raises(ValueError):
+        simulation.frontier.add_edge(0, 50)
+
+
+def test_shared_graph_pickles_handle():
+    """Pickling a shared graph sends the handle rather than the arrays, and the copy reads the same memory"""
+    G = nx.gnp_random_graph(2000, 0.01, seed=1)
+    with shared_graph(G) as network:
+        message = pickle.dumps(network)
+        assert len(message) < 1000
+        copy = pickle.loads(message)
+        assert np.array_equal(copy.indices, network.indices)
+        network.indices[0] = -1
+        assert copy.indices[0] == -1
+        copy.close()
+
+
+def test_shared_graph_sweep():
+    """A sweep over a shared graph on a pool of processes gives the same results as a serial sweep"""
+    G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(6, 6))
+    grid = [{"beta": beta} for beta in (0.3, 1)]
+    serial = parameter_sweep(G, grid, 3, **simulation_parameters)
+    with shared_graph(G) as network, local_executor(processes=2) as executor:
+        shared = parameter_sweep(network, grid, 3, executor=executor, **simulation_parameters)
+    assert np.array_equal(serial["final size"], shared["final size"])
+
+
+def test_share_state():
+    """The state and pre-generated data of a simulation are moved into shared memory without changing them"""
+    simulation = complex_epidemic_simulation(nx.path_graph(20), beta=1, random_state=1, **simulation_parameters)
+    data = simulation.data_structure
+    resistance = data.pre_generated_resistance.copy()
+    shared = share_state(data)
+    assert np.array_equal(data.pre_generated_resistance, resistance)
+    attached = shared_arrays.attach(shared.handle)
+    assert set(state_columns(data)) <= set(attached.arrays)
+    attached["stage_code"][0] = 2
+    assert data.stage_code[0] == 2
+    attached.close()
+    bind_columns(data, {name: np.array(column) for name, column in state_columns(data).items()})
+    shared.close()
+    shared.unlink()
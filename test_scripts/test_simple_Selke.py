@@ -2,7 +2,7 @@ from NetworkEpidemicSimulation.HomogenousEpidemic import SIR_Selke
 from NetworkEpidemicSimulation.HomogenousEpidemic import hazard_class
 import numpy.random as npr
 import numpy as np
-from pytest import raises
+from pytest import raises, approx
 print("Hello World")
 
 def test_data_gen_simple():
@@ -147,4 +147,68 @@ def test_hazard_integral():
 
     def my_hazard(t): return 4*t
     my_hazard = hazard_class(hazard_function = my_hazard)
-    assert my_hazard.integrate_hazard(10) == 200
\ No newline at end of file
+    assert my_hazard.integrate_hazard(10) == 200
+
+def test_random_state_reproducible():
+    first_simulation = SIR_Selke(200, 0.008, 1, 5, random_state = 3)
+    second_simulation = SIR_Selke(200, 0.008, 1, 5, random_state = 3)
+    assert all(first_simulation.inf_periods == second_simulation.inf_periods)
+    assert first_simulation.sim_final_size(5) == second_simulation.sim_final_size(5)
+
+def test_final_size_distribution_small():
+    '''For two susceptibles the final size distribution has a closed form'''
+    simulation = SIR_Selke(2, 0.5, 2, 1)
+    phi = simulation.pressure_laplace_transform(np.arange(3))
+    expected = [phi[2], 2 * (phi[1] ** 2 - phi[2] * phi[1])]
+    expected.append(1 - sum(expected))
+    assert np.allclose(simulation.final_size_distribution(method = "gontcharoff"), expected)
+    assert np.allclose(simulation.final_size_distribution(method = "markov"), expected)
+    assert np.allclose(simulation.final_size_distribution(method = "chain"), expected, atol = 1e-6)
+
+def test_final_size_distribution_methods_agree():
+    '''The Gontcharoff recursion and the Markov chain agree for exponential infectious periods, and the Markov chain is stable for large populations'''
+    simulation = SIR_Selke(12, 0.15, 1, 2)
+    assert np.allclose(simulation.final_size_distribution(method = "gontcharoff"), simulation.final_size_distribution(method = "markov"))
+
+    large_simulation = SIR_Selke(3000, 0.0006, 1, 5)
+    distribution = large_simulation.final_size_distribution()
+    assert np.isclose(distribution.sum(), 1) and (distribution >= 0).all()
+
+def test_final_size_distribution_non_markovian():
+    '''The quantile quadrature agrees with the closed form transform of gamma infectious periods'''
+    import scipy.stats
+    closed_form = SIR_Selke(10, 0.2, [2, 0.5], 1, infection_period_distribution = "gamma")
+    quadrature = SIR_Selke(10, 0.2, 1, 1, infection_period_distribution = scipy.stats.gamma(2, scale = 0.5))
+    assert np.allclose(closed_form.final_size_distribution(method = "gontcharoff"), quadrature.final_size_distribution(method = "gontcharoff"), atol = 1e-6)
+    assert np.allclose(closed_form.final_size_distribution(method = "gontcharoff"), quadrature.final_size_distribution(), atol = 1e-6)
+
+    with raises(ValueError):
+        SIR_Selke(10, 0.2, 1, 1, infection_period_distribution = npr.geometric).final_size_distribution()
+
+def test_final_size_distribution_large_non_markovian():
+    '''The chain method stays accurate for thousands of susceptibles, where the Gontcharoff recursion raises an error'''
+    simulation = SIR_Selke(2000, 0.001, [2, 0.5], 3, infection_period_distribution = "gamma")
+    distribution = simulation.final_size_distribution()
+    assert np.isclose(distribution.sum(), 1) and (distribution >= 0).all()
+    with raises(ValueError):
+        simulation.final_size_distribution(method = "gontcharoff")
+
+def test_final_size_distribution_matches_monte_carlo():
+    '''The exact distribution has the same support and mean as the final sizes simulated by compute_final_size'''
+    simulation = SIR_Selke(20, 0.1, [2, 0.5], 3, infection_period_distribution = "gamma", random_state = 6)
+    distribution = simulation.final_size_distribution()
+    observations = np.array(simulation.sim_final_size(4000, redraw_infection_periods = True))
+    assert len(distribution) == 21 and np.all(distribution[:2] == 0) and distribution[2] > 0
+    assert observations.min() == 2
+    assert observations.mean() == approx(np.arange(21) @ distribution, abs = 0.3)
+    histogram = np.bincount(observations, minlength = 21) / len(observations)
+    assert np.abs(histogram - distribution).max() < 0.04
+
+def test_sim_final_size_keeps_infection_periods():
+    '''By default every observation uses the same infectious periods'''
+    simulation = SIR_Selke(50, 0.05, 1, 2, random_state = 4)
+    periods = simulation.inf_periods.copy()
+    simulation.sim_final_size(20)
+    assert (simulation.inf_periods == periods).all()
+    simulation.sim_final_size(2, redraw_infection_periods = True)
+    assert not (simulation.inf_periods == periods).all()
@@ -0,0 +1,105 @@
+#Test temporal_contact_network
+import networkx as nx
+import numpy as np
+from pytest import raises
+from NetworkEpidemicSimulation.DynamicNetworks import temporal_contact_network
+from NetworkEpidemicSimulation.Simulation import complex_epidemic_simulation
+
+events = [(0, 0, 1, 1),
+          (0.5, 1, 2, 1),
+          (1.2, 0, 1, 0),
+          (1.5, 2, 3, 1),
+          (1.7, 2, 3, 0),
+          (2.5, 3, 4, 1)]
+
+def write_csv(path):
+    with open(path, "w") as f:
+        f.write("t,u,v,on\n")
+        for event in events:
+            f.write(",".join(str(x) for x in event) + "\n")
+
+def write_binary(path):
+    t, u, v, on = zip(*events)
+    temporal_contact_network.write_binary_events(path, t, u, v, on)
+
+def check_replay(network):
+    # Events at the start time are applied straight away
+    assert sorted(network.G.edges()) == [(0, 1)]
+
+    delta = network.increment_network(1)
+    assert sorted(network.G.edges()) == [(0, 1), (1, 2)]
+    assert delta.edges_added == [(1, 2)]
+
+    # The contact between 2 and 3 starts and ends during the increment, so it is not reported
+    delta = network.increment_network(1)
+    assert sorted(network.G.edges()) == [(1, 2)]
+    assert delta.edges_removed == [(0, 1)]
+    assert delta.edges_added == []
+
+    network.increment_network(1)
+    assert sorted(network.G.edges()) == [(1, 2), (3, 4)]
+    assert network.exhausted
+
+def test_replay_csv(tmp_path):
+    path = str(tmp_path / "contacts.csv")
+    write_csv(path)
+    check_replay(temporal_contact_network(path, chunk_size = 2))
+
+def test_replay_binary(tmp_path):
+    path = str(tmp_path / "contacts.bin")
+    write_binary(path)
+    check_replay(temporal_contact_network(path, chunk_size = 2))
+
+def test_nodes_read_from_stream(tmp_path):
+    path = str(tmp_path / "contacts.bin")
+    write_binary(path)
+    network = temporal_contact_network(path)
+    assert sorted(network.G.nodes()) == [0, 1, 2, 3, 4]
+
+def test_unsorted_stream(tmp_path):
+    path = str(tmp_path / "contacts.bin")
+    temporal_contact_network.write_binary_events(path, [1, 0], [0, 1], [1, 2], [1, 1])
+    with raises(ValueError):
+        temporal_contact_network(path, nodes = [0, 1, 2])
+
+def test_unknown_node(tmp_path):
+    """An event naming a node that was not declared is an error, rather than silently adding the node"""
+    path = str(tmp_path / "contacts.bin")
+    temporal_contact_network.write_binary_events(path, [0, 1], [0, 3], [1, 9], [1, 1])
+    network = temporal_contact_network(path, nodes = [0, 1, 2, 3])
+    with raises(ValueError, match = "9"):
+        network.increment_network(2)
+    assert 9 not in network.G
+
+def test_corrupt_csv_row(tmp_path):
+    """Only the first line may be a header, a line later in the stream that is not an event is an error"""
+    path = str(tmp_path / "contacts.csv")
+    with open(path, "w") as f:
+        f.write("\n0,0,1,1\n0.5,1,2,1\n")
+    assert sorted(temporal_contact_network(path, nodes = [0, 1, 2]).G.edges()) == [(0, 1)]
+    with open(path, "w") as f:
+        f.write("t,u,v,on\n0,0,1,1\nO.5,1,2,1\n1,0,2,1\n")
+    with raises(ValueError, match = "Line 3"):
+        temporal_contact_network(path, nodes = [0, 1, 2])
+    with open(path, "w") as f:
+        f.write("t,u,v,on\n0,0,1,1\n0.5,1,2\n")
+    with raises(ValueError, match = "Line 3"):
+        temporal_contact_network(path, nodes = [0, 1, 2])
+
+def test_epidemic_on_contact_stream(tmp_path):
+    # Node 0 is infected and only ever contacts node 1, who goes on to contact node 2
+    path = str(tmp_path / "contacts.csv")
+    with open(path, "w") as f:
+        f.write("0,0,1,1\n1,0,1,0\n1,1,2,1\n")
+    network = temporal_contact_network(path, nodes = [0, 1, 2, 3])
+    def fixed_length(para, n): return np.array([1.5]*n)
+    my_epidemic = complex_epidemic_simulation(network.G,
+                                              beta = 100,
+                                              infection_period_parameters = 1,
+                                              infection_period_distribution = fixed_length,
+                                              initial_infected = [0],
+                                              time_increment = 0.1,
+                                              max_iterations = 100,
+                                              increment_network = network.increment_network)
+    my_epidemic.iterate_epidemic()
+    assert sorted(my_epidemic.recovered_nodes) == [0, 1, 2]